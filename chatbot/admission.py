@@ -0,0 +1,143 @@
+# chatbot/admission.py
+
+import asyncio
+import contextlib
+import time
+from collections import deque
+from django.conf import settings
+from .metrics import registry
+
+
+class QueueFull(Exception):
+    """Raised when an agent run cannot even be queued."""
+
+
+class AdmissionController:
+    """
+    Process-wide limit on concurrent agent runs with a bounded FIFO wait queue.
+
+    Runs beyond max_concurrent wait in line and are told their position as it
+    changes; once max_queue runs are waiting, new ones are rejected straight
+    away instead of piling up as pending coroutines.
+    """
+
+    def __init__(self, max_concurrent=None, max_queue=None):
+        self._max_concurrent = max_concurrent
+        self._max_queue = max_queue
+        self.active = 0
+        self._waiters = deque()
+        self._notify_tasks = set()
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def max_concurrent(self):
+        return self._max_concurrent or settings.CHATBOT_MAX_CONCURRENT_AGENT_RUNS
+
+    @property
+    def max_queue(self):
+        return self._max_queue if self._max_queue is not None else settings.CHATBOT_MAX_QUEUED_AGENT_RUNS
+
+    @property
+    def queue_depth(self):
+        return len(self._waiters)
+
+    @contextlib.asynccontextmanager
+    async def admit(self, on_position=None):
+        """Hold a run slot for the duration of the block; on_position(n) is awaited while queued."""
+        await self.acquire(on_position)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, on_position=None):
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            self.record_wait(0.0)
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise QueueFull()
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (future, on_position)
+        self._waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            if on_position is not None:
+                await on_position(len(self._waiters))
+            await future
+        except BaseException:
+            # Cancelled, or the position could not be sent: never leave a dead waiter in line
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                self.notify_positions()
+            elif future.done() and not future.cancelled():
+                # The slot was handed to us just as we gave up; pass it on
+                self.release()
+            raise
+        self.record_wait(time.monotonic() - started)
+
+    def release(self):
+        # Hand the slot straight to the next waiter so nobody can jump the queue
+        while self._waiters:
+            future, _ = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                self.notify_positions()
+                return
+        self.active -= 1
+
+    def notify_positions(self):
+        for position, (_, on_position) in enumerate(self._waiters, start=1):
+            if on_position is not None:
+                task = asyncio.ensure_future(on_position(position))
+                self._notify_tasks.add(task)
+                task.add_done_callback(self._notify_tasks.discard)
+
+    def record_wait(self, waited):
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def stats(self):
+        return {
+            'active': self.active,
+            'queue_depth': self.queue_depth,
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'mean_wait_seconds': self.total_wait / self.admitted if self.admitted else 0.0,
+            'max_wait_seconds': self.max_wait,
+        }
+
+
+class RateLimiter:
+    """Token bucket limiting how many messages one connection may send."""
+
+    def __init__(self, per_minute=None, burst=None):
+        self.rate = (per_minute or settings.CHATBOT_RATE_LIMIT_PER_MINUTE) / 60.0
+        self.capacity = burst or settings.CHATBOT_RATE_LIMIT_BURST
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def check(self):
+        """Take a token if one is available; return (allowed, seconds until the next token)."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+        return False, (1 - self.tokens) / self.rate
+
+
+admission_controller = AdmissionController()
+
+registry.gauge('chatbot_agent_runs_active', 'Agent runs holding an admission slot', func=lambda: admission_controller.active)
+registry.gauge('chatbot_agent_runs_queued', 'Agent runs waiting for an admission slot', func=lambda: admission_controller.queue_depth)
@@ -0,0 +1,227 @@
+# chatbot/cache.py
+
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from .redis_client import get_sync_redis
+
+MISSING = object()
+
+# students models whose changes invalidate cached tool results
+DATA_MODELS = ('Student', 'Course', 'Grade', 'Attendance', 'Performance', 'Internship')
+
+
+class LocalCacheBackend:
+    """
+    In-process LRU cache with per-entry expiry.
+
+    Model version counters live in the same process, so use this backend only
+    with a single worker; signals fired in another worker will not reach it.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or settings.CHATBOT_TOOL_CACHE_MAX_ENTRIES
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_versions(self, labels):
+        with self._lock:
+            return [self._versions.get(label, 0) for label in labels]
+
+    def bump_version(self, label):
+        with self._lock:
+            self._versions[label] = self._versions.get(label, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCacheBackend:
+    """
+    Cache shared by every worker through the CHANNEL_LAYERS Redis instance.
+
+    Entries expire on their TTL and the instance's maxmemory policy bounds the
+    total size; model version counters are plain INCR keys.
+    """
+
+    prefix = 'chatbot:tool_cache:'
+
+    def get(self, key):
+        raw = get_sync_redis().get(self.prefix + key)
+        return MISSING if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl):
+        get_sync_redis().set(self.prefix + key, json.dumps(value, default=str), ex=ttl)
+
+    def get_versions(self, labels):
+        values = get_sync_redis().mget([f'{self.prefix}version:{label}' for label in labels])
+        return [int(value or 0) for value in values]
+
+    def bump_version(self, label):
+        get_sync_redis().incr(f'{self.prefix}version:{label}')
+
+    def clear(self):
+        client = get_sync_redis()
+        for key in client.scan_iter(f'{self.prefix}*'):
+            if ':version:' not in key:
+                client.delete(key)
+
+
+class ToolCache:
+    """
+    Result cache for chatbot tools.
+
+    Every cached tool declares the models its answer depends on. A save or
+    delete of any of those models bumps that model's version counter, and the
+    current versions are part of the cache key, so stale entries simply stop
+    being read and age out through the TTL or the LRU bound.
+    """
+
+    def __init__(self, backend=None):
+        self._backend = backend
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self._inflight = {}
+        self._watched = {}
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            if settings.CHATBOT_TOOL_CACHE_BACKEND == 'redis':
+                self._backend = RedisCacheBackend()
+            else:
+                self._backend = LocalCacheBackend()
+        return self._backend
+
+    @property
+    def enabled(self):
+        return settings.CHATBOT_TOOL_CACHE_BACKEND != 'none'
+
+    def record(self, tool_name, outcome, key=None):
+        with self._stats_lock:
+            counters = self._stats.setdefault(tool_name, {'hits': 0, 'misses': 0})
+            counters[outcome] += 1
+            if key in self._watched:
+                self._watched[key] = True
+
+    def stats(self):
+        with self._stats_lock:
+            return {name: dict(counters) for name, counters in self._stats.items()}
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats.clear()
+
+    def make_key(self, tool_name, models, args, kwargs):
+        versions = self.backend.get_versions(models)
+        payload = json.dumps([tool_name, versions, args, kwargs], sort_keys=True, default=str)
+        return f'{tool_name}:{hashlib.sha1(payload.encode()).hexdigest()}'
+
+    def cached(self, models, ttl=None, ignore_args=False, key_args=None):
+        """
+        Decorate a tool function so its result is cached until one of models changes.
+
+        models are model names from students.models; ignore_args is for tools
+        whose (LLM-supplied) argument does not affect the answer, and key_args
+        maps the call arguments to what the key is built from (e.g. a name with
+        its case folded). Concurrent misses on one key in this process run the
+        tool once; the others wait for its result.
+        """
+        def decorator(func):
+            def cache_key(*args, **kwargs):
+                if ignore_args:
+                    args, kwargs = (), {}
+                elif key_args is not None:
+                    args, kwargs = key_args(*args, **kwargs), {}
+                return self.make_key(func.__name__, models, args, kwargs)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+
+                try:
+                    key = cache_key(*args, **kwargs)
+                    value = self.backend.get(key)
+                except Exception as e:
+                    print(f"Error reading tool cache: {e}")
+                    return func(*args, **kwargs)
+
+                if value is MISSING:
+                    with self._stats_lock:
+                        event = self._inflight.get(key)
+                        leader = event is None
+                        if leader:
+                            event = self._inflight[key] = threading.Event()
+                    if not leader:
+                        # Someone (often a speculative prefetch) is already computing this
+                        event.wait(settings.CHATBOT_TOOL_CACHE_INFLIGHT_WAIT)
+                        value = self.backend.get(key)
+
+                if value is not MISSING:
+                    self.record(func.__name__, 'hits', key)
+                    return value
+
+                self.record(func.__name__, 'misses')
+                try:
+                    value = func(*args, **kwargs)
+                    # Errors are usually transient; don't pin them for a whole TTL
+                    if not (isinstance(value, dict) and 'error' in value):
+                        try:
+                            self.backend.set(key, value, ttl or settings.CHATBOT_TOOL_CACHE_DEFAULT_TTL)
+                        except Exception as e:
+                            print(f"Error writing tool cache: {e}")
+                finally:
+                    if leader:
+                        with self._stats_lock:
+                            self._inflight.pop(key, None)
+                        event.set()
+                return value
+
+            wrapper.cache_key = cache_key
+            return wrapper
+        return decorator
+
+    def watch(self, key):
+        """Start noting whether key is read; see unwatch."""
+        with self._stats_lock:
+            self._watched[key] = False
+
+    def unwatch(self, key):
+        """Stop watching key and return whether it was read since watch(key)."""
+        with self._stats_lock:
+            return self._watched.pop(key, False)
+
+    def invalidate_model(self, model_name):
+        try:
+            self.backend.bump_version(model_name)
+        except Exception as e:
+            print(f"Error invalidating tool cache: {e}")
+
+
+tool_cache = ToolCache()
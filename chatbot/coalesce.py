@@ -0,0 +1,116 @@
+# chatbot/coalesce.py
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .cache import DATA_MODELS, tool_cache
+from .redis_client import get_redis
+
+PUNCTUATION_RE = re.compile(r"[^\w\s]")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(text):
+    """Lowercase, drop punctuation and collapse whitespace, so trivially different phrasings match."""
+    return WHITESPACE_RE.sub(" ", PUNCTUATION_RE.sub(" ", text.lower())).strip()
+
+
+async def coalescing_key(message, chat_history):
+    """
+    Key identical questions asked against the same data and the same context.
+
+    The model version counters maintained for the tool cache stand in for the
+    data version. Earlier turns change what an answer means, so they are part
+    of the key too; in practice only opening questions coalesce.
+    """
+    if settings.CHATBOT_COALESCE_BACKEND == 'none':
+        return None
+    try:
+        versions = await sync_to_async(tool_cache.backend.get_versions, thread_sensitive=False)(DATA_MODELS)
+    except Exception as e:
+        print(f"Error reading data version: {e}")
+        return None
+    history = [(message.type, message.content) for message in chat_history]
+    payload = json.dumps([normalize_question(message), versions, history], default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class SingleFlight:
+    """
+    Share one in-flight agent run between concurrent identical questions.
+
+    Within a process, callers with the same key await the same task. With the
+    redis backend the first worker to take a short-lived lock runs the agent
+    and publishes the answer under a result key that the other workers poll.
+    run() returns (answer, owner); owner is True only for the caller whose func
+    actually ran, e.g. the one whose socket already received the streamed answer.
+    """
+
+    def __init__(self, client=None):
+        # client: an asyncio Redis client for the redis backend, by default the shared one
+        self._client = client
+        self._inflight = {}
+
+    async def run(self, key, func):
+        if key is None:
+            return await func(), True
+
+        entry = self._inflight.get(key)
+        owner = entry is None
+        if owner:
+            entry = {'task': asyncio.ensure_future(self.run_shared(key, func)), 'waiters': 0}
+            self._inflight[key] = entry
+        entry['waiters'] += 1
+        try:
+            answer, ran_here = await asyncio.shield(entry['task'])
+        except asyncio.CancelledError:
+            # Abandon the shared run only once nobody is waiting for it any more
+            entry['waiters'] -= 1
+            if entry['waiters'] == 0:
+                entry['task'].cancel()
+            raise
+        return answer, owner and ran_here
+
+    async def run_shared(self, key, func):
+        try:
+            if settings.CHATBOT_COALESCE_BACKEND == 'redis':
+                return await self.run_distributed(key, func)
+            return await func(), True
+        finally:
+            self._inflight.pop(key, None)
+
+    async def run_distributed(self, key, func):
+        client = self._client or get_redis()
+        lock_key = f'chatbot:coalesce:lock:{key}'
+        result_key = f'chatbot:coalesce:result:{key}'
+        deadline = time.monotonic() + settings.CHATBOT_COALESCE_WAIT
+
+        while True:
+            try:
+                raw = await client.get(result_key)
+                if raw is not None:
+                    return json.loads(raw), False
+                locked = await client.set(lock_key, '1', nx=True, ex=settings.CHATBOT_COALESCE_WAIT)
+            except Exception as e:
+                print(f"Error coordinating coalesced run: {e}")
+                return await func(), True
+
+            if locked:
+                try:
+                    answer = await func()
+                    await client.set(result_key, json.dumps(answer, default=str), ex=settings.CHATBOT_COALESCE_RESULT_TTL)
+                    return answer, True
+                finally:
+                    await client.delete(lock_key)
+
+            if time.monotonic() > deadline:
+                # The worker holding the lock is stuck; stop waiting for it
+                return await func(), True
+            await asyncio.sleep(settings.CHATBOT_COALESCE_POLL_INTERVAL)
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,202 @@
+# chatbot/compaction.py
+
+import functools
+import json
+import threading
+from collections import Counter, OrderedDict
+from django.conf import settings
+from .tokens import count_tokens
+
+# Bookkeeping columns the model never needs to answer a question (and foreign key
+# ids, which mean nothing to it; tools add course_name instead)
+DROP_FIELDS = frozenset({'id', 'created_at', 'updated_at', 'is_deleted', 'student', 'course', 'profile_picture'})
+
+
+def to_json(value):
+    # The OpenAI tools agent sends non-string observations to the model as json.dumps(observation)
+    return json.dumps(value, default=str)
+
+
+def is_empty(value):
+    return value is None or value == '' or value == [] or value == {}
+
+
+def clean(value, drop=DROP_FIELDS, keep=frozenset()):
+    """Recursively drop the fields in drop and every null or empty value, except those of the fields in keep."""
+    if isinstance(value, dict):
+        cleaned = ((key, clean(item, drop, keep)) for key, item in value.items() if key not in drop)
+        return {key: item for key, item in cleaned if key in keep or not is_empty(item)}
+    if isinstance(value, list):
+        return [clean(item, drop, keep) for item in value]
+    return value
+
+
+def as_number(value):
+    # DRF renders decimals as strings
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def mean(values):
+    values = [value for value in values if value is not None]
+    return round(sum(values) / len(values), 2) if values else None
+
+
+def group_by_course(rows):
+    courses = OrderedDict()
+    for row in rows:
+        courses.setdefault(row.get('course_name') or 'Unknown', []).append(row)
+    return courses
+
+
+def summarize_attendance(rows):
+    summary = []
+    for course, course_rows in group_by_course(rows).items():
+        total = sum(row.get('total_classes') or 0 for row in course_rows)
+        attended = sum(row.get('attended_classes') or 0 for row in course_rows)
+        summary.append({
+            'course_name': course,
+            'records': len(course_rows),
+            'total_classes': total,
+            'attended_classes': attended,
+            'attendance_percent': round(100 * attended / total, 1) if total else None,
+            'status': dict(Counter(row.get('status') for row in course_rows)),
+        })
+    return summary
+
+
+def summarize_grades(rows):
+    summary = []
+    for course, course_rows in group_by_course(rows).items():
+        percents = []
+        for row in course_rows:
+            marks, total = as_number(row.get('marks_obtained')), as_number(row.get('total_marks'))
+            percents.append(100 * marks / total if marks is not None and total else None)
+        summary.append({
+            'course_name': course,
+            'records': len(course_rows),
+            'grades': dict(Counter(row.get('grade') for row in course_rows if row.get('grade'))),
+            'average_percent': mean(percents),
+        })
+    return summary
+
+
+def summarize_performance(rows):
+    summary = []
+    for course, course_rows in group_by_course(rows).items():
+        summary.append({
+            'course_name': course,
+            'records': len(course_rows),
+            'status': dict(Counter(row.get('status') for row in course_rows)),
+            'average_gpa': mean(as_number(row.get('gpa')) for row in course_rows),
+        })
+    return summary
+
+
+def summarize_failures(rows):
+    return [
+        {'course_name': course, 'failed': len(course_rows)}
+        for course, course_rows in group_by_course(rows).items()
+    ]
+
+
+class ToolOutputCompactor:
+    """
+    Shrink tool results before they are pasted into the agent's context.
+
+    Results are cleaned of bookkeeping and empty fields, every list is capped
+    at max_rows with a more_<key> count of what was left out, and lists are then
+    trimmed further until the JSON the model sees fits the tool's token budget.
+    Lists whose key starts with "summary" are trimmed last.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def compact(self, tool_name, result, max_tokens=None, max_rows=None, drop=DROP_FIELDS, keep=frozenset()):
+        if isinstance(result, dict) and ('error' in result or 'message' in result):
+            return result
+        max_tokens = max_tokens or settings.CHATBOT_TOOL_TOKEN_BUDGET
+        max_rows = max_rows or settings.CHATBOT_TOOL_MAX_ROWS
+        tokens_in = count_tokens(to_json(result))
+
+        payload = clean(result, drop, keep)
+        if isinstance(payload, list):
+            payload = {'count': len(payload), 'rows': payload}
+
+        # (container, key) for every list, including those nested in sub-dicts
+        # such as one section per aspect; records go before summaries
+        lists = sorted(self.find_lists(payload), key=lambda item: item[1].startswith('summary'))
+        omitted = 0
+        for container, key in lists:
+            omitted += self.cap(container, key, max_rows)
+        for container, key in lists:
+            if count_tokens(to_json(payload)) <= max_tokens:
+                break
+            omitted += self.fit(payload, container, key, max_tokens)
+
+        self.record(tool_name, tokens_in, count_tokens(to_json(payload)), omitted)
+        return payload
+
+    def find_lists(self, payload):
+        for key, value in payload.items():
+            if isinstance(value, list):
+                yield payload, key
+            elif isinstance(value, dict):
+                yield from self.find_lists(value)
+
+    def cap(self, container, key, limit):
+        rows = container[key]
+        if len(rows) <= limit:
+            return 0
+        container[key] = rows[:limit]
+        container[f'more_{key}'] = container.get(f'more_{key}', 0) + len(rows) - limit
+        return len(rows) - limit
+
+    def fit(self, payload, container, key, max_tokens):
+        """Keep the longest prefix of container[key] that lets payload fit max_tokens (binary search on the row count)."""
+        rows, more = container[key], container.get(f'more_{key}', 0)
+        low, high = 0, len(rows)
+        while low < high:
+            middle = (low + high + 1) // 2
+            container[key], container[f'more_{key}'] = rows[:middle], more + len(rows) - middle
+            if count_tokens(to_json(payload)) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        container[key] = rows
+        if more:
+            container[f'more_{key}'] = more
+        else:
+            container.pop(f'more_{key}', None)
+        return self.cap(container, key, low)
+
+    def compacted(self, max_tokens=None, max_rows=None, drop=DROP_FIELDS):
+        """Decorator compacting whatever the wrapped tool returns."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                return self.compact(func.__name__, func(*args, **kwargs), max_tokens, max_rows, drop)
+            return wrapper
+        return decorator
+
+    def record(self, tool_name, tokens_in, tokens_out, omitted):
+        with self._lock:
+            counters = self._stats.setdefault(tool_name, {'calls': 0, 'tokens_in': 0, 'tokens_out': 0, 'rows_omitted': 0})
+            counters['calls'] += 1
+            counters['tokens_in'] += tokens_in
+            counters['tokens_out'] += tokens_out
+            counters['rows_omitted'] += omitted
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: {**counters, 'saved_fraction': 1 - counters['tokens_out'] / counters['tokens_in'] if counters['tokens_in'] else 0.0}
+                for name, counters in self._stats.items()
+            }
+
+
+compactor = ToolOutputCompactor()
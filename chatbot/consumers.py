@@ -1,438 +1,375 @@
+import asyncio
+import functools
 import json
+import time
+import uuid
 import openai
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.conf import settings
-from langchain.agents.format_scratchpad.openai_tools import (
-    format_to_openai_tool_messages,
-)
-from langchain.agents.output_parsers.openai_tools import OpenAIToolsAgentOutputParser
-from langchain.agents import tool
-from langchain_openai import ChatOpenAI
-from langchain.agents import AgentExecutor
-from langchain_core.prompts import MessagesPlaceholder, ChatPromptTemplate
-from langchain.tools import Tool, StructuredTool
-from langchain_core.messages import AIMessage, HumanMessage
-from typing import Annotated
-from pydantic import BaseModel, Field
-from asgiref.sync import sync_to_async
-import asyncio
-from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
-
-MEMORY_KEY = "chat_history"
+from .admission import QueueFull, RateLimiter, admission_controller
+from .coalesce import coalescing_key, single_flight
+from .memory import ConversationMemory
+from .model_routing import model_router
+from .prefetch import speculative_prefetcher
+from .rooms import get_room_members, is_valid_room_name
+from .router import fast_path_router
+from .tracing import CHANNEL_SECONDS, CONNECTIONS, Trace, TraceCallbackHandler, current_trace
 
 # Set up OpenAI API key
 openai.api_key = settings.OPENAI_API_KEY
 
-llm = ChatOpenAI(model="gpt-4.1", temperature=0.3, api_key=settings.OPENAI_API_KEY)
-
-
-def get_student_records(student_name):
-    from students.models import Student
-    try:
-        student = Student.objects.filter(name__icontains=student_name).first()
-        if not student:
-            return {"error": "Student not found."}
-        return student
-    except Exception as e:
-        print(f"Error fetching student details: {e}")
-        return {"error": "An error occurred while fetching student details."}
-
-get_student_records_async = sync_to_async(get_student_records)
-
-student_records_tool = Tool(
-    name="get_student_records",
-    func=lambda x: get_student_records_async(x),
-    coroutine=get_student_records_async,
-    description="Fetches a student's record based on their name."
-)
-
-def count_total_records(items: str):
-    """
-    Count the total number of records in the specified model.
-    :param items: The name of the model to count records for.
-    """
-    from students.models import Student, Attendance, Grade, Course, Internship, Performance
-    try:
-        if items == "students":
-            total_count = Student.objects.count()
-        elif items == "courses":
-            total_count = Course.objects.count()
-        elif items == "internships":
-            total_count = Internship.objects.count()
-        elif items == "performances":
-            total_count = Performance.objects.count()
-        elif items == "attendance":
-            total_count = Attendance.objects.count()
-        elif items == "grades":
-            total_count = Grade.objects.count()
-        else:
-            return Student.objects.count()
-        return total_count
-    except Exception as e:
-        print(f"Error counting students: {e}")
-        return {"error": "An error occurred while counting students."}
-
-count_total_records_async = sync_to_async(count_total_records)
-
-count_records_tool = Tool(
-    name="count_total_records",
-    func=lambda x: count_total_records_async(x),
-    coroutine=count_total_records_async,
-    description="Counts total records for a given model (students, courses, internships, etc.)."
-)
-
-def failed_students(self):
-    from students.models import Student
-    try:
-        # Use prefetch_related for reverse relationships
-        failed_students = Student.objects.prefetch_related('student_performance__course').filter(
-            is_deleted=False, student_performance__status='Failed'
-        )
-        if not failed_students:
-            return {"message": "No students have failed."}
-        
-        data = []
-        # Iterate and collect relevant information
-        for student in failed_students:
-            for performance in student.student_performance.all():  # Access related performances
-                data.append({
-                    "name": student.name,
-                    "student_id": student.student_id,
-                    "department": student.department,
-                    "email": student.email,
-                    "phone_number": student.phone_number,
-                    "gpa": student.gpa,
-                    "status": student.status,
-                    "enrollment_year": student.enrollment_year,
-                    "graduation_year": student.graduation_year,
-                    "course": performance.course.name,  # Include course name
-                    "performance_status": performance.status,
-                })
-        
-        return data
-    except Exception as e:
-        print(f"Error fetching failed students: {e}")
-        return {"error": "An error occurred while fetching failed students."}
-
-failed_students_async = sync_to_async(failed_students)
-
-failed_students_tool = Tool(
-    name="failed_students",
-    func=lambda: failed_students_async(),
-    coroutine=failed_students_async,
-    description="Fetches a list of failed students."
-)    
-
-def topper_students_list(self):
-    from students.models import Student
-    try:
-        top_students = Student.objects.filter(is_deleted=False).order_by('-gpa')[:10]
-        if not top_students:
-            return {"message": "No students found."}
-        return [
-            {
-                "name": student.name,
-                "student_id": student.student_id,
-                "department": student.department,
-                "email": student.email,
-                "phone_number": student.phone_number,
-                "gpa": student.gpa,
-                "status": student.status,
-                "enrollment_year": student.enrollment_year,
-                "graduation_year": student.graduation_year,
-            }
-            for student in top_students
-        ]
-    except Exception as e:
-        print(f"Error fetching top students: {e}")
-        return {"error": "An error occurred while fetching top students."}
-
-topper_students_list_async = sync_to_async(topper_students_list)
-
-topper_students_tool = Tool(
-    name="topper_students_list",
-    func=lambda: topper_students_list_async(),
-    coroutine=topper_students_list_async,
-    description="Fetches a list of the top 10 students based on GPA."
-)
-
-class StudentSessionInput(BaseModel):
-    student_name: str = Field(description="Name of the student")
-    session: str = Field(description="Session type (Attendance, Grades, Internships, Performance)")
-
-def get_student_session(student_name, session):
-    from students.serializers import AttendanceSerializer, GradeSerializer, InternshipSerializer, PerformanceSerializer
-    student = get_student_records(student_name)
-    # if isinstance(student, dict) and "error" in student:
-    #     return student  # Return error if student not found or an error occurred
-    if session:
-        if session == 'Attendance':
-            attendance_records = student.student_attendance.all()
-            serializer = AttendanceSerializer(attendance_records, many=True)
-            data = serializer.data
-            return data
-        elif session == 'Grades':
-            grade_records = student.student_grades.all()
-            serializer = GradeSerializer(grade_records, many=True)
-            data = serializer.data
-            return data
-        elif session == 'Internships':
-            internship_records = student.student_internships.all()
-            serializer = InternshipSerializer(internship_records, many=True)
-            data = serializer.data
-            return data
-        elif session == 'Performance':
-            performance_records = student.student_performance.all()
-            serializer = PerformanceSerializer(performance_records, many=True)
-            data = serializer.data
-            return data
-    else:
-        return {"error": "Invalid session type specified."}
-        
-get_student_session_async = sync_to_async(get_student_session)
-
-# student_session_tool = Tool(
-#     name="get_student_session",
-#     func=lambda x, y: get_student_session_async(x, y),
-#     coroutine=get_student_session_async,
-#     description="Fetches a student's session data (Attendance, Grades, Internships, Performance) based on session type."
-# )
-
-student_session_tool = Tool(
-    name="get_student_session",
-    func=lambda x: get_student_session_async(**json.loads(x)),
-    coroutine=lambda x: get_student_session_async(**json.loads(x)),
-    description="Fetches a student's session data (Attendance, Grades, Internships, Performance) based on session type. Input should be JSON format like: {\"student_name\": \"John Doe\", \"session\": \"Attendance\"}"
-)
-
-def get_student_details_sync(student_name):
-    from students.models import Student, Attendance, Grade, Course, Internship, Performance
-    from students.serializers import StudentSerializer
-    try:
-        student = get_student_records(student_name)
-        serializer = StudentSerializer(student)
-        student_details = serializer.data
-        return student_details
-    
-    except Exception as e:
-        print(f"Error fetching student details: {e}")
-        return {"error": "An error occurred while fetching student details."}
-
-get_student_details_async = sync_to_async(get_student_details_sync)
-
-student_details_tool = Tool(
-    name="get_student_details",
-    func=lambda x: get_student_details_async(x),
-    coroutine=get_student_details_async,
-    description="Fetches details of a student based on their name.",
-)
-
+# Memory compactions still running; holds them so they are not garbage collected mid-summary
+background_tasks = set()
+
+
+def stream_event_to_frame(event, message_id):
+    """Translate one astream_events (v2) event into a client frame, or None to skip it."""
+    kind = event['event']
+    if kind == 'on_tool_start':
+        return {
+            'type': 'tool_start',
+            'message_id': message_id,
+            'tool': event['name'],
+            'input': event['data'].get('input'),
+        }
+    if kind == 'on_tool_end':
+        return {'type': 'tool_end', 'message_id': message_id, 'tool': event['name']}
+    if kind == 'on_chat_model_stream':
+        # Tool-call chunks carry no text content; only forward visible tokens
+        delta = event['data']['chunk'].content
+        if delta:
+            return {'type': 'token', 'message_id': message_id, 'delta': delta}
+        return None
+    if kind == 'on_chain_end' and not event.get('parent_ids'):
+        # The root AgentExecutor run has finished
+        output = event['data'].get('output') or {}
+        return {'type': 'final', 'message_id': message_id, 'message': output.get('output')}
+    return None
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        self.room_name = 'chat_room'
-        self.room_group_name = f'chat_{self.room_name}'
-
-        # Join WebSocket group
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+        # Connections are private unless they join a named room at ws/chat/<room_name>/
+        self.room_name = self.scope.get('url_route', {}).get('kwargs', {}).get('room_name')
+        self.room_group_name = f'chat_{self.room_name}' if self.room_name else None
+        self.shared = False
+
+        rejected = self.room_name is not None and not is_valid_room_name(self.room_name)
+        if rejected:
+            self.room_name = self.room_group_name = None
+
+        self.memory = ConversationMemory.for_consumer(self)
+        self.rate_limiter = RateLimiter()
+        self.tasks = {}
+        self.answered = set()
+        self.connected = True
+        self.counted = False
+
+        if rejected:
+            await self.close()
+            return
+
+        if self.room_name:
+            # Join WebSocket group
+            await self.channel_layer.group_add(
+                self.room_group_name,
+                self.channel_name
+            )
+            await get_room_members().add(self.room_name, self.channel_name)
 
         await self.accept()
+        CONNECTIONS.inc()
+        self.counted = True
 
     async def disconnect(self, close_code):
-        # Leave WebSocket group
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        # Stop paying for answers nobody is waiting for
+        self.connected = False
+        if getattr(self, 'counted', False):
+            CONNECTIONS.dec()
+            self.counted = False
+        await self.cancel_tasks()
+
+        if self.room_name:
+            # Leave WebSocket group
+            await self.channel_layer.group_discard(
+                self.room_group_name,
+                self.channel_name
+            )
+            await get_room_members().discard(self.room_name, self.channel_name)
+
+        # Per-connection memory dies with the socket; user and room memory expire on their TTL
+        if self.memory.is_connection_scoped:
+            try:
+                await self.memory.clear()
+            except Exception as e:
+                print(f"Error clearing conversation memory: {e}")
 
     async def receive(self, text_data):
         # Receive message from WebSocket
         text_data_json = json.loads(text_data)
-        message = text_data_json['message']
 
-        # Send the message to OpenAI and get the response
-        ai_response = await self.get_ai_response(message)
+        if text_data_json.get('type') == 'cancel':
+            # Cancel one message by id, or everything in flight on this socket
+            await self.cancel_tasks(text_data_json.get('id'))
+            return
+
+        message_id = text_data_json.get('id') or uuid.uuid4().hex
+
+        allowed, retry_after = self.rate_limiter.check()
+        if not allowed:
+            await self.reject(message_id, 'rate_limited', "You are sending messages too quickly, please slow down.",
+                              retry_after=round(retry_after, 1))
+            return
+
+        if text_data_json.get('mode', settings.CHATBOT_PIPELINE_MODE) == 'supersede':
+            # The new question replaces whatever this socket was still waiting on
+            await self.cancel_tasks()
+
+        if message_id in self.tasks:
+            await self.reject(message_id, 'duplicate_id', "A message with this id is already being answered.")
+            return
+        if len(self.tasks) >= settings.CHATBOT_MAX_TASKS_PER_CONNECTION:
+            await self.reject(message_id, 'too_many_in_flight', "Please wait for an answer before sending more questions.")
+            return
+
+        # Run each message as its own task so the socket keeps reading (and can cancel it)
+        task = asyncio.create_task(self.handle_message(text_data_json, message_id))
+        self.tasks[message_id] = task
+        task.add_done_callback(functools.partial(self.forget_task, message_id))
+
+    def forget_task(self, message_id, task):
+        if self.tasks.get(message_id) is task:
+            del self.tasks[message_id]
+            self.answered.discard(message_id)
+
+    async def reject(self, message_id, reason, message, **extra):
+        trace = current_trace.get()
+        if trace is not None:
+            trace.outcome = 'rejected'
+            extra['trace_id'] = trace.trace_id
+        # Rejections only concern the sender, even in a shared room
+        await self.send(text_data=json.dumps({
+            'type': 'rejected',
+            'message_id': message_id,
+            'reason': reason,
+            'message': message,
+            **extra,
+        }))
+
+    async def cancel_tasks(self, message_id=None):
+        if message_id is None:
+            tasks = dict(self.tasks)
+        else:
+            tasks = {message_id: self.tasks[message_id]} if message_id in self.tasks else {}
+        for task_id, task in tasks.items():
+            # A turn that has sent its answer only has bookkeeping (stats, memory) left; let it finish
+            if task_id not in self.answered:
+                task.cancel()
+        # Wait for the tasks to unwind so queued tool calls and admission slots are released
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+    async def handle_message(self, text_data_json, message_id):
+        # Everything this turn does (LLM, tools, SQL, sends) is recorded on its trace
+        trace = Trace(message_id=message_id, room=self.room_name)
+        current_trace.set(trace)
+        try:
+            await self.answer_message(text_data_json['message'], message_id, text_data_json)
+        except asyncio.CancelledError:
+            # A turn cancelled after its answer went out (e.g. the client hung up on receiving it) keeps its outcome
+            if trace.outcome is None:
+                trace.outcome = 'cancelled'
+                if self.connected:
+                    await self.send(text_data=json.dumps({'type': 'cancelled', 'message_id': message_id, 'trace_id': trace.trace_id}))
+            raise
+        except Exception as e:
+            print(f"Error answering message: {e}")
+            await self.send_frame({
+                'type': 'error',
+                'message_id': message_id,
+                'message': "An error occurred while generating the response.",
+            })
+        finally:
+            trace.finish()
+
+    async def answer_message(self, message, message_id, text_data_json):
+        # Decide once per turn whether replies need the Redis fan-out
+        self.shared = bool(self.room_name) and await get_room_members().count(self.room_name) > 1
+
+        # Serve simple lookups like "how many students are there" without the LLM
+        fast_answer = await fast_path_router.answer(message)
+        if fast_answer is not None:
+            await self.send_frame({
+                'type': 'final',
+                'message_id': message_id,
+                'message': fast_answer,
+                'fast_path': True,
+            })
+            await self.remember(message, fast_answer)
+            return
+
+        stream = text_data_json.get('stream', settings.CHATBOT_STREAMING)
+        chat_history = await self.load_chat_history()
+
+        async def report_position(position):
+            await self.send_frame({'type': 'queued', 'message_id': message_id, 'position': position})
+
+        async def run_agent():
+            # Coalesced callers share this run, which carries on if this socket closes; each caller
+            # delivers and saves the answer itself below. Load the named student's data while the LLM decides which tool to call
+            prefetch = speculative_prefetcher.start(message)
+            try:
+                async with admission_controller.admit(on_position=report_position):
+                    if stream:
+                        # Push tool progress and token deltas as the agent produces them
+                        return await self.stream_ai_response(message, message_id, chat_history)
+
+                    # Send the message to OpenAI and get the response
+                    return await self.get_ai_response(message, chat_history)
+            finally:
+                if prefetch is not None:
+                    await prefetch.finish()
 
-        # Send the AI response to WebSocket
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'chat_message',
-                'message': ai_response
-            }
-        )
+        try:
+            # Identical questions asked at the same time share one agent run
+            key = await coalescing_key(message, chat_history)
+            ai_response, owner = await single_flight.run(key, run_agent)
+        except QueueFull:
+            await self.reject(message_id, 'busy', "The assistant is busy right now, please try again in a moment.")
+            return
+
+        if not (owner and stream):
+            # Send the AI response to WebSocket (a streamed run already sent its own socket the final frame)
+            await self.send_frame({
+                'type': 'final' if ai_response is not None else 'error',
+                'message_id': message_id,
+                'message': ai_response if ai_response is not None else "An error occurred while generating the response.",
+                'coalesced': not owner,
+            })
+
+        if ai_response is not None:
+            await self.remember(message, ai_response)
+
+    async def send_frame(self, frame):
+        if not self.connected:
+            # A coalesced run keeps going for its other waiters after the socket that started it closed
+            return
+        trace = current_trace.get()
+        if trace is not None:
+            frame['trace_id'] = trace.trace_id
+            if frame['type'] in ('final', 'error'):
+                trace.outcome = 'fast_path' if frame.get('fast_path') else 'coalesced' if frame.get('coalesced') else frame['type']
+        if frame['type'] in ('final', 'error'):
+            self.answered.add(frame['message_id'])
+
+        started = time.perf_counter()
+        text = json.dumps(frame, default=str)
+        if not self.shared:
+            # Private connection or a room with a single member: answer on our own socket
+            await self.send(text_data=text)
+        else:
+            await self.channel_layer.group_send(
+                self.room_group_name,
+                {
+                    'type': 'chat_message',
+                    'message': frame.get('message'),
+                    'frame': frame,
+                }
+            )
+        elapsed = time.perf_counter() - started
+        CHANNEL_SECONDS.observe(elapsed, path='group' if self.shared else 'direct')
+        if trace is not None:
+            trace.add_channel_send(elapsed, len(text))
 
     async def chat_message(self, event):
         # Send the message to WebSocket
-        message = event['message']
-        await self.send(text_data=json.dumps({
-            'message': message
-        }))
+        frame = event.get('frame') or {'message': event['message']}
+        await self.send(text_data=json.dumps(frame, default=str))
+
+    async def load_chat_history(self):
+        try:
+            return await self.memory.load_messages()
+        except Exception as e:
+            # A memory outage should degrade to a stateless turn, not a failed one
+            print(f"Error loading conversation memory: {e}")
+            return []
+
+    async def remember(self, user_message, ai_response):
+        """Save the turn, after its answer has been sent; older turns are summarised in the background."""
+        try:
+            await self.memory.append(user_message, ai_response)
+        except Exception as e:
+            print(f"Error saving conversation memory: {e}")
+            return
+        task = asyncio.create_task(self.compact_memory())
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+    async def compact_memory(self):
+        # The turn's trace is finished; the summary's model call is not part of it
+        current_trace.set(None)
+        try:
+            await self.memory.compact()
+        except Exception as e:
+            print(f"Error compacting conversation memory: {e}")
+
+    async def stream_ai_response(self, user_message, message_id, chat_history):
+        """
+        Run the agent through its async event stream and forward the events as
+        frames tagged with message_id: start, tool_start, tool_end, token and a
+        closing final (or error) frame carrying the full answer.
+
+        If the model tier fumbles a tool call, an escalated frame tells the client
+        to discard what it has for message_id and the run restarts on the next tier.
+
+        Returns the final answer, or None if the run failed.
+        """
+        answer = None
+
+        async def attempt(agent_executor):
+            nonlocal answer
+            async for event in agent_executor.astream_events(
+                {"input": user_message, "chat_history": chat_history},
+                config=self.trace_config(),
+                version="v2",
+            ):
+                frame = stream_event_to_frame(event, message_id)
+                if frame is not None:
+                    await self.send_frame(frame)
+                    if frame['type'] == 'final':
+                        answer = frame['message']
+
+        async def escalated(from_tier, to_tier):
+            await self.send_frame({'type': 'escalated', 'message_id': message_id, 'from_tier': from_tier, 'tier': to_tier})
+
+        await self.send_frame({'type': 'start', 'message_id': message_id})
+        try:
+            await model_router.run(user_message, attempt, on_escalate=escalated)
+        except Exception as e:
+            print(f"Error streaming agent response: {e}")
+            await self.send_frame({
+                'type': 'error',
+                'message_id': message_id,
+                'message': "An error occurred while generating the response.",
+            })
+        return answer
+
+    @staticmethod
+    def trace_config():
+        trace = current_trace.get()
+        return {"callbacks": [TraceCallbackHandler(trace)]} if trace is not None else {}
 
     # Function to interact with OpenAI API (correct method)
-    async def get_ai_response(self, user_message):
-        
-        base_prompt = '''
-        You are an agent designed to respond to a variety of user queries. Your primary task is to fetch detailed information about students, courses, and academic records when asked. When a user queries about a student or academic data, such as "What is the attendance of this student?" or "What is the GPA of this student?", you will interact with the system to retrieve relevant data, which may include:
-
-        *Student Data Queries:*
-        --Attendance: The number of classes attended by the student out of total scheduled classes.
-        --GPA: The student's grade point average.
-        --Scholarship Status: Whether the student is on scholarship and, if so, the details of the scholarship.
-        --Internship Details: Any ongoing or past internships the student has participated in.
-        --Other Academic Information: Any additional academic-related information available, such as grades, performance, and extracurricular activities.
-
-        *General Knowledge (GK) Questions:*
-        --Facts, figures, and events related to history, geography, politics, etc.
-        --Current events and famous personalities.
-
-        *Aptitude Questions:*
-        --Mathematical problems, including algebra, geometry, and basic arithmetic.
-        --Logical reasoning puzzles.
-
-        You are also capable of handling queries regarding the overall records and counts of various entities in the system:
-
-        *General Queries:*
-        - Total Students: The total number of students in the system.
-        - Total Courses: The total number of courses available.
-        - Total Grades: The number of grades recorded in the system.
-        - Total Attendance Records: The number of attendance records available.
-        - Total Performance Records: The number of performance records available.
-        - Active Internships: The number of ongoing internships.
-
-        How You Should Process the Query:
-        1. **Student Queries**: Retrieve and present the required information based on the student’s name or ID from the database.
-            - Use the **get_student_details_tool** for full student details.
-            - Use the **student_session_tool** to fetch session data like attendance, grades, internships, and performance.
-            - Use the **failed_students_tool** and **topper_students_tool** for specific data on students who have failed or the top students by GPA.
-            
-        2. **General Queries**: For queries related to total numbers (like total students or courses), fetch the appropriate count from the system:
-            - **count_records_tool** for retrieving the total number of records (e.g., students, courses, grades, etc.).
-
-        3. **Format the Response**: Return the requested information in a structured text format. If multiple details are requested in one query (e.g., both attendance and GPA), provide all relevant information in a single, clear response.
-
-        4. **Handle Edge Cases**: If the student cannot be found or if data is missing (e.g., missing GPA or attendance), the agent should mention that the data is unavailable or ask for clarification.
-
-        Examples of User Queries:
-
-        1. "What is the attendance of Alexis Peterson?"
-        2. "What is the GPA of John Doe?"
-        3. "Is Jane Smith on scholarship?"
-        4. "What is the internship status of Emily Brown?"
-        5. "How many students are there in total?"
-        6. "How many courses are available?"
-        7. "How many active internships are there?"
-        8. "What is the total number of performance records?"
-        9. "Show me the grades for all students."
-
-
-        First you need to fetch all the details and store them in a JSON format.
-        Example Responses that you need to store in JSON: 
-
-        Query: "What is the attendance of Alexis Peterson?"
-        {{
-            "student_name": "Alexis Peterson",
-            "attendance": "80% attendance in the 'Mathematics' course this semester",
-            "gpa": null,
-            "scholarship_status": null,
-            "internship_status": null,
-            "message": "Data for GPA, scholarship status, and internship status is incomplete."
-        }}
-
-        Query: "What is the GPA of John Doe?"
-        {{
-            "student_name": "John Doe",
-            "attendance": null,
-            "gpa": "3.75 for the current semester",
-            "scholarship_status": null,
-            "internship_status": null,
-            "message": "Data for attendance, scholarship status, and internship status is incomplete."
-        }}
-
-        Query: "How many students are there in total?"
-        {{
-            "total_students": 11
-        }}
-
-        Query: "How many courses are available?"
-        {{
-            "total_courses": 6
-        }}
-
-        Query: "How many active internships are there?"
-        {{
-            "active_internships": 8
-        }}
-
-        Query: "What is the total number of performance records?"
-        {{
-            "total_performance_records": 51
-        }}
-
-        Query: "Show me the grades for all students"
-        {{
-            "total_grades": 51
-        }}
-
-        Once you have the JSON with you, convert it into a proper, precise, concise, readable, easy to undestand formatted text string and return it.
-
-        Additional Guidelines:
-        - **Tool Usage**: Always use the appropriate tool to fetch student data (e.g., `get_student_details_tool`, `get_student_session_tool`, etc.). The tool should be able to handle queries for attendance, GPA, internship details, and other relevant information.
-        - **Handling Multiple Students with Similar Names**: If the agent detects multiple students with the same name, ask for clarification (e.g., "There are multiple students named 'John Doe.' Could you specify the department or year?").
-        - **Error Handling**: If the agent is unable to find the student or if data is missing (e.g., missing attendance or GPA), the response should notify the user of the missing information, e.g., "Data for this student is incomplete."
-        - **Date-based Queries**: If the query refers to attendance or performance data over time (e.g., "What was the attendance last semester?"), ensure that the query filters data by relevant dates and periods.
-        - **Providing Additional Context**: In some cases, if additional relevant details are available (e.g., academic status or internship description), the agent should provide these to enrich the response.
-        - For using get_student_session_tool, first determine the session based on the user query context. There are only 4 session: Attendance, Grades, Internships, Performance. Once you have the session variable, you can call the get_student_session_tool with the student name and session. For example, if the user asks for "What is the attendance of Pankaj?", you will set session = Attendance and call get_student_session_tool with first variable x = Pankaj, and second variable y =  Attendance. The tool will return the attendance records of Pankaj.
-
-        Your role is to provide accurate, concise, and clear responses based on the available student data, ensuring the responses are comprehensive and formatted correctly as text. Format the data in such a way that it should have bullet points or the data should be structured in the form of a table if required.
-        '''
-        
-        chat_history = []
-        
-        tools = [student_details_tool, student_records_tool, count_records_tool, failed_students_tool, topper_students_tool, student_session_tool]    
-    
-        llm_with_tools = llm.bind_tools(tools)
-        
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    base_prompt,
-                ),
-                MessagesPlaceholder(variable_name=MEMORY_KEY),
-                ("user", "{input}"),
-                MessagesPlaceholder(variable_name="agent_scratchpad"),
-            ]
-        )
-        
-        agent = (
-            {
-                "input": lambda x: x["input"],
-                "agent_scratchpad": lambda x: format_to_openai_tool_messages(
-                    x["intermediate_steps"]
-                ),
-                "chat_history": lambda x: x["chat_history"]
-            }
-            | prompt
-            | llm_with_tools
-            | OpenAIToolsAgentOutputParser()
-        )
-        
-        agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
-        
+    async def get_ai_response(self, user_message, chat_history=None):
+
+        if chat_history is None:
+            chat_history = await self.load_chat_history()
+
         try:
-            response = await agent_executor.ainvoke({"input": user_message, "chat_history": chat_history})
-            
-            chat_history.extend(
-                [
-                    HumanMessage(content=user_message),
-                    AIMessage(content=response["output"]),
-                ]
-            )
+            # The model tier is picked per turn, and raised if it cannot produce a usable tool call
+            response = await model_router.run(user_message, lambda agent_executor: agent_executor.ainvoke(
+                {"input": user_message, "chat_history": chat_history},
+                config=self.trace_config(),
+            ))
             
             # print(f'the raw response obtained: {response['output']}')
 
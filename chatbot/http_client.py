@@ -0,0 +1,354 @@
+# chatbot/http_client.py
+
+import asyncio
+import contextlib
+import contextvars
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+import httpx
+from django.conf import settings
+from .metrics import registry
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+# Failures where the request cannot have reached the model, or the connection died before an answer
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.RemoteProtocolError, httpx.ReadError)
+
+# Absolute time.monotonic() by which the current LLM call (or the whole turn) must be done
+current_deadline = contextvars.ContextVar('chatbot_llm_deadline', default=None)
+
+REQUESTS = registry.counter('chatbot_llm_http_requests_total', 'LLM HTTP requests by result', ('outcome',))
+ATTEMPTS = registry.counter('chatbot_llm_http_attempts_total', 'LLM HTTP attempts sent, by kind', ('kind',))
+RETRIES_DENIED = registry.counter('chatbot_llm_http_retries_denied_total', 'Retries or hedges skipped, by reason', ('reason',))
+HEDGE_WINS = registry.counter('chatbot_llm_http_hedge_results_total', 'Hedged requests by which copy answered first', ('winner',))
+HEADERS_SECONDS = registry.histogram('chatbot_llm_http_headers_seconds', 'Time from sending an LLM request to its response headers')
+
+
+@contextlib.contextmanager
+def call_deadline(seconds):
+    """Bound every LLM call in the block to finish within seconds from now (nested deadlines only tighten)."""
+    deadline = time.monotonic() + seconds
+    outer = current_deadline.get()
+    token = current_deadline.set(min(deadline, outer) if outer is not None else deadline)
+    try:
+        yield
+    finally:
+        current_deadline.reset(token)
+
+
+class RetryBudget:
+    """
+    Retries (and hedges) allowed as a share of recent traffic.
+
+    Every request deposits `ratio` tokens and every retry withdraws one, plus a
+    trickle of `min_per_second` so a quiet worker can still retry. The balance is
+    capped, so an upstream outage turns into at most ratio extra load rather than
+    every client retrying max_retries times.
+    """
+
+    def __init__(self, ratio=None, min_per_second=None, capacity=None):
+        self.ratio = ratio if ratio is not None else settings.CHATBOT_LLM_RETRY_BUDGET_RATIO
+        self.min_per_second = min_per_second if min_per_second is not None else settings.CHATBOT_LLM_RETRY_BUDGET_MIN_PER_SECOND
+        self.capacity = capacity if capacity is not None else settings.CHATBOT_LLM_RETRY_BUDGET_CAPACITY
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.min_per_second)
+        self.updated = now
+
+    def deposit(self):
+        with self._lock:
+            self.refill()
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            self.refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class LatencyTracker:
+    """Recent time-to-headers per endpoint, for picking the hedge delay."""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, seconds):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def quantile(self, key, q, min_samples):
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+
+class DeadlineStream(httpx.AsyncByteStream):
+    """Response body that gives up reading once the call's deadline passes."""
+
+    def __init__(self, stream, deadline, request):
+        self.stream = stream
+        self.deadline = deadline
+        self.request = request
+
+    async def __aiter__(self):
+        iterator = self.stream.__aiter__()
+        while True:
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                raise httpx.ReadTimeout("LLM call deadline exceeded while streaming", request=self.request)
+            try:
+                chunk = await asyncio.wait_for(iterator.__anext__(), remaining)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                raise httpx.ReadTimeout("LLM call deadline exceeded while streaming", request=self.request) from None
+            yield chunk
+
+    async def aclose(self):
+        await self.stream.aclose()
+
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """
+    Pooled keep-alive transport for the LLM API with deadlines, budgeted retries and hedging.
+
+    Each request gets a deadline (CHATBOT_LLM_CALL_DEADLINE, tightened by any
+    call_deadline() around it) covering retries, hedges and the streamed body.
+    Connection failures and 408/429/5xx answers are retried with jittered
+    backoff while the retry budget allows. With hedging on, a request still
+    without response headers after the endpoint's recent p95 gets a duplicate;
+    whichever answers first is used and the other is cancelled.
+
+    Connection pools are per event loop, since sockets cannot move between loops.
+    """
+
+    def __init__(self, limits=None, connect_timeout=None, max_retries=None, hedge=None, hedge_quantile=None,
+                 hedge_min_samples=None, call_deadline=None, budget=None):
+        self.limits = limits or httpx.Limits(
+            max_connections=settings.CHATBOT_LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.CHATBOT_LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.CHATBOT_LLM_KEEPALIVE_EXPIRY,
+        )
+        self.connect_timeout = connect_timeout if connect_timeout is not None else settings.CHATBOT_LLM_CONNECT_TIMEOUT
+        self.max_retries = max_retries if max_retries is not None else settings.CHATBOT_LLM_MAX_RETRIES
+        self.hedge = hedge if hedge is not None else settings.CHATBOT_LLM_HEDGE_ENABLED
+        self.hedge_quantile = hedge_quantile if hedge_quantile is not None else settings.CHATBOT_LLM_HEDGE_QUANTILE
+        self.hedge_min_samples = hedge_min_samples if hedge_min_samples is not None else settings.CHATBOT_LLM_HEDGE_MIN_SAMPLES
+        self.call_deadline = call_deadline if call_deadline is not None else settings.CHATBOT_LLM_CALL_DEADLINE
+        self.budget = budget or RetryBudget()
+        self.latencies = LatencyTracker()
+        self.in_flight = 0
+        self._transports = {}
+        self._lock = threading.Lock()
+
+    def transport(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.get(loop)
+            if transport is None:
+                # Forget pools of loops that have gone away (tests, management commands)
+                self._transports = {key: value for key, value in self._transports.items() if not key.is_closed()}
+                transport = self._transports[loop] = httpx.AsyncHTTPTransport(limits=self.limits)
+            return transport
+
+    async def handle_async_request(self, request):
+        deadline = time.monotonic() + self.call_deadline
+        outer = current_deadline.get()
+        if outer is not None:
+            deadline = min(deadline, outer)
+        # Retries and hedges resend the body, so it has to be in memory
+        await request.aread()
+        self.budget.deposit()
+        self.in_flight += 1
+        try:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise httpx.ConnectTimeout("LLM call deadline already passed", request=request)
+            try:
+                response = await asyncio.wait_for(self.send_hedged(request, deadline), remaining)
+            except asyncio.TimeoutError:
+                raise httpx.ReadTimeout("LLM call deadline exceeded", request=request) from None
+        except BaseException as e:
+            REQUESTS.inc(outcome='timeout' if isinstance(e, httpx.TimeoutException) else 'error')
+            raise
+        finally:
+            self.in_flight -= 1
+        REQUESTS.inc(outcome=str(response.status_code))
+        response.stream = DeadlineStream(response.stream, deadline, request)
+        return response
+
+    async def send_hedged(self, request, deadline):
+        key = (request.url.host, request.url.path)
+        delay = self.latencies.quantile(key, self.hedge_quantile, self.hedge_min_samples) if self.hedge else None
+        primary = asyncio.ensure_future(self.send_with_retries(request, deadline, 'primary'))
+        if delay is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        if not self.budget.withdraw():
+            RETRIES_DENIED.inc(reason='hedge_budget')
+            return await primary
+
+        hedge = asyncio.ensure_future(self.send_with_retries(request, deadline, 'hedge'))
+        names = {primary: 'primary', hedge: 'hedge'}
+        pending, error = {primary, hedge}, None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        HEDGE_WINS.inc(winner=names[task])
+                        return task.result()
+                    error = task.exception()
+            HEDGE_WINS.inc(winner='none')
+            raise error
+        finally:
+            await self.discard(pending)
+
+    @staticmethod
+    async def discard(tasks):
+        """Cancel the losing copies and close any response one of them got in the meantime."""
+        for task in tasks:
+            task.cancel()
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, httpx.Response):
+                await result.aclose()
+
+    async def send_with_retries(self, request, deadline, kind):
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            ATTEMPTS.inc(kind=kind if attempt == 0 else 'retry')
+            try:
+                response = await self.transport().handle_async_request(request)
+            except RETRY_ERRORS as e:
+                if not await self.before_retry(attempt, deadline, None):
+                    raise
+                error = e
+            else:
+                elapsed = time.monotonic() - started
+                HEADERS_SECONDS.observe(elapsed)
+                if response.status_code < 500 and response.status_code != 429:
+                    self.latencies.add((request.url.host, request.url.path), elapsed)
+                if response.status_code not in RETRY_STATUSES or not await self.before_retry(attempt, deadline, response):
+                    return response
+                await response.aclose()
+            attempt += 1
+
+    async def before_retry(self, attempt, deadline, response):
+        """Sleep before the next attempt and return True, or return False if it must not happen."""
+        if attempt >= self.max_retries:
+            return False
+        delay = retry_after(response) if response is not None else None
+        if delay is None:
+            # Full jitter: spread retries out instead of hitting a recovering upstream in lockstep
+            delay = random.uniform(0, min(settings.CHATBOT_LLM_RETRY_BACKOFF_MAX, settings.CHATBOT_LLM_RETRY_BACKOFF * 2 ** attempt))
+        if time.monotonic() + delay >= deadline:
+            RETRIES_DENIED.inc(reason='deadline')
+            return False
+        if not self.budget.withdraw():
+            RETRIES_DENIED.inc(reason='budget')
+            return False
+        await asyncio.sleep(delay)
+        return True
+
+    def pool_stats(self):
+        connections = idle = waiting = 0
+        with self._lock:
+            transports = list(self._transports.values())
+        for transport in transports:
+            pool = transport._pool
+            connections += len(pool.connections)
+            idle += sum(connection.is_idle() for connection in pool.connections)
+            waiting += len(getattr(pool, '_requests', ()))
+        return {
+            'max_connections': self.limits.max_connections,
+            'connections': connections,
+            'active': connections - idle,
+            'idle': idle,
+            'queued_requests': waiting,
+            'in_flight': self.in_flight,
+            'utilisation': (connections - idle) / self.limits.max_connections if self.limits.max_connections else 0.0,
+        }
+
+    async def aclose(self):
+        with self._lock:
+            transports, self._transports = list(self._transports.values()), {}
+        for transport in transports:
+            await transport.aclose()
+
+
+def retry_after(response):
+    value = response.headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        # Neither seconds nor an HTTP date; use the jittered backoff instead
+        return None
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_http_client():
+    """The process-wide async HTTP client every OpenAI chat model shares."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            transport = ResilientTransport()
+            _client = httpx.AsyncClient(
+                transport=transport,
+                # The transport enforces the per-call deadline; these only bound each network step
+                timeout=httpx.Timeout(None, connect=transport.connect_timeout),
+            )
+        return _client
+
+
+def llm_http_stats():
+    """Pool, retry-budget and hedge state of the shared client, or None before the first LLM call."""
+    if _client is None:
+        return None
+    transport = _client._transport
+    return {
+        **transport.pool_stats(),
+        'retry_budget_tokens': round(transport.budget.tokens, 2),
+        'hedging': transport.hedge,
+    }
+
+
+def pool_stat(field):
+    stats = llm_http_stats()
+    return stats[field] if stats else 0
+
+
+for _field, _documentation in (
+    ('active', 'LLM HTTP connections carrying a request'),
+    ('idle', 'LLM HTTP keep-alive connections waiting for reuse'),
+    ('queued_requests', 'LLM requests waiting for a pooled connection'),
+    ('in_flight', 'LLM calls in progress, including retries and hedges'),
+    ('utilisation', 'Share of the LLM connection pool carrying a request'),
+):
+    registry.gauge(f'chatbot_llm_http_{_field}', _documentation, func=lambda field=_field: pool_stat(field))
@@ -0,0 +1,391 @@
+# chatbot/llm.py
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any
+from django.conf import settings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI
+from .http_client import get_llm_http_client
+from .tokens import count_tokens
+
+TOKEN_RE = re.compile(r"\S+\s*|\s+")
+
+# Used by the fake backend when no script is configured: answer every message directly
+DEFAULT_FAKE_SCRIPT = {
+    'rules': [],
+    'default': [{'content': "This is a simulated answer to: {input}"}],
+}
+
+
+class CassetteMiss(LookupError):
+    """The replay cassette has no recorded response for this request."""
+
+
+def parse_latency(spec):
+    """
+    Turn a latency spec into a sampler taking a random.Random and returning seconds.
+
+    Specs: "0.5" or "fixed:0.5", "uniform:LOW:HIGH", "normal:MEAN:STDEV" and
+    "lognormal:MEDIAN:SIGMA" (the usual shape of LLM response times).
+    """
+    kind, _, params = str(spec).partition(':')
+    if not params:
+        kind, params = 'fixed', kind
+    values = [float(value) for value in params.split(':')]
+    if kind == 'fixed':
+        return lambda rng: values[0]
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == 'normal':
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == 'lognormal':
+        return lambda rng: values[0] * rng.lognormvariate(0, values[1])
+    raise ValueError(f"Unknown latency distribution '{kind}'")
+
+
+def message_signature(message):
+    """What identifies a message in a request, leaving out the random tool call ids."""
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content, sort_keys=True)
+    calls = [[call['name'], call['args']] for call in getattr(message, 'tool_calls', None) or []]
+    return [message.type, content, calls]
+
+
+def current_turn(messages):
+    """The latest user message and how many model steps have been taken since it."""
+    human_at = max((index for index, message in enumerate(messages) if isinstance(message, HumanMessage)), default=-1)
+    question = messages[human_at].content if human_at >= 0 else ""
+    step = sum(isinstance(message, AIMessage) for message in messages[human_at + 1:])
+    return question, step
+
+
+def tool_call_id(*parts):
+    return 'call_' + hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:24]
+
+
+class SimulatedChatModel(BaseChatModel):
+    """
+    Base for chat models that make up their response locally.
+
+    Subclasses implement respond(); this class adds the latency (first token
+    after latency, then token_latency per streamed token), streaming of text
+    and tool calls, and token usage metadata.
+    """
+
+    model: str = 'simulated'
+    latency: str = '0'
+    token_latency: float = 0.0
+    seed: int = 0
+    tool_names: tuple = ()
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={'tool_names': tuple(getattr(tool, 'name', None) or tool.__name__ for tool in tools)})
+
+    def respond(self, messages):
+        """Return (AIMessage, seconds before the first token)."""
+        raise NotImplementedError
+
+    def sample_latency(self, messages):
+        # Seeded by the request, so the same conversation always sees the same delays
+        rng = random.Random(f"{self.seed}:{json.dumps([message_signature(message) for message in messages], default=str)}")
+        return parse_latency(self.latency)(rng)
+
+    def with_usage(self, message, messages):
+        prompt = sum(count_tokens(message_signature(item)[1]) for item in messages)
+        completion = count_tokens(message.content) + sum(count_tokens(json.dumps(call['args'])) for call in message.tool_calls)
+        completion += sum(count_tokens(call['args'] or '') for call in message.invalid_tool_calls)
+        message.usage_metadata = {'input_tokens': prompt, 'output_tokens': completion, 'total_tokens': prompt + completion}
+        return message
+
+    def chunks(self, message):
+        if message.invalid_tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                additional_kwargs=message.additional_kwargs,
+                tool_call_chunks=[
+                    {'name': call['name'], 'args': call['args'], 'id': call['id'], 'index': index}
+                    for index, call in enumerate(message.invalid_tool_calls)
+                ],
+                usage_metadata=message.usage_metadata,
+            ))
+            return
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                {'name': call['name'], 'args': json.dumps(call['args']), 'id': call['id'], 'index': index}
+                for index, call in enumerate(message.tool_calls)
+            ], usage_metadata=message.usage_metadata))
+            return
+        tokens = TOKEN_RE.findall(message.content) or [""]
+        for index, token in enumerate(tokens):
+            usage = message.usage_metadata if index == len(tokens) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        message, delay = self.respond(messages)
+        time.sleep(delay + self.token_latency * len(TOKEN_RE.findall(message.content)))
+        return ChatResult(generations=[ChatGeneration(message=self.with_usage(message, messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        message, delay = self.respond(messages)
+        await asyncio.sleep(delay + self.token_latency * len(TOKEN_RE.findall(message.content)))
+        return ChatResult(generations=[ChatGeneration(message=self.with_usage(message, messages))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        message, delay = self.respond(messages)
+        time.sleep(delay)
+        for chunk in self.chunks(self.with_usage(message, messages)):
+            yield chunk
+            time.sleep(self.token_latency)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        message, delay = self.respond(messages)
+        await asyncio.sleep(delay)
+        for chunk in self.chunks(self.with_usage(message, messages)):
+            yield chunk
+            await asyncio.sleep(self.token_latency)
+
+
+class FakeChatModel(SimulatedChatModel):
+    """
+    Deterministic offline chat model driven by a script.
+
+    A script is {"rules": [{"match": REGEX, "steps": [...]}, ...], "default": [...]}.
+    The first rule whose regex matches the latest user message is used, otherwise
+    the default steps; a rule with a "model" regex only applies to matching model
+    names, so each tier can be scripted differently. Step N is played as the
+    model's Nth response to that message: {"tool_calls": [{"name": ..., "args": ...}]},
+    {"content": ...}, or {"invalid_tool_calls": [{"name": ..., "args": "<not JSON>"}]}
+    for a tool call the agent cannot parse. Named regex groups and {input} are
+    substituted into contents and string arguments; dict arguments are sent as
+    the JSON string the chatbot's single-input tools expect. Once the steps run
+    out the last one is repeated.
+    """
+
+    script: dict = DEFAULT_FAKE_SCRIPT
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    @classmethod
+    def load_script(cls, path):
+        with open(path) as f:
+            return json.load(f)
+
+    def respond(self, messages):
+        question, step = current_turn(messages)
+        steps, variables = self.script.get('default') or DEFAULT_FAKE_SCRIPT['default'], {}
+        for rule in self.script.get('rules', []):
+            if rule.get('model') and not re.search(rule['model'], self.model):
+                continue
+            match = re.search(rule['match'], question, re.IGNORECASE)
+            if match:
+                steps, variables = rule['steps'], match.groupdict()
+                break
+        variables = {**variables, 'input': question}
+        planned = steps[min(step, len(steps) - 1)]
+
+        if planned.get('tool_calls'):
+            tool_calls = []
+            for index, call in enumerate(planned['tool_calls']):
+                args = self.fill(call.get('args', ''), variables)
+                if not isinstance(args, str):
+                    args = json.dumps(args)
+                tool_calls.append({'name': call['name'], 'args': {'__arg1': args}, 'id': tool_call_id(question, step, index)})
+            message = AIMessage(content="", tool_calls=tool_calls)
+        elif planned.get('invalid_tool_calls'):
+            # Malformed arguments, as they arrive from the API: kept raw next to the parsed (empty) calls
+            raw = [
+                {'name': call['name'], 'args': self.fill(call.get('args', ''), variables), 'id': tool_call_id(question, step, index)}
+                for index, call in enumerate(planned['invalid_tool_calls'])
+            ]
+            message = AIMessage(
+                content="",
+                additional_kwargs={'tool_calls': [
+                    {'id': call['id'], 'type': 'function', 'function': {'name': call['name'], 'arguments': call['args']}}
+                    for call in raw
+                ]},
+                invalid_tool_calls=[{**call, 'error': None} for call in raw],
+            )
+        else:
+            message = AIMessage(content=self.fill(planned.get('content', ''), variables))
+        return message, self.sample_latency(messages)
+
+    def fill(self, value, variables):
+        if isinstance(value, str):
+            for name, replacement in variables.items():
+                value = value.replace('{' + name + '}', replacement or '')
+            return value
+        if isinstance(value, dict):
+            return {key: self.fill(item, variables) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.fill(item, variables) for item in value]
+        return value
+
+
+class Cassette:
+    """
+    Recorded model responses in a JSON file.
+
+    Each interaction is stored under an exact key (every message of the request
+    and the bound tools) and a looser turn key (the latest user message and the
+    step within it), so replays survive small differences such as tool output
+    that changed with the data.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._interactions = None
+
+    @staticmethod
+    def keys(messages, tool_names):
+        question, step = current_turn(messages)
+        exact = json.dumps([[message_signature(message) for message in messages], sorted(tool_names)], default=str)
+        turn = json.dumps([question, step], default=str)
+        return hashlib.sha1(exact.encode()).hexdigest(), hashlib.sha1(turn.encode()).hexdigest()
+
+    def load(self):
+        if self._interactions is None:
+            if os.path.exists(self.path):
+                with open(self.path) as f:
+                    self._interactions = json.load(f).get('interactions', [])
+            else:
+                self._interactions = []
+        return self._interactions
+
+    def find(self, messages, tool_names):
+        key, turn_key = self.keys(messages, tool_names)
+        with self._lock:
+            interactions = self.load()
+            for field, value in (('key', key), ('turn_key', turn_key)):
+                for interaction in interactions:
+                    if interaction[field] == value:
+                        return interaction
+        question, step = current_turn(messages)
+        raise CassetteMiss(f"No recorded response for step {step} of {question!r} in {self.path}")
+
+    def record(self, messages, tool_names, message, latency):
+        key, turn_key = self.keys(messages, tool_names)
+        question, step = current_turn(messages)
+        with self._lock:
+            self.load().append({
+                'key': key,
+                'turn_key': turn_key,
+                'request': {'input': question, 'step': step, 'tools': sorted(tool_names)},
+                'response': {
+                    'content': message.content,
+                    'tool_calls': [{'name': call['name'], 'args': call['args']} for call in message.tool_calls],
+                },
+                'latency': round(latency, 4),
+            })
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'w') as f:
+                json.dump({'interactions': self._interactions}, f, indent=1, default=str)
+
+
+class RecordingChatModel(BaseChatModel):
+    """Pass requests through to a real chat model and save every response to a cassette."""
+
+    inner: Any
+    cassette: Any
+    tools: list = []
+
+    @property
+    def _llm_type(self):
+        return "recording-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={'tools': list(tools)})
+
+    def target(self):
+        return self.inner.bind_tools(self.tools) if self.tools else self.inner
+
+    def tool_names(self):
+        return [tool.name for tool in self.tools]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        started = time.perf_counter()
+        message = self.target().invoke(messages, stop=stop)
+        self.cassette.record(messages, self.tool_names(), message, time.perf_counter() - started)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        started = time.perf_counter()
+        message = await self.target().ainvoke(messages, stop=stop)
+        self.cassette.record(messages, self.tool_names(), message, time.perf_counter() - started)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class ReplayChatModel(SimulatedChatModel):
+    """Serve responses from a cassette, with their recorded latency unless recorded_latency is off."""
+
+    cassette: Any
+    recorded_latency: bool = True
+
+    @property
+    def _llm_type(self):
+        return "replay-chat"
+
+    def respond(self, messages):
+        interaction = self.cassette.find(messages, self.tool_names)
+        response = interaction['response']
+        question, step = current_turn(messages)
+        message = AIMessage(content=response['content'], tool_calls=[
+            {'name': call['name'], 'args': call['args'], 'id': tool_call_id(question, step, index)}
+            for index, call in enumerate(response['tool_calls'])
+        ])
+        if self.recorded_latency:
+            return message, interaction.get('latency', 0.0)
+        return message, self.sample_latency(messages)
+
+
+_cassettes = {}
+
+
+def get_cassette(path):
+    # One Cassette per file so concurrent sessions append to the same recording
+    if path not in _cassettes:
+        _cassettes[path] = Cassette(path)
+    return _cassettes[path]
+
+
+def build_chat_model(model, backend=None):
+    """The chat model for CHATBOT_LLM_BACKEND: "openai", "fake", "record" or "replay"."""
+    backend = backend or settings.CHATBOT_LLM_BACKEND
+    if backend == 'fake':
+        script = FakeChatModel.load_script(settings.CHATBOT_FAKE_LLM_SCRIPT) if settings.CHATBOT_FAKE_LLM_SCRIPT else DEFAULT_FAKE_SCRIPT
+        return FakeChatModel(
+            model=model,
+            script=script,
+            latency=settings.CHATBOT_FAKE_LLM_LATENCY,
+            token_latency=settings.CHATBOT_FAKE_LLM_TOKEN_LATENCY,
+            seed=settings.CHATBOT_FAKE_LLM_SEED,
+        )
+    if backend == 'replay':
+        return ReplayChatModel(
+            cassette=get_cassette(settings.CHATBOT_LLM_CASSETTE),
+            recorded_latency=not settings.CHATBOT_LLM_REPLAY_LATENCY,
+            latency=settings.CHATBOT_LLM_REPLAY_LATENCY or '0',
+            token_latency=settings.CHATBOT_FAKE_LLM_TOKEN_LATENCY,
+            seed=settings.CHATBOT_FAKE_LLM_SEED,
+        )
+
+    # Every model shares one pooled client; its transport retries within a budget, so the SDK must not
+    llm = ChatOpenAI(
+        model=model, temperature=0.3, api_key=settings.OPENAI_API_KEY,
+        http_async_client=get_llm_http_client(), max_retries=0,
+    )
+    if backend == 'record':
+        return RecordingChatModel(inner=llm, cassette=get_cassette(settings.CHATBOT_LLM_CASSETTE))
+    return llm
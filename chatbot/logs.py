@@ -0,0 +1,20 @@
+# chatbot/logs.py
+
+import json
+import logging
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; a record's `trace` extra is merged in at the top level."""
+
+    def format(self, record):
+        payload = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        payload.update(getattr(record, 'trace', None) or {})
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
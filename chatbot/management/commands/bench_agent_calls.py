@@ -0,0 +1,142 @@
+# chatbot/management/commands/bench_agent_calls.py
+
+import asyncio
+import json
+import re
+import time
+import uuid
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from chatbot.agent import build_agent_executor, build_llm
+from chatbot.tokens import count_tokens
+from chatbot.tools import TOOLS, student_overview_tool
+from students.models import Student
+
+# One scripted conversation; {student} is replaced by a real student_id
+CONVERSATION = [
+    "Show attendance, grades and internships for {student}",
+    "What are the grades and performance of {student}",
+    "Give me the profile and attendance of {student}",
+    "How is the attendance of {student}",
+    "Show the profile, attendance, grades, internships and performance for {student}",
+]
+ASPECTS = ('profile', 'attendance', 'grades', 'internships', 'performance')
+STUDENT_RE = re.compile(r"(?:for|of) (\S+)$")
+
+
+class ScriptedAgentModel(BaseChatModel):
+    """
+    Offline stand-in for the LLM that plans tool calls the way the agent does.
+
+    It reads the aspects and student out of the question. With get_student_overview
+    bound it asks for everything at once; otherwise it fetches one aspect per
+    round trip through get_student_details / get_student_session, or all of them in
+    one message when parallel_tool_calls is set. Once every result is in, it answers.
+    """
+
+    parallel_tool_calls: bool = False
+    tool_names: tuple = ()
+
+    @property
+    def _llm_type(self):
+        return "scripted-agent"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={'tool_names': tuple(tool.name for tool in tools)})
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        question_at = max(index for index, message in enumerate(messages) if isinstance(message, HumanMessage))
+        question = messages[question_at].content
+        done = sum(isinstance(message, ToolMessage) for message in messages[question_at:])
+
+        student = STUDENT_RE.search(question).group(1)
+        aspects = [aspect for aspect in ASPECTS if aspect in question.lower()]
+        if 'get_student_overview' in self.tool_names:
+            calls = [('get_student_overview', {'student': student, 'aspects': aspects})]
+        else:
+            calls = [
+                ('get_student_details', student) if aspect == 'profile'
+                else ('get_student_session', {'student_name': student, 'session': aspect.capitalize()})
+                for aspect in aspects
+            ]
+
+        if done >= len(calls):
+            message = AIMessage(content=f"Here is what I found for {student}.")
+        else:
+            batch = calls[done:] if self.parallel_tool_calls else calls[done:done + 1]
+            message = AIMessage(content="", tool_calls=[
+                {
+                    'name': name,
+                    'args': {'__arg1': tool_input if isinstance(tool_input, str) else json.dumps(tool_input)},
+                    'id': f'call_{uuid.uuid4().hex[:12]}',
+                }
+                for name, tool_input in batch
+            ])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class CallCounter(AsyncCallbackHandler):
+    """Counts LLM round trips and the prompt tokens sent on each of them."""
+
+    def __init__(self):
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.tool_calls = 0
+
+    async def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.llm_calls += 1
+        self.prompt_tokens += sum(
+            count_tokens(message.content if isinstance(message.content, str) else json.dumps(message.content))
+            for batch in messages for message in batch
+        )
+
+    async def on_tool_start(self, serialized, input_str, **kwargs):
+        self.tool_calls += 1
+
+
+class Command(BaseCommand):
+    help = 'Count LLM calls, tool calls and prompt tokens per scripted conversation, with and without get_student_overview'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conversations', type=int, default=10, help='Number of scripted conversations (one student each)')
+        parser.add_argument('--parallel-tool-calls', action='store_true',
+                            help='Let the offline model batch all session calls into one message')
+        parser.add_argument('--live', action='store_true', help='Use the configured OpenAI model instead of the offline planner')
+
+    def handle(self, *args, **options):
+        students = list(Student.objects.filter(is_deleted=False).values_list('student_id', flat=True)[:options['conversations']])
+        if not students:
+            raise CommandError('No students found; run "python manage.py insert_fake_data" first.')
+
+        session_tools = [tool for tool in TOOLS if tool is not student_overview_tool]
+        # Count every call, not the cached ones
+        with override_settings(CHATBOT_TOOL_CACHE_BACKEND='none'):
+            for label, tools in (('session tools', session_tools), ('overview tool', TOOLS)):
+                llm = build_llm(settings.CHATBOT_MODEL) if options['live'] else ScriptedAgentModel(parallel_tool_calls=options['parallel_tool_calls'])
+                executor = build_agent_executor(llm, tools)
+                executor.verbose = False
+                counter, elapsed = asyncio.run(self.run(executor, students))
+                turns = len(students) * len(CONVERSATION)
+                self.stdout.write(self.style.SUCCESS(
+                    f'{label:>13}: llm_calls/conversation={counter.llm_calls / len(students):.1f} '
+                    f'llm_calls/turn={counter.llm_calls / turns:.2f} '
+                    f'tool_calls/turn={counter.tool_calls / turns:.2f} '
+                    f'prompt_tokens/turn={counter.prompt_tokens / turns:.0f} '
+                    f'wall/turn={elapsed / turns * 1000:.1f}ms'
+                ))
+
+    async def run(self, executor, students):
+        counter = CallCounter()
+        started = time.perf_counter()
+        for student in students:
+            for question in CONVERSATION:
+                await executor.ainvoke(
+                    {"input": question.format(student=student), "chat_history": []},
+                    config={"callbacks": [counter]},
+                )
+        return counter, time.perf_counter() - started
@@ -0,0 +1,56 @@
+# chatbot/management/commands/bench_agent_setup.py
+
+import statistics
+import time
+import tracemalloc
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from chatbot.agent import AgentRegistry, build_agent_executor, build_llm
+from chatbot.tools import TOOLS
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the per-turn agent setup cost with and without the agent registry'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='Number of simulated turns')
+        parser.add_argument('--model', type=str, default=None, help='Model name to build the agent for')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        model = options['model'] or settings.CHATBOT_MODEL
+
+        def rebuild():
+            # What every turn used to do before the registry existed
+            return build_agent_executor(build_llm(model), TOOLS)
+
+        registry = AgentRegistry()
+
+        def cached():
+            return registry.get(model)
+
+        for label, setup in (('per-turn rebuild', rebuild), ('registry', cached)):
+            timings, peak = self.measure(setup, iterations)
+            self.stdout.write(self.style.SUCCESS(
+                f'{label:>16}: mean={statistics.mean(timings) * 1000:.3f}ms '
+                f'p50={self.percentile(timings, 50) * 1000:.3f}ms '
+                f'p95={self.percentile(timings, 95) * 1000:.3f}ms '
+                f'peak_alloc={peak / 1024:.1f}KiB'
+            ))
+
+    def measure(self, setup, iterations):
+        timings = []
+        tracemalloc.start()
+        for _ in range(iterations):
+            started = time.perf_counter()
+            setup()
+            timings.append(time.perf_counter() - started)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return timings, peak
+
+    @staticmethod
+    def percentile(values, pct):
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
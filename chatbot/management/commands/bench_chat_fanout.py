@@ -0,0 +1,74 @@
+# chatbot/management/commands/bench_chat_fanout.py
+
+import asyncio
+import json
+import statistics
+import time
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import path
+from chatbot.consumers import ChatConsumer
+
+
+class StubChatConsumer(ChatConsumer):
+    """ChatConsumer with the agent replaced by a canned answer, so only delivery is measured."""
+
+    async def get_ai_response(self, user_message, chat_history=None):
+        return f"echo: {user_message}"
+
+
+application = URLRouter([
+    path("ws/chat/", StubChatConsumer.as_asgi()),
+    path("ws/chat/<str:room_name>/", StubChatConsumer.as_asgi()),
+])
+
+
+class Command(BaseCommand):
+    help = 'Load test per-message delivery cost as the number of connected clients grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, nargs='+', default=[1, 10, 100, 500], help='Connection counts to test')
+        parser.add_argument('--messages', type=int, default=50, help='Messages sent per connection count')
+
+    def handle(self, *args, **options):
+        with override_settings(
+            CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer', 'CONFIG': {'capacity': 10000}}},
+            CHATBOT_MEMORY_BACKEND='local',
+            CHATBOT_ROOM_BACKEND='local',
+            CHATBOT_RATE_LIMIT_PER_MINUTE=10 ** 9,
+            CHATBOT_RATE_LIMIT_BURST=10 ** 9,
+            CHATBOT_COALESCE_BACKEND='none',
+        ):
+            for mode in ('private', 'room'):
+                for connections in options['connections']:
+                    timings = asyncio.run(self.run(mode, connections, options['messages']))
+                    self.stdout.write(self.style.SUCCESS(
+                        f'{mode:>7} connections={connections:<5} '
+                        f'mean={statistics.mean(timings) * 1000:.3f}ms '
+                        f'max={max(timings) * 1000:.3f}ms per message'
+                    ))
+
+    async def run(self, mode, connections, messages):
+        url = "/ws/chat/" if mode == 'private' else "/ws/chat/bench/"
+        communicators = [WebsocketCommunicator(application, url) for _ in range(connections)]
+        for communicator in communicators:
+            connected, _ = await communicator.connect()
+            assert connected
+
+        sender, others = communicators[0], communicators[1:]
+        timings = []
+        for i in range(messages):
+            started = time.perf_counter()
+            await sender.send_to(text_data=json.dumps({'message': f'hello {i}', 'stream': False}))
+            await sender.receive_from(timeout=10)
+            timings.append(time.perf_counter() - started)
+            if mode == 'room':
+                # Every room member receives the answer; drain them outside the timed section
+                for communicator in others:
+                    await communicator.receive_from(timeout=10)
+
+        for communicator in communicators:
+            await communicator.disconnect()
+        return timings
@@ -0,0 +1,425 @@
+# chatbot/management/commands/bench_chat_load.py
+
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+import aiohttp
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from chatbot.agent import agent_registry
+
+TERMINAL_FRAMES = {'final', 'error', 'rejected', 'cancelled'}
+RESULTS_VERSION = 1
+
+# Lower case and without "of"/"for": neither the fast path nor the prefetcher picks these up
+MESSAGE = "load test message {index} from connection {connection}"
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of values (q in 0..100), or None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize_ms(seconds):
+    if not seconds:
+        return None
+    return {
+        'p50': round(percentile(seconds, 50) * 1000, 2),
+        'p95': round(percentile(seconds, 95) * 1000, 2),
+        'p99': round(percentile(seconds, 99) * 1000, 2),
+        'max': round(max(seconds) * 1000, 2),
+        'mean': round(sum(seconds) / len(seconds) * 1000, 2),
+    }
+
+
+def rss_bytes(pid=None):
+    """Current resident set size of pid (this process by default), or None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if pid is None:
+        # Peak rather than current RSS, but still shows growth across levels
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == 'darwin' else usage * 1024
+    return None
+
+
+def raise_file_limit():
+    # Every connection is a file descriptor on both ends
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        with contextlib.suppress(ValueError, OSError):
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard if hard != resource.RLIM_INFINITY else 65536, hard))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class CommunicatorClient:
+    """In-process client: drives the ASGI application through channels' WebsocketCommunicator."""
+
+    def __init__(self, application, path):
+        self.communicator = WebsocketCommunicator(application, path)
+
+    async def connect(self):
+        connected, _ = await self.communicator.connect(timeout=10)
+        return connected
+
+    async def send(self, payload):
+        await self.communicator.send_to(text_data=json.dumps(payload))
+
+    async def receive(self, timeout):
+        return json.loads(await self.communicator.receive_from(timeout=timeout))
+
+    async def close(self):
+        await self.communicator.disconnect()
+
+
+class SocketClient:
+    """Real WebSocket over TCP against a running server."""
+
+    def __init__(self, session, url):
+        self.session = session
+        self.url = url
+        self.ws = None
+
+    async def connect(self):
+        try:
+            self.ws = await self.session.ws_connect(self.url, timeout=10, max_msg_size=0)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+            return False
+        return True
+
+    async def send(self, payload):
+        await self.ws.send_str(json.dumps(payload))
+
+    async def receive(self, timeout):
+        message = await self.ws.receive(timeout=timeout)
+        if message.type != aiohttp.WSMsgType.TEXT:
+            raise ConnectionError(f"socket closed ({message.type.name})")
+        return json.loads(message.data)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+
+class Command(BaseCommand):
+    help = ('Load test ws/chat/ with the fake LLM, in-process and over real sockets: connections per worker, '
+            'messages/s, end-to-end latency percentiles and RSS growth, optionally as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transport', choices=['communicator', 'socket', 'both'], default='both')
+        parser.add_argument('--connections', type=int, nargs='+', default=[10, 50, 100, 250, 500],
+                            help='Concurrent connection counts, tested in order')
+        parser.add_argument('--messages', type=int, default=5, help='Messages each connection sends, one after the other')
+        parser.add_argument('--think-time', type=float, default=0.0, help='Seconds a client waits between answer and next message')
+        parser.add_argument('--layer', choices=['memory', 'redis'], default='memory', help='Channel layer for the server')
+        parser.add_argument('--llm-latency', default='uniform:0.05:0.15', help='Fake LLM latency spec per call')
+        parser.add_argument('--token-latency', type=float, default=0.0, help='Fake LLM delay between streamed tokens')
+        parser.add_argument('--no-stream', action='store_true', help='Ask for one final frame instead of streamed tokens')
+        parser.add_argument('--max-agent-runs', type=int, default=settings.CHATBOT_MAX_CONCURRENT_AGENT_RUNS)
+        parser.add_argument('--max-queued', type=int, default=settings.CHATBOT_MAX_QUEUED_AGENT_RUNS)
+        parser.add_argument('--timeout', type=float, default=30.0, help='Seconds to wait for an answer before counting an error')
+        parser.add_argument('--slo-p99', type=float, default=2.0,
+                            help='p99 end-to-end seconds a level must meet to count towards connections per worker')
+        parser.add_argument('--max-error-rate', type=float, default=0.01,
+                            help='Share of failed or rejected messages a level may have to count towards connections per worker')
+        parser.add_argument('--server-url', help='Load an already running server (ws://host:port) instead of starting Daphne')
+        parser.add_argument('--server-pid', type=int, help='Process to sample RSS from when --server-url is used')
+        parser.add_argument('--output', help='Write the results as JSON to this file ("-" for stdout)')
+        parser.add_argument('--baseline', help='Earlier JSON results to compare against; regressions fail the command')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression against --baseline')
+
+    def handle(self, *args, **options):
+        raise_file_limit()
+        transports = ['communicator', 'socket'] if options['transport'] == 'both' else [options['transport']]
+        report = {
+            'benchmark': 'chat_load',
+            'version': RESULTS_VERSION,
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'host': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+            'config': {
+                key: options[key] for key in (
+                    'connections', 'messages', 'think_time', 'layer', 'llm_latency', 'token_latency', 'no_stream',
+                    'max_agent_runs', 'max_queued', 'slo_p99', 'max_error_rate',
+                )
+            },
+            'results': [],
+            'connections_per_worker': {},
+        }
+
+        for transport in transports:
+            results = self.run_transport(transport, options)
+            report['results'].extend(results)
+            report['connections_per_worker'][transport] = max(
+                (result['connections'] for result in results if result['within_slo']), default=0,
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'{transport:>12}: connections per worker={report["connections_per_worker"][transport]} '
+                f'(p99 <= {options["slo_p99"]}s, errors <= {options["max_error_rate"]:.0%})'
+            ))
+
+        if options['output']:
+            payload = json.dumps(report, indent=2)
+            if options['output'] == '-':
+                self.stdout.write(payload)
+            else:
+                with open(options['output'], 'w') as handle:
+                    handle.write(payload + '\n')
+
+        if options['baseline']:
+            regressions = self.compare(report, options['baseline'], options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
+
+    def server_env(self, options):
+        """Settings for the server under test, as environment variables."""
+        return {
+            'CHATBOT_LLM_BACKEND': 'fake',
+            'CHATBOT_FAKE_LLM_LATENCY': options['llm_latency'],
+            'CHATBOT_FAKE_LLM_TOKEN_LATENCY': str(options['token_latency']),
+            'CHATBOT_MEMORY_BACKEND': 'local',
+            'CHATBOT_ROOM_BACKEND': 'local',
+            'CHANNEL_LAYER_BACKEND': options['layer'],
+            # Measure capacity, not the per-connection rate limit
+            'CHATBOT_RATE_LIMIT_PER_MINUTE': str(10 ** 9),
+            'CHATBOT_RATE_LIMIT_BURST': str(10 ** 9),
+            'CHATBOT_MAX_CONCURRENT_AGENT_RUNS': str(options['max_agent_runs']),
+            'CHATBOT_MAX_QUEUED_AGENT_RUNS': str(options['max_queued']),
+            # Metrics stay on; one JSON line per turn would swamp the output
+            'CHATBOT_TRACE_LOG_LEVEL': 'WARNING',
+        }
+
+    def run_transport(self, transport, options):
+        if transport == 'communicator':
+            layer = settings.CHANNEL_LAYERS if options['layer'] == 'redis' else {
+                'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer', 'CONFIG': {'capacity': 10000}},
+            }
+            with override_settings(
+                CHANNEL_LAYERS=layer,
+                CHATBOT_LLM_BACKEND='fake',
+                CHATBOT_FAKE_LLM_LATENCY=options['llm_latency'],
+                CHATBOT_FAKE_LLM_TOKEN_LATENCY=options['token_latency'],
+                CHATBOT_MEMORY_BACKEND='local',
+                CHATBOT_ROOM_BACKEND='local',
+                CHATBOT_RATE_LIMIT_PER_MINUTE=10 ** 9,
+                CHATBOT_RATE_LIMIT_BURST=10 ** 9,
+                CHATBOT_MAX_CONCURRENT_AGENT_RUNS=options['max_agent_runs'],
+                CHATBOT_MAX_QUEUED_AGENT_RUNS=options['max_queued'],
+            ), contextlib.redirect_stdout(io.StringIO()):
+                # The agent executor is verbose; keep its trace and the turn logs out of the report
+                agent_registry.clear()
+                from chatbot_project.asgi import application
+                logging.getLogger('chatbot.trace').setLevel(logging.WARNING)
+                return asyncio.run(self.run_levels(
+                    transport, options, lambda: CommunicatorClient(application, "/ws/chat/"), pid=None,
+                ))
+
+        if options['server_url']:
+            return asyncio.run(self.run_socket_levels(options['server_url'], options, options['server_pid']))
+
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'daphne', '-b', '127.0.0.1', '-p', str(port), 'chatbot_project.asgi:application'],
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'chatbot_project.settings', **self.server_env(options)},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            self.wait_for_port(port, server)
+            return asyncio.run(self.run_socket_levels(f'ws://127.0.0.1:{port}', options, server.pid))
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    @staticmethod
+    def wait_for_port(port, server, timeout=30.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Daphne exited with status {server.returncode} before accepting connections')
+            with contextlib.suppress(OSError), socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+            time.sleep(0.1)
+        raise CommandError(f'Daphne did not start listening on port {port} within {timeout:.0f}s')
+
+    async def run_socket_levels(self, server_url, options, pid):
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            url = server_url.rstrip('/') + '/ws/chat/'
+            return await self.run_levels('socket', options, lambda: SocketClient(session, url), pid=pid)
+
+    async def run_levels(self, transport, options, make_client, pid):
+        results = []
+        for connections in options['connections']:
+            result = await self.run_level(connections, options, make_client, pid)
+            result = {'transport': transport, 'layer': options['layer'], **result}
+            result['within_slo'] = (
+                result['connect_failures'] == 0
+                and result['error_rate'] <= options['max_error_rate']
+                and result['latency_ms'] is not None
+                and result['latency_ms']['p99'] <= options['slo_p99'] * 1000
+            )
+            results.append(result)
+            latency = result['latency_ms'] or {}
+            self.stdout.write(
+                f'{transport:>12} connections={connections:<5} '
+                f'msgs/s={result["messages_per_s"]:<8.1f} '
+                f'p50={latency.get("p50")}ms p95={latency.get("p95")}ms p99={latency.get("p99")}ms '
+                f'errors={result["errors"]} rejected={result["rejected"]} connect_failures={result["connect_failures"]} '
+                f'rss_growth={result["rss_growth_mb"]}MB'
+            )
+        return results
+
+    async def run_level(self, connections, options, make_client, pid):
+        rss_before = rss_bytes(pid)
+        clients = [make_client() for _ in range(connections)]
+
+        async def connect(client):
+            started = time.perf_counter()
+            connected = await client.connect()
+            return connected, time.perf_counter() - started
+
+        connect_results = await asyncio.gather(*(connect(client) for client in clients))
+        connected_clients = [client for client, (ok, _) in zip(clients, connect_results) if ok]
+        rss_connected = rss_bytes(pid)
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(
+            self.converse(client, index, options) for index, client in enumerate(connected_clients)
+        ))
+        duration = time.perf_counter() - started
+        rss_after = rss_bytes(pid)
+
+        await asyncio.gather(*(client.close() for client in connected_clients), return_exceptions=True)
+
+        latencies = [value for outcome in outcomes for value in outcome['latencies']]
+        first_tokens = [value for outcome in outcomes for value in outcome['first_tokens']]
+        sent = sum(outcome['sent'] for outcome in outcomes)
+        errors = sum(outcome['errors'] for outcome in outcomes)
+        rejected = sum(outcome['rejected'] for outcome in outcomes)
+
+        def megabytes(value):
+            return round(value / 2 ** 20, 2) if value is not None else None
+
+        return {
+            'connections': connections,
+            'connect_failures': connections - len(connected_clients),
+            'connect_ms': summarize_ms([elapsed for ok, elapsed in connect_results if ok]),
+            'messages_sent': sent,
+            'completed': len(latencies),
+            'errors': errors,
+            'rejected': rejected,
+            'error_rate': round((errors + rejected) / sent, 4) if sent else 1.0,
+            'duration_s': round(duration, 3),
+            'messages_per_s': round(len(latencies) / duration, 2) if duration else 0.0,
+            'latency_ms': summarize_ms(latencies),
+            'first_token_ms': summarize_ms(first_tokens),
+            'rss_mb': {'before': megabytes(rss_before), 'connected': megabytes(rss_connected), 'after': megabytes(rss_after)},
+            'rss_growth_mb': megabytes(rss_after - rss_before) if rss_before is not None and rss_after is not None else None,
+            'rss_per_connection_kb': (
+                round((rss_connected - rss_before) / connections / 1024, 1)
+                if rss_before is not None and rss_connected is not None else None
+            ),
+        }
+
+    async def converse(self, client, connection, options):
+        """Send messages one after another on one connection, timing each from send to its terminal frame."""
+        outcome = {'sent': 0, 'errors': 0, 'rejected': 0, 'latencies': [], 'first_tokens': []}
+        for index in range(options['messages']):
+            message_id = f'{connection}-{index}'
+            started = time.perf_counter()
+            first_token = None
+            try:
+                await client.send({
+                    'message': MESSAGE.format(index=index, connection=connection),
+                    'id': message_id,
+                    'stream': not options['no_stream'],
+                })
+                outcome['sent'] += 1
+                while True:
+                    frame = await client.receive(timeout=options['timeout'])
+                    if frame.get('message_id') != message_id:
+                        continue
+                    if frame['type'] == 'token' and first_token is None:
+                        first_token = time.perf_counter() - started
+                    if frame['type'] in TERMINAL_FRAMES:
+                        break
+            except (asyncio.TimeoutError, ConnectionError, aiohttp.ClientError):
+                outcome['errors'] += 1
+                # The connection is out of step or gone; stop using it
+                break
+
+            if frame['type'] == 'final':
+                outcome['latencies'].append(time.perf_counter() - started)
+                if first_token is not None:
+                    outcome['first_tokens'].append(first_token)
+            elif frame['type'] == 'rejected':
+                outcome['rejected'] += 1
+            else:
+                outcome['errors'] += 1
+            if options['think_time']:
+                await asyncio.sleep(options['think_time'])
+        return outcome
+
+    @staticmethod
+    def compare(report, baseline_path, tolerance):
+        """Describe every metric that got worse than the baseline by more than tolerance."""
+        with open(baseline_path) as handle:
+            baseline = json.load(handle)
+        previous = {(result['transport'], result['layer'], result['connections']): result for result in baseline['results']}
+
+        regressions = []
+        for result in report['results']:
+            key = (result['transport'], result['layer'], result['connections'])
+            before = previous.get(key)
+            if before is None:
+                continue
+            label = f'{key[0]}/{key[1]} connections={key[2]}'
+            if before['messages_per_s'] and result['messages_per_s'] < before['messages_per_s'] * (1 - tolerance):
+                regressions.append(f'{label}: messages/s {before["messages_per_s"]} -> {result["messages_per_s"]}')
+            for metric in ('p95', 'p99'):
+                old = (before.get('latency_ms') or {}).get(metric)
+                new = (result.get('latency_ms') or {}).get(metric)
+                if old and new and new > old * (1 + tolerance):
+                    regressions.append(f'{label}: {metric} {old}ms -> {new}ms')
+            old_rss, new_rss = before.get('rss_per_connection_kb'), result.get('rss_per_connection_kb')
+            if old_rss and new_rss and new_rss > old_rss * (1 + tolerance):
+                regressions.append(f'{label}: RSS per connection {old_rss}KB -> {new_rss}KB')
+
+        if baseline.get('config', {}).get('connections') != report['config']['connections']:
+            # Connections per worker is the highest level tested; only comparable over the same levels
+            return regressions
+        for transport, count in report['connections_per_worker'].items():
+            old = baseline.get('connections_per_worker', {}).get(transport)
+            if old and count < old:
+                regressions.append(f'{transport}: connections per worker {old} -> {count}')
+        return regressions
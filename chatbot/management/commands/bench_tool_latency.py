@@ -0,0 +1,68 @@
+# chatbot/management/commands/bench_tool_latency.py
+
+import asyncio
+import random
+import time
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from chatbot import tools
+from students.models import Student
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark chatbot tool latency percentiles under concurrent chat sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=50, help='Number of concurrent chat sessions')
+        parser.add_argument('--calls', type=int, default=20, help='Tool calls per session')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the tool mix')
+
+    def handle(self, *args, **options):
+        names = list(Student.objects.values_list('name', flat=True)[:100])
+        if not names:
+            raise CommandError('No students found; run "python manage.py insert_fake_data" first.')
+
+        # Measure the database work, not the tool cache
+        with override_settings(CHATBOT_TOOL_CACHE_BACKEND='none'):
+            for label, wrap in (('thread-sensitive', sync_to_async), ('tool pool', tools.tool_to_async)):
+                random.seed(options['seed'])
+                latencies, elapsed = asyncio.run(self.run(wrap, names, options['sessions'], options['calls']))
+                self.stdout.write(self.style.SUCCESS(f'{label} (wall={elapsed:.2f}s)'))
+                every_call = [value for values in latencies.values() for value in values]
+                for tool_name, values in sorted(latencies.items()) + [('all tools', every_call)]:
+                    self.stdout.write(
+                        f'  {tool_name:>26}: calls={len(values):<5} '
+                        f'p50={percentile(values, 50) * 1000:.1f}ms '
+                        f'p95={percentile(values, 95) * 1000:.1f}ms '
+                        f'p99={percentile(values, 99) * 1000:.1f}ms'
+                    )
+
+    async def run(self, wrap, names, sessions, calls):
+        mix = [
+            (wrap(tools.get_student_details_sync), lambda: (random.choice(names),)),
+            (wrap(tools.get_student_session), lambda: (random.choice(names), random.choice(['Attendance', 'Grades', 'Performance']))),
+            (wrap(tools.count_total_records), lambda: (random.choice(['students', 'grades', 'attendance']),)),
+            (wrap(tools.failed_students), lambda: (None,)),
+            (wrap(tools.topper_students_list), lambda: (None,)),
+        ]
+        # Pick every argument up front so both runs see the same workload
+        plan = [[random.choice(mix) for _ in range(calls)] for _ in range(sessions)]
+        plan = [[(func, make_args()) for func, make_args in session] for session in plan]
+        latencies = {}
+
+        async def session(steps):
+            for func, args in steps:
+                started = time.perf_counter()
+                await func(*args)
+                latencies.setdefault(func.func.__name__, []).append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(session(steps) for steps in plan))
+        return latencies, time.perf_counter() - started
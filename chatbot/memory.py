@@ -0,0 +1,225 @@
+# chatbot/memory.py
+
+import asyncio
+import json
+import time
+import weakref
+from django.conf import settings
+from redis.exceptions import WatchError
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from .redis_client import get_redis
+from .tokens import count_tokens, truncate_to_tokens
+
+SUMMARY_PROMPT = '''
+Progressively summarise the conversation between a user and a student-records assistant.
+Keep every student name, id, course and figure that was looked up so follow-up questions can be answered without fetching them again.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{lines}
+
+New summary:
+'''
+
+
+class LocalMemoryStore:
+    """Single-process memory store, for development and tests."""
+
+    def __init__(self):
+        self._data = {}
+        self._locks = weakref.WeakValueDictionary()
+
+    async def get(self, key):
+        value, expires_at = self._data.get(key, (None, 0))
+        if value is not None and expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    async def set(self, key, value, ttl):
+        self._data[key] = (value, time.monotonic() + ttl)
+
+    async def delete(self, key):
+        self._data.pop(key, None)
+
+    async def update(self, key, mutate, ttl):
+        """Replace the value of key with mutate(value), unless that is None; one update per key at a time."""
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        async with lock:
+            value = mutate(await self.get(key))
+            if value is not None:
+                await self.set(key, value, ttl)
+            return value
+
+
+class RedisMemoryStore:
+    """Memory store backed by the Redis instance used for CHANNEL_LAYERS."""
+
+    async def get(self, key):
+        return await get_redis().get(key)
+
+    async def set(self, key, value, ttl):
+        await get_redis().set(key, value, ex=ttl)
+
+    async def delete(self, key):
+        await get_redis().delete(key)
+
+    async def update(self, key, mutate, ttl):
+        """Replace the value of key with mutate(value), unless that is None, in a WATCH/MULTI transaction."""
+        async with get_redis().pipeline() as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    value = mutate(await pipe.get(key))
+                    if value is None:
+                        return None
+                    pipe.multi()
+                    pipe.set(key, value, ex=ttl)
+                    await pipe.execute()
+                    return value
+                except WatchError:
+                    # Another worker wrote key between our read and our write; start over
+                    continue
+
+
+_store = None
+
+
+def get_memory_store():
+    global _store
+    if _store is None:
+        if settings.CHATBOT_MEMORY_BACKEND == 'local':
+            _store = LocalMemoryStore()
+        else:
+            _store = RedisMemoryStore()
+    return _store
+
+
+async def summarize_turns(summary, turns):
+    """Fold turns into the running summary with the (cheap) CHATBOT_SUMMARY_MODEL."""
+    from .agent import build_llm
+
+    lines = "\n".join(f"User: {turn['human']}\nAssistant: {turn['ai']}" for turn in turns)
+    try:
+        llm = build_llm(settings.CHATBOT_SUMMARY_MODEL)
+        result = await llm.ainvoke(SUMMARY_PROMPT.format(summary=summary or "(empty)", lines=lines))
+        return result.content
+    except Exception as e:
+        # Keep the raw lines rather than losing the context altogether
+        print(f"Error summarising conversation: {e}")
+        return f"{summary}\n{lines}".strip()
+
+
+def decode_state(raw):
+    if not raw:
+        return {"summary": "", "turns": []}
+    return json.loads(raw)
+
+
+class ConversationMemory:
+    """
+    Rolling conversation memory for one connection, authenticated user or room.
+
+    The most recent turns are kept verbatim while they fit in token_budget; older
+    turns are folded into a summary capped at summary_tokens, so the prompt size
+    stays bounded however long the conversation runs.
+    """
+
+    def __init__(self, key, store=None, token_budget=None, summary_tokens=None, ttl=None, summarizer=None):
+        self.key = key
+        self.store = store or get_memory_store()
+        self.token_budget = token_budget or settings.CHATBOT_MEMORY_TOKEN_BUDGET
+        self.summary_tokens = summary_tokens or settings.CHATBOT_MEMORY_SUMMARY_TOKENS
+        self.ttl = ttl or settings.CHATBOT_MEMORY_TTL
+        self.summarizer = summarizer or summarize_turns
+
+    @classmethod
+    def for_consumer(cls, consumer, **kwargs):
+        if consumer.room_name:
+            # Members of a shared room share one conversation
+            return cls(f'chatbot:memory:room:{consumer.room_name}', **kwargs)
+        user = consumer.scope.get('user')
+        if settings.CHATBOT_MEMORY_PER_USER and user is not None and user.is_authenticated:
+            return cls(f'chatbot:memory:user:{user.pk}', **kwargs)
+        return cls(f'chatbot:memory:conn:{consumer.channel_name}', **kwargs)
+
+    @property
+    def is_connection_scoped(self):
+        return ':conn:' in self.key
+
+    async def load(self):
+        return decode_state(await self.store.get(self.key))
+
+    async def load_messages(self):
+        state = await self.load()
+        messages = []
+        if state["summary"]:
+            messages.append(SystemMessage(content=f"Summary of the earlier conversation:\n{state['summary']}"))
+        for turn in state["turns"]:
+            messages.append(HumanMessage(content=turn["human"]))
+            messages.append(AIMessage(content=turn["ai"]))
+        return messages
+
+    async def append(self, human, ai):
+        """
+        Add a turn. Appends to one key are serialised by the store, so turns
+        saved at the same time (two sockets of one user, members of a room)
+        are all kept; folding old turns into the summary is left to compact().
+        """
+        turn = {
+            "human": human,
+            "ai": ai if isinstance(ai, str) else json.dumps(ai, default=str),
+        }
+
+        def add_turn(raw):
+            state = decode_state(raw)
+            state["turns"].append(turn)
+            return json.dumps(state)
+
+        await self.store.update(self.key, add_turn, self.ttl)
+
+    async def clear(self):
+        await self.store.delete(self.key)
+
+    def turn_tokens(self, turn):
+        return count_tokens(turn["human"]) + count_tokens(turn["ai"])
+
+    def evictable(self, turns):
+        """The oldest turns that have to go for the rest to fit in token_budget."""
+        used = sum(self.turn_tokens(turn) for turn in turns)
+        evicted = []
+        # Always keep the latest turn verbatim, even if it alone exceeds the budget
+        for turn in turns[:-1]:
+            if used <= self.token_budget:
+                break
+            used -= self.turn_tokens(turn)
+            evicted.append(turn)
+        return evicted
+
+    async def compact(self):
+        """
+        Fold the turns that no longer fit in token_budget into the summary,
+        capped at summary_tokens; returns whether anything was folded.
+
+        The summariser is a model call, so it runs outside the per-key update:
+        the new summary is only written if the summary and the turns it was
+        built from are still at the head of the memory, and a compaction that
+        lost the race to another one (or to clear()) is dropped.
+        """
+        state = await self.load()
+        evicted = self.evictable(state["turns"])
+        if not evicted:
+            return False
+        summary = truncate_to_tokens(await self.summarizer(state["summary"], evicted), self.summary_tokens)
+
+        def fold(raw):
+            current = decode_state(raw)
+            if not raw or current["summary"] != state["summary"] or current["turns"][:len(evicted)] != evicted:
+                return None
+            return json.dumps({"summary": summary, "turns": current["turns"][len(evicted):]})
+
+        return await self.store.update(self.key, fold, self.ttl) is not None
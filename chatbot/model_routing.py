@@ -0,0 +1,190 @@
+# chatbot/model_routing.py
+
+import re
+import threading
+import time
+from dataclasses import dataclass
+from django.conf import settings
+from langchain_core.tools import ToolException
+from .agent import ToolCallParseError, agent_registry
+from .metrics import registry
+from .prefetch import ASPECT_WORDS, STUDENT_ID_RE, extract_candidates
+from .router import COUNT_TARGETS
+from .tracing import current_trace
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+LOOKUP, REASONING, GENERAL = 'lookup', 'reasoning', 'general'
+
+# Questions that need several tool results combined, or statistics over many students
+REASONING_WORDS = {
+    'compare', 'comparison', 'versus', 'vs', 'why', 'trend', 'trends', 'correlation', 'correlate', 'average',
+    'averages', 'mean', 'median', 'across', 'each', 'per', 'distribution', 'percentage', 'proportion', 'analyse',
+    'analyze', 'analysis', 'explain', 'between', 'difference', 'improve', 'improved', 'improvement', 'statistics',
+    'breakdown', 'department', 'departments', 'semesters', 'correlated', 'relationship', 'predict',
+}
+
+# Words that mean the answer comes from the students database
+DATA_WORDS = set(ASPECT_WORDS) | {word for words in COUNT_TARGETS.values() for word in words} | {
+    'gpa', 'topper', 'toppers', 'top', 'failed', 'fail', 'failing', 'scholarship', 'enrolled', 'enrollment',
+    'record', 'records', 'marks', 'semester', 'overview', 'profile', 'student_id',
+}
+
+# A tool call the agent could not parse, or arguments the tool could not accept
+ESCALATE_ON = (ToolCallParseError, ToolException)
+
+TIER_TURNS = registry.counter('chatbot_model_tier_turns_total', 'Agent turns per model tier and complexity', ('tier', 'complexity'))
+TIER_SECONDS = registry.histogram('chatbot_model_tier_turn_seconds', 'Agent run time per model tier', ('tier',))
+TIER_COST = registry.counter('chatbot_model_tier_cost_usd_total', 'Estimated LLM spend per model tier', ('tier',))
+ESCALATIONS = registry.counter('chatbot_model_escalations_total', 'Runs retried on a larger tier', ('from_tier', 'to_tier'))
+
+
+@dataclass
+class TurnRoute:
+    complexity: str
+    tier: str
+    reason: str
+
+
+def classify_turn(message):
+    """
+    Guess how much reasoning a message needs, without calling a model.
+
+    reasoning: statistics, comparisons or several students; lookup: one student
+    or one kind of record, answered by a single tool call; general: nothing that
+    touches the students database (general knowledge, aptitude, small talk).
+    """
+    words = set(WORD_RE.findall(message.lower()))
+    # A lone capitalised word is as likely to be "France" as a student, and a bare number
+    # a quantity; ids with letters and full names are not
+    students = [
+        candidate for candidate in extract_candidates(message)
+        if (STUDENT_ID_RE.fullmatch(candidate) and not candidate.isdigit()) or len(candidate.split()) > 1
+    ]
+    if words & REASONING_WORDS:
+        return REASONING, f"asks for {sorted(words & REASONING_WORDS)[0]!r}"
+    if len(students) > 1:
+        return REASONING, f"names {len(students)} students"
+    if len(words) > settings.CHATBOT_MODEL_ROUTING_MAX_LOOKUP_WORDS:
+        return REASONING, f"{len(words)} distinct words"
+    if students or words & DATA_WORDS:
+        return LOOKUP, f"names {students[0]!r}" if students else "asks about student records"
+    return GENERAL, "no student data involved"
+
+
+class ModelRouter:
+    """
+    Pick a model tier per turn and escalate when the tier fumbles a tool call.
+
+    Tiers come from CHATBOT_MODEL_TIERS, cheapest first; CHATBOT_MODEL_POLICY maps
+    each complexity to the tier it starts on. A run that fails to produce a
+    parsable tool call is retried from scratch on the next tier up. Each tier's
+    runs, latency, tokens and estimated cost are counted from the turn's trace.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @property
+    def tiers(self):
+        return list(settings.CHATBOT_MODEL_TIERS)
+
+    def model_for(self, tier):
+        return settings.CHATBOT_MODEL_TIERS[tier]
+
+    def next_tier(self, tier):
+        tiers = self.tiers
+        index = tiers.index(tier)
+        return tiers[index + 1] if index + 1 < len(tiers) else None
+
+    def plan(self, message):
+        if not settings.CHATBOT_MODEL_ROUTING_ENABLED:
+            return TurnRoute('unrouted', self.tiers[-1], "routing disabled")
+        complexity, reason = classify_turn(message)
+        tier = settings.CHATBOT_MODEL_POLICY.get(complexity, self.tiers[-1])
+        return TurnRoute(complexity, tier, reason)
+
+    async def run(self, message, attempt, on_escalate=None):
+        """
+        Await attempt(agent_executor) on the planned tier, escalating on tool-call
+        failures; on_escalate(from_tier, to_tier) is awaited before each retry.
+        """
+        route = self.plan(message)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.tags.update({'complexity': route.complexity, 'tier': route.tier, 'route_reason': route.reason})
+
+        tier = route.tier
+        while True:
+            first_span = len(trace.spans) if trace is not None else 0
+            started = time.perf_counter()
+            try:
+                result = await attempt(agent_registry.get(self.model_for(tier)))
+            except ESCALATE_ON:
+                self.record(tier, route.complexity, started, trace, first_span, failed=True)
+                next_tier = self.next_tier(tier)
+                if next_tier is None:
+                    raise
+                ESCALATIONS.inc(from_tier=tier, to_tier=next_tier)
+                if trace is not None:
+                    trace.tags.setdefault('escalations', []).append(next_tier)
+                if on_escalate is not None:
+                    await on_escalate(tier, next_tier)
+                tier = next_tier
+                continue
+            self.record(tier, route.complexity, started, trace, first_span)
+            return result
+
+    def record(self, tier, complexity, started, trace, first_span, failed=False):
+        seconds = time.perf_counter() - started
+        model = self.model_for(tier)
+        prompt = completion = calls = 0
+        if trace is not None:
+            for span in list(trace.spans)[first_span:]:
+                if span['kind'] == 'llm':
+                    calls += 1
+                    prompt += span.get('prompt_tokens', 0)
+                    completion += span.get('completion_tokens', 0)
+        cost = estimate_cost(model, prompt, completion)
+
+        TIER_TURNS.inc(tier=tier, complexity=complexity)
+        TIER_SECONDS.observe(seconds, tier=tier)
+        TIER_COST.inc(cost, tier=tier)
+        with self._lock:
+            stats = self._stats.setdefault(tier, {
+                'runs': 0, 'failed_runs': 0, 'llm_calls': 0, 'seconds': 0.0,
+                'prompt_tokens': 0, 'completion_tokens': 0, 'cost_usd': 0.0, 'complexity': {},
+            })
+            stats['runs'] += 1
+            stats['failed_runs'] += failed
+            stats['llm_calls'] += calls
+            stats['seconds'] += seconds
+            stats['prompt_tokens'] += prompt
+            stats['completion_tokens'] += completion
+            stats['cost_usd'] += cost
+            stats['complexity'][complexity] = stats['complexity'].get(complexity, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            tiers = {tier: {**stats, 'complexity': dict(stats['complexity'])} for tier, stats in self._stats.items()}
+        for tier, stats in tiers.items():
+            stats['model'] = self.model_for(tier) if tier in settings.CHATBOT_MODEL_TIERS else None
+            stats['mean_seconds'] = stats['seconds'] / stats['runs'] if stats['runs'] else 0.0
+            stats['cost_usd'] = round(stats['cost_usd'], 6)
+        return tiers
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """USD for a call from CHATBOT_MODEL_PRICES (per million tokens); 0 for unknown models."""
+    prices = settings.CHATBOT_MODEL_PRICES.get(model)
+    if prices is None:
+        return 0.0
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+
+model_router = ModelRouter()
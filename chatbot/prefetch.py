@@ -0,0 +1,191 @@
+# chatbot/prefetch.py
+
+import asyncio
+import re
+import threading
+from django.conf import settings
+from .cache import MISSING, tool_cache
+from .router import FILLER_WORDS
+from .tools import get_student_details_sync, get_student_session, tool_to_async
+
+WORD_RE = re.compile(r"[\w'.-]+|[^\w\s]")
+STUDENT_ID_RE = re.compile(r"\b[A-Za-z]{0,4}\d{2,}[A-Za-z0-9-]*\b")
+PREPOSITIONS = {'of', 'for', 'about', 'on'}
+
+# Words that end (or never start) a name: question words plus what the tools fetch
+NOT_NAME_WORDS = FILLER_WORDS | PREPOSITIONS | {
+    'and', 'or', 'with', 'his', 'her', 'their', 'this', 'that', 'does', 'did', 'was', 'were', 'how', 'doing',
+    'student', 'students', 'attendance', 'grades', 'grade', 'internships', 'internship', 'performance',
+    'profile', 'details', 'detail', 'gpa', 'marks', 'course', 'courses', 'semester', 'year', 'everything',
+    'info', 'information', 'i', 'need', 'want', 'see', 'find', 'check', 'hi', 'hello', 'thanks',
+}
+
+# What a message asks about -> the student tool call it leads to (None: get_student_details)
+ASPECT_WORDS = {
+    'attendance': 'Attendance', 'present': 'Attendance', 'absent': 'Attendance',
+    'grade': 'Grades', 'grades': 'Grades', 'marks': 'Grades', 'exam': 'Grades', 'exams': 'Grades',
+    'internship': 'Internships', 'internships': 'Internships',
+    'performance': 'Performance', 'failed': 'Performance', 'passed': 'Performance',
+    'profile': None, 'details': None, 'detail': None, 'gpa': None, 'contact': None, 'email': None,
+}
+
+
+def requested_sessions(message):
+    """The get_student_session sessions (None for details) a message asks about; all of them if it names none."""
+    words = {word.lower().strip(".,!?;:'\"") for word in WORD_RE.findall(message)}
+    sessions = {ASPECT_WORDS[word] for word in words if word in ASPECT_WORDS}
+    return sessions or {None, 'Attendance', 'Grades', 'Internships', 'Performance'}
+
+
+def extract_candidates(message, limit=4):
+    """
+    Cheaply guess which students a message names, before any LLM call.
+
+    Candidates are student-id-like tokens, runs of capitalised words, and the
+    words following "of"/"for"/"about" ("attendance of rahul sharma"), with
+    question and subject words trimmed off. Strings are returned as typed,
+    because the agent usually passes the name on exactly like that.
+    """
+    candidates = STUDENT_ID_RE.findall(message)
+    words = WORD_RE.findall(message)
+
+    run, after_preposition = [], False
+    for word in words + ['.']:
+        bare = word.strip(".,!?;:'\"").removesuffix("'s")
+        is_name = bool(bare) and bare.isalpha() and bare.lower() not in NOT_NAME_WORDS
+        if is_name and (bare[0].isupper() or after_preposition or run):
+            run.append(bare)
+        else:
+            if run:
+                candidates.append(" ".join(run))
+            run = []
+        if word.lower() in PREPOSITIONS:
+            after_preposition = True
+        elif not is_name:
+            after_preposition = False
+
+    unique = {}
+    for candidate in candidates:
+        unique.setdefault(" ".join(candidate.lower().split()), candidate)
+    return list(unique.values())[:limit]
+
+
+class SpeculativePrefetcher:
+    """
+    Warm the tool cache for the students a message names while the LLM plans.
+
+    The first agent step for such a message is nearly always get_student_details
+    or get_student_session for that name, for the sessions the message mentions
+    (all of them when it mentions none). Resolving the name and running those
+    tools on the tool pool in parallel with the LLM request means the tool call
+    that follows is a cache hit, or waits on the fetch already in flight.
+    At most max_concurrency fetches hold tool pool threads at once, so
+    speculation never crowds out the tool calls agents are waiting on.
+    """
+
+    def __init__(self, max_concurrency=None):
+        self._lock = threading.Lock()
+        self._stats = {'turns': 0, 'prefetched_turns': 0, 'hit_turns': 0, 'fetches': 0, 'hits': 0, 'skipped_fetches': 0}
+        self.max_concurrency = settings.CHATBOT_PREFETCH_MAX_CONCURRENCY if max_concurrency is None else max_concurrency
+        self.active = 0
+
+    def start(self, message):
+        """Begin prefetching for message; returns a PrefetchRun to finish() when the turn ends, or None."""
+        if not (settings.CHATBOT_PREFETCH_ENABLED and tool_cache.enabled):
+            return None
+        candidates = extract_candidates(message)
+        with self._lock:
+            self._stats['turns'] += 1
+        if not candidates:
+            return None
+        return PrefetchRun(self, candidates, requested_sessions(message))
+
+    def plan(self, candidates, sessions):
+        """Resolve candidates and return the (func, args, key) calls whose results are not cached yet."""
+        from students.name_index import resolve_student
+
+        names = []
+        for candidate in candidates:
+            student, _ = resolve_student(candidate)
+            if student is not None:
+                names.append(candidate)
+            if len(names) >= settings.CHATBOT_PREFETCH_MAX_STUDENTS:
+                break
+
+        calls = []
+        for name in names:
+            for session in sorted(sessions, key=str):
+                func, args = (get_student_details_sync, (name,)) if session is None else (get_student_session, (name, session))
+                key = func.cache_key(*args)
+                if tool_cache.backend.get(key) is MISSING:
+                    calls.append((func, args, key))
+        return calls
+
+    def acquire(self):
+        """Take a fetch slot, or return False when prefetches already hold their share of the tool pool."""
+        with self._lock:
+            if self.active >= self.max_concurrency:
+                self._stats['skipped_fetches'] += 1
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+    def record(self, fetches, hits):
+        with self._lock:
+            if fetches:
+                self._stats['prefetched_turns'] += 1
+                self._stats['fetches'] += fetches
+                self._stats['hits'] += hits
+                if hits:
+                    self._stats['hit_turns'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['wasted_fetches'] = stats['fetches'] - stats['hits']
+        stats['hit_rate'] = stats['hits'] / stats['fetches'] if stats['fetches'] else 0.0
+        stats['turn_hit_rate'] = stats['hit_turns'] / stats['prefetched_turns'] if stats['prefetched_turns'] else 0.0
+        return stats
+
+
+class PrefetchRun:
+    """One turn's prefetch: runs in the background and settles its hit/waste counts in finish()."""
+
+    def __init__(self, prefetcher, candidates, sessions):
+        self.prefetcher = prefetcher
+        self.keys = []
+        self.task = asyncio.create_task(self.warm(candidates, sessions))
+
+    async def warm(self, candidates, sessions):
+        try:
+            calls = await tool_to_async(self.prefetcher.plan)(candidates, sessions)
+        except Exception as e:
+            print(f"Error planning student prefetch: {e}")
+            return
+        # A prefetch that would queue behind real tool calls arrives too late to help, so skip it
+        calls = [call for call in calls if self.prefetcher.acquire()]
+        self.keys = [key for _, _, key in calls]
+        for key in self.keys:
+            tool_cache.watch(key)
+        await asyncio.gather(*(self.fetch(func, args) for func, args, _ in calls), return_exceptions=True)
+
+    async def fetch(self, func, args):
+        try:
+            await tool_to_async(func)(*args)
+        finally:
+            self.prefetcher.release()
+
+    async def finish(self):
+        if not self.task.done():
+            # The answer is in; whatever is still loading can only be wasted
+            self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        hits = sum(tool_cache.unwatch(key) for key in self.keys)
+        self.prefetcher.record(len(self.keys), hits)
+
+
+speculative_prefetcher = SpeculativePrefetcher()
@@ -0,0 +1,275 @@
+# chatbot/query_dsl.py
+
+import contextlib
+import time
+from decimal import Decimal
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connection, models, transaction
+from django.db.models import Avg, Count, FloatField, Max, Min, Q, Sum
+from django.db.models.functions import Cast, NullIf
+
+
+class QueryError(ValueError):
+    """A query the DSL refuses to run; the message is meant to be shown to the model."""
+
+
+# Queryable fields per model. Contact details, addresses and guardian data are
+# left out on purpose: the DSL is for statistics, not for pulling records.
+QUERY_FIELDS = {
+    'Student': ('student_id', 'name', 'age', 'department', 'enrollment_year', 'graduation_year', 'gender',
+                'nationality', 'scholarship_awarded', 'financial_aid_status', 'status', 'has_internship', 'gpa',
+                'academic_status'),
+    'Course': ('name', 'course_code', 'department', 'credit_hours', 'instructor_name', 'level', 'is_active'),
+    'Grade': ('grade', 'marks_obtained', 'total_marks', 'exam_type', 'semester', 'academic_year'),
+    'Attendance': ('total_classes', 'attended_classes', 'date', 'status'),
+    'Performance': ('gpa', 'status', 'semester', 'academic_year', 'overall_gpa'),
+    'Internship': ('company_name', 'role', 'start_date', 'end_date'),
+}
+
+# Foreign keys that may be followed with "<relation>__<field>", and the model they lead to
+QUERY_RELATIONS = {
+    'Grade': {'student': 'Student', 'course': 'Course'},
+    'Attendance': {'student': 'Student', 'course': 'Course'},
+    'Performance': {'student': 'Student', 'course': 'Course'},
+    'Internship': {'student': 'Student'},
+}
+
+FILTER_OPS = {
+    'eq': 'exact',
+    'ne': 'exact',
+    'lt': 'lt',
+    'lte': 'lte',
+    'gt': 'gt',
+    'gte': 'gte',
+    'in': 'in',
+    'contains': 'icontains',
+    'startswith': 'istartswith',
+    'isnull': 'isnull',
+    'range': 'range',
+}
+
+AGGREGATES = {
+    'count': Count,
+    'count_distinct': lambda field: Count(field, distinct=True),
+    'sum': Sum,
+    'avg': Avg,
+    'min': Min,
+    'max': Max,
+}
+NUMERIC_AGGREGATES = {'sum', 'avg', 'ratio'}
+NUMERIC_FIELDS = (models.IntegerField, models.DecimalField, models.FloatField)
+
+MAX_LIST_VALUES = 100
+SCALARS = (str, int, float, bool, type(None))
+
+
+def query_fields(model_name):
+    """Every field path the DSL accepts for model_name, mapped to its model field."""
+    fields = {name: apps.get_model('students', model_name)._meta.get_field(name) for name in QUERY_FIELDS[model_name]}
+    for relation, target in QUERY_RELATIONS.get(model_name, {}).items():
+        for name in QUERY_FIELDS[target]:
+            fields[f'{relation}__{name}'] = apps.get_model('students', target)._meta.get_field(name)
+    return fields
+
+
+def describe_schema():
+    """One line per model, for the tool description."""
+    lines = []
+    for model_name, names in QUERY_FIELDS.items():
+        relations = ", ".join(f"{relation}__<{target} field>" for relation, target in QUERY_RELATIONS.get(model_name, {}).items())
+        lines.append(f"{model_name}: {', '.join(names)}" + (f"; {relations}" if relations else ""))
+    return "\n".join(lines)
+
+
+def check_value(op, value):
+    if op in ('in', 'range'):
+        if not isinstance(value, list) or not all(isinstance(item, SCALARS) for item in value):
+            raise QueryError(f"'{op}' needs a list of values")
+        if op == 'range' and len(value) != 2:
+            raise QueryError("'range' needs exactly two values: [low, high]")
+        if len(value) > MAX_LIST_VALUES:
+            raise QueryError(f"'{op}' accepts at most {MAX_LIST_VALUES} values")
+    elif op == 'isnull':
+        if not isinstance(value, bool):
+            raise QueryError("'isnull' needs true or false")
+    elif not isinstance(value, SCALARS):
+        raise QueryError(f"'{op}' needs a single value")
+
+
+class CompiledQuery:
+    """A validated query spec, compiled to one ORM query over a students model."""
+
+    def __init__(self, spec, max_rows=None):
+        if not isinstance(spec, dict):
+            raise QueryError("The query must be a JSON object")
+        unknown = set(spec) - {'model', 'filters', 'group_by', 'aggregates', 'fields', 'order_by', 'limit'}
+        if unknown:
+            raise QueryError(f"Unknown keys: {', '.join(sorted(unknown))}")
+
+        self.model_name = spec.get('model')
+        if self.model_name not in QUERY_FIELDS:
+            raise QueryError(f"'model' must be one of {', '.join(QUERY_FIELDS)}")
+        self.fields = query_fields(self.model_name)
+        # Aggregate names may not shadow anything on the model
+        self.model = model = apps.get_model('students', self.model_name)
+        self.reserved = set(self.fields) | {name for field in model._meta.get_fields() for name in (field.name, getattr(field, 'attname', field.name))}
+
+        max_rows = max_rows or settings.CHATBOT_QUERY_MAX_ROWS
+        limit = spec.get('limit', max_rows)
+        if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+            raise QueryError("'limit' must be a positive integer")
+        self.limit = min(limit, max_rows)
+
+        self.filters = self.compile_filters(spec.get('filters') or [])
+        self.group_by = [self.field(name) for name in self.as_list(spec, 'group_by')]
+        self.aggregates = self.compile_aggregates(spec.get('aggregates') or [])
+        if self.group_by and not self.aggregates:
+            self.aggregates = {'count': Count('pk')}
+        self.columns = [self.field(name) for name in self.as_list(spec, 'fields')]
+        if self.columns and (self.group_by or self.aggregates):
+            raise QueryError("'fields' lists plain rows; use 'group_by' with 'aggregates' for statistics")
+        if not (self.group_by or self.aggregates or self.columns):
+            self.columns = list(QUERY_FIELDS[self.model_name])
+        self.order_by = self.compile_order(self.as_list(spec, 'order_by'))
+
+    @staticmethod
+    def as_list(spec, key):
+        value = spec.get(key) or []
+        if isinstance(value, str):
+            value = [value]
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            raise QueryError(f"'{key}' must be a list of field names")
+        return value
+
+    def field(self, name):
+        if name not in self.fields:
+            raise QueryError(f"Unknown field '{name}' for {self.model_name}; allowed: {', '.join(self.fields)}")
+        return name
+
+    def compile_filters(self, filters):
+        if not isinstance(filters, list):
+            raise QueryError("'filters' must be a list of {field, op, value} objects")
+        condition = Q()
+        for item in filters:
+            if not isinstance(item, dict):
+                raise QueryError("Each filter must be a {field, op, value} object")
+            op = item.get('op', 'eq')
+            if op not in FILTER_OPS:
+                raise QueryError(f"Unknown filter op '{op}'; allowed: {', '.join(FILTER_OPS)}")
+            value = item.get('value')
+            check_value(op, value)
+            name = self.field(item.get('field'))
+            lookup = Q(**{f"{name}__{FILTER_OPS[op]}": value})
+            try:
+                # Building the filter converts the value for the field, without running a query
+                self.model.objects.filter(lookup)
+            except ValidationError as e:
+                raise QueryError(f"Invalid value for '{name}': {' '.join(e.messages)}") from e
+            except (TypeError, ValueError) as e:
+                raise QueryError(f"Invalid value for '{name}': {e}") from e
+            condition &= ~lookup if op == 'ne' else lookup
+        return condition
+
+    def compile_aggregates(self, aggregates):
+        if not isinstance(aggregates, list):
+            raise QueryError("'aggregates' must be a list of {func, field, as} objects")
+        compiled = {}
+        for item in aggregates:
+            if not isinstance(item, dict):
+                raise QueryError("Each aggregate must be a {func, field, as} object")
+            func, field = item.get('func'), item.get('field')
+            if func not in AGGREGATES and func != 'ratio':
+                raise QueryError(f"Unknown aggregate '{func}'; allowed: {', '.join([*AGGREGATES, 'ratio'])}")
+            alias = item.get('as') or (f"{func}_{field}" if field else func)
+            if not isinstance(alias, str) or not alias.isidentifier() or '__' in alias or alias in self.reserved or alias in compiled:
+                raise QueryError(f"Invalid or duplicate aggregate name '{alias}'")
+
+            if func == 'count' and not field:
+                compiled[alias] = Count('pk')
+                continue
+            self.field(field)
+            if func in NUMERIC_AGGREGATES and not isinstance(self.fields[field], NUMERIC_FIELDS):
+                raise QueryError(f"'{func}' needs a numeric field, '{field}' is not")
+            if func == 'ratio':
+                # Percentage of two sums, e.g. attended_classes over total_classes
+                over = self.field(item.get('over'))
+                if not isinstance(self.fields[over], NUMERIC_FIELDS):
+                    raise QueryError(f"'ratio' needs a numeric 'over' field, '{over}' is not")
+                compiled[alias] = (
+                    Cast(Sum(field), FloatField()) * 100.0 / NullIf(Cast(Sum(over), FloatField()), 0.0)
+                )
+            else:
+                compiled[alias] = AGGREGATES[func](field)
+        return compiled
+
+    def compile_order(self, order_by):
+        allowed = set(self.group_by or self.columns) | set(self.aggregates)
+        for name in order_by:
+            if name.lstrip('-') not in allowed:
+                raise QueryError(f"Can only order by {', '.join(sorted(allowed))}")
+        return order_by
+
+    def queryset(self):
+        return self.model.objects.filter(is_deleted=False).filter(self.filters)
+
+    def execute(self, timeout=None):
+        """Run the query under the row and time limits and return plain dict rows."""
+        timeout = timeout if timeout is not None else settings.CHATBOT_QUERY_TIMEOUT
+        queryset = self.queryset()
+        with query_deadline(timeout):
+            if self.aggregates and not self.group_by:
+                return [queryset.aggregate(**self.aggregates)]
+            if self.group_by:
+                queryset = queryset.values(*self.group_by).annotate(**self.aggregates)
+            else:
+                queryset = queryset.values(*self.columns)
+            # One row past the limit tells us whether the result was cut off
+            return list(queryset.order_by(*self.order_by)[:self.limit + 1])
+
+
+@contextlib.contextmanager
+def query_deadline(seconds, conn=None):
+    """Abort the statements run inside the block once they take longer than seconds."""
+    conn = conn or connection
+    if conn.vendor == 'sqlite':
+        conn.ensure_connection()
+        deadline = time.monotonic() + seconds
+        # Called every 10k virtual machine instructions; a truthy return interrupts the query
+        conn.connection.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+        try:
+            yield
+        finally:
+            conn.connection.set_progress_handler(None, 0)
+    elif conn.vendor == 'postgresql':
+        with transaction.atomic(using=conn.alias):
+            with conn.cursor() as cursor:
+                cursor.execute("SET LOCAL statement_timeout = %s", [int(seconds * 1000)])
+            yield
+    else:
+        yield
+
+
+def clean_value(value):
+    # Averages come back as long Decimals or floats; two decimals are plenty for the model
+    if isinstance(value, (Decimal, float)):
+        return round(float(value), 2)
+    return value
+
+
+def run_query(spec, max_rows=None, timeout=None):
+    query = CompiledQuery(spec, max_rows=max_rows)
+    try:
+        rows = query.execute(timeout=timeout)
+    except DatabaseError as e:
+        if 'interrupted' in str(e) or 'statement timeout' in str(e):
+            raise QueryError("The query took too long; add filters or group by fewer fields") from e
+        raise
+    return {
+        "model": query.model_name,
+        "group_by": query.group_by,
+        "row_count": min(len(rows), query.limit),
+        "truncated": len(rows) > query.limit,
+        "rows": [{key: clean_value(value) for key, value in row.items()} for row in rows[:query.limit]],
+    }
@@ -0,0 +1,24 @@
+# chatbot/redis_client.py
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+_client = None
+_sync_client = None
+
+
+def get_redis():
+    """Return the process-wide asyncio Redis client for the CHANNEL_LAYERS instance."""
+    global _client
+    if _client is None:
+        _client = redis.asyncio.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
+
+
+def get_sync_redis():
+    """Blocking client for code that runs in worker threads or signal handlers."""
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _sync_client
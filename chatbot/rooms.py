@@ -0,0 +1,66 @@
+# chatbot/rooms.py
+
+import re
+from django.conf import settings
+from .redis_client import get_redis
+
+# Channels group names must be ASCII alphanumerics, hyphens, underscores or periods
+ROOM_NAME_RE = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+
+def is_valid_room_name(room_name):
+    return bool(ROOM_NAME_RE.match(room_name or ''))
+
+
+class LocalRoomMembers:
+    """Room membership for a single process, for development and tests."""
+
+    def __init__(self):
+        self._members = {}
+
+    async def add(self, room_name, channel_name):
+        self._members.setdefault(room_name, set()).add(channel_name)
+
+    async def discard(self, room_name, channel_name):
+        members = self._members.get(room_name)
+        if members is not None:
+            members.discard(channel_name)
+            if not members:
+                del self._members[room_name]
+
+    async def count(self, room_name):
+        return len(self._members.get(room_name, ()))
+
+
+class RedisRoomMembers:
+    """
+    Room membership shared across workers through a Redis set per room.
+
+    A worker that dies without running disconnect leaves stale members behind;
+    that only makes the room look shared, which falls back to the group fan-out.
+    """
+
+    def key(self, room_name):
+        return f'chatbot:room:{room_name}:members'
+
+    async def add(self, room_name, channel_name):
+        await get_redis().sadd(self.key(room_name), channel_name)
+
+    async def discard(self, room_name, channel_name):
+        await get_redis().srem(self.key(room_name), channel_name)
+
+    async def count(self, room_name):
+        return await get_redis().scard(self.key(room_name))
+
+
+_room_members = None
+
+
+def get_room_members():
+    global _room_members
+    if _room_members is None:
+        if settings.CHATBOT_ROOM_BACKEND == 'local':
+            _room_members = LocalRoomMembers()
+        else:
+            _room_members = RedisRoomMembers()
+    return _room_members
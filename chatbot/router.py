@@ -0,0 +1,180 @@
+# chatbot/router.py
+
+import re
+import threading
+from dataclasses import dataclass, field
+from django.conf import settings
+from .tools import count_total_records_async, topper_students_list_async
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+TOP_N_RE = re.compile(r"\btop\s+(\d+)\b")
+
+# Words that carry no meaning for routing; anything else has to be explained by the intent
+FILLER_WORDS = {
+    'how', 'many', 'what', 'is', 'are', 'there', 'the', 'a', 'an', 'in', 'total', 'of', 'number',
+    'count', 'show', 'me', 'list', 'all', 'do', 'we', 'have', 'has', 'please', 'system', 'give',
+    'tell', 'get', 'records', 'record', 'overall', 'currently', 'available', 'who', 'which',
+    'whats', 's', 'by', 'our', 'college', 'database', 'can', 'you', 'entries',
+}
+
+COUNT_TARGETS = {
+    'students': {'student', 'students', 'pupils'},
+    'courses': {'course', 'courses', 'subjects'},
+    'internships': {'internship', 'internships'},
+    'performances': {'performance', 'performances'},
+    'attendance': {'attendance', 'attendances'},
+    'grades': {'grade', 'grades'},
+}
+
+COUNT_TEMPLATES = {
+    'students': "There are **{total}** students in total.",
+    'courses': "There are **{total}** courses available.",
+    'internships': "There are **{total}** internship records in total.",
+    'performances': "There are **{total}** performance records in total.",
+    'attendance': "There are **{total}** attendance records in total.",
+    'grades': "There are **{total}** grade records in total.",
+}
+
+
+@dataclass
+class Intent:
+    name: str
+    anchors: set  # question words, at least one must appear
+    subjects: set  # what the question is about, at least one must appear
+    vocabulary: set = field(default_factory=set)  # further words the intent explains
+    takes_limit: bool = False  # the N of "top N" is a parameter, not an unexplained word
+
+    def explains(self, word):
+        return word in self.anchors or word in self.subjects or word in self.vocabulary or word in FILLER_WORDS
+
+
+INTENTS = [
+    Intent(f'count_{target}', anchors={'many', 'count', 'number', 'total'}, subjects=words)
+    for target, words in COUNT_TARGETS.items()
+] + [
+    # "toppers" on its own is both the question and the subject
+    Intent('top_students', anchors={'top', 'best', 'highest', 'topper', 'toppers'},
+           subjects={'student', 'students', 'topper', 'toppers', 'gpa'},
+           vocabulary={'ranked', 'rank', 'performing', 'scoring'}, takes_limit=True),
+]
+
+# How much more an unexplained word counts against the confidence than an explained one counts for it
+UNEXPLAINED_WEIGHT = 2
+
+
+@dataclass
+class Route:
+    intent: str
+    confidence: float
+    params: dict
+
+
+def classify(message):
+    """
+    Score message against every intent.
+
+    The confidence is the weighted share of words explained by the intent or by
+    filler words, so "how many students are there" scores 1.0 while "how many
+    students are in CSE" drops well below it because nothing accounts for "cse".
+    Numbers count too: "how many students in 2021" asks about a year that no
+    intent can filter on; only the N of "top N" is explained.
+    """
+    text = message.lower()
+    words = WORD_RE.findall(text)
+    if not words:
+        return []
+    limit = TOP_N_RE.search(text)
+
+    scores = []
+    for intent in INTENTS:
+        if not (intent.anchors & set(words)) or not (intent.subjects & set(words)):
+            continue
+        scored = list(words)
+        if intent.takes_limit and limit:
+            scored.remove(limit.group(1))
+        explained = sum(1 for word in scored if intent.explains(word))
+        unexplained = len(scored) - explained
+        scores.append((explained / (explained + UNEXPLAINED_WEIGHT * unexplained), intent))
+    return sorted(scores, key=lambda item: item[0], reverse=True)
+
+
+class FastPathRouter:
+    """Answer simple, unambiguous questions straight from the tools without calling the LLM."""
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._stats = {'total': 0, 'handled': 0, 'intents': {}}
+
+    def route(self, message):
+        scores = classify(message)
+        if not scores:
+            return None
+        confidence, intent = scores[0]
+        threshold = self.threshold if self.threshold is not None else settings.CHATBOT_ROUTER_THRESHOLD
+        if confidence < threshold:
+            return None
+        # Two intents explaining the message equally well means we can't tell them apart
+        if len(scores) > 1 and scores[1][0] >= threshold:
+            return None
+
+        if intent.name.startswith('count_'):
+            return Route(intent.name, confidence, {'items': intent.name[len('count_'):]})
+
+        params = {'limit': 10}
+        match = TOP_N_RE.search(message.lower())
+        if match:
+            params['limit'] = int(match.group(1))
+            # topper_students_list only ranks the top 10
+            if not 0 < params['limit'] <= 10:
+                return None
+        return Route(intent.name, confidence, params)
+
+    async def answer(self, message):
+        """Return a formatted answer, or None to let the agent handle the message."""
+        route = self.route(message) if settings.CHATBOT_ROUTER_ENABLED else None
+        answer = await self.serve(route) if route is not None else None
+        self.record(route.intent if answer is not None else None)
+        return answer
+
+    async def serve(self, route):
+        if route.intent.startswith('count_'):
+            total = await count_total_records_async(route.params['items'])
+            if isinstance(total, dict):
+                return None
+            return COUNT_TEMPLATES[route.params['items']].format(total=total)
+
+        students = await topper_students_list_async(None)
+        if not isinstance(students, list):
+            return None
+        rows = [
+            f"| {rank} | {student['name']} | {student['student_id']} | {student['department'] or '-'} | {student['gpa']} |"
+            for rank, student in enumerate(students[:route.params['limit']], start=1)
+        ]
+        return "\n".join([
+            f"Top {len(rows)} students by GPA:",
+            "",
+            "| # | Name | Student ID | Department | GPA |",
+            "|---|------|------------|------------|-----|",
+            *rows,
+        ])
+
+    def record(self, intent):
+        with self._lock:
+            self._stats['total'] += 1
+            if intent is not None:
+                self._stats['handled'] += 1
+                self._stats['intents'][intent] = self._stats['intents'].get(intent, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            total, handled = self._stats['total'], self._stats['handled']
+            return {
+                'total': total,
+                'handled': handled,
+                'handled_fraction': handled / total if total else 0.0,
+                'intents': dict(self._stats['intents']),
+            }
+
+
+fast_path_router = FastPathRouter()
@@ -0,0 +1,21 @@
+# chatbot/signals.py
+
+import functools
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from .cache import DATA_MODELS, tool_cache
+
+
+def invalidate_tool_cache(sender, using=None, **kwargs):
+    tool_cache.invalidate_model(sender.__name__)
+    if transaction.get_connection(using).in_atomic_block:
+        # Until the commit other workers still read the old rows, and may cache
+        # them under the version just bumped; bump again once the write is visible
+        transaction.on_commit(functools.partial(tool_cache.invalidate_model, sender.__name__), using=using)
+
+
+for model_name in DATA_MODELS:
+    model = apps.get_model('students', model_name)
+    post_save.connect(invalidate_tool_cache, sender=model, dispatch_uid=f'chatbot_tool_cache_{model_name}_save')
+    post_delete.connect(invalidate_tool_cache, sender=model, dispatch_uid=f'chatbot_tool_cache_{model_name}_delete')
@@ -1,16 +1,1026 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+import httpx
+from aiohttp import web
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from langchain_core.messages import HumanMessage
+from students.models import Attendance, Course, Grade, Student
+from .admission import AdmissionController, QueueFull, RateLimiter, admission_controller
+from .agent import AgentRegistry, agent_registry, build_agent_executor
+from .cache import LocalCacheBackend, ToolCache, tool_cache
+from .coalesce import SingleFlight
+from .compaction import ToolOutputCompactor
+from .http_client import ResilientTransport, RetryBudget, call_deadline, retry_after
+from .consumers import ChatConsumer
+from .metrics import MetricsRegistry
+from .prefetch import SpeculativePrefetcher, extract_candidates, requested_sessions
+from .model_routing import GENERAL, LOOKUP, REASONING, classify_turn, model_router
+from langchain_openai import ChatOpenAI
+from .memory import ConversationMemory, LocalMemoryStore, get_memory_store, summarize_turns
+from .llm import Cassette, CassetteMiss, FakeChatModel, RecordingChatModel, ReplayChatModel, build_chat_model, parse_latency
+from .query_dsl import QueryError, run_query
+from .router import FastPathRouter
+from .tools import TOOLS, get_student_overview, get_student_session, query_students_data, student_overview_from_json, tool_to_async
+from .tokens import count_tokens
 
-# Create your tests here.
-import openai
-from django.conf import settings
+# Everything offline and in-process: no OpenAI, no Redis
+OFFLINE = override_settings(
+    CHATBOT_LLM_BACKEND='fake',
+    CHATBOT_FAKE_LLM_LATENCY='0',
+    CHATBOT_MEMORY_BACKEND='local',
+    CHATBOT_ROOM_BACKEND='local',
+    CHATBOT_TOOL_CACHE_BACKEND='none',
+    CHATBOT_COALESCE_BACKEND='none',
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+)
 
-openai.api_key = settings.OPENAI_API_KEY
+ATTENDANCE_SCRIPT = {
+    'rules': [{
+        'match': r"attendance of (?P<student>\w+)",
+        'steps': [
+            {'tool_calls': [{'name': 'get_student_session', 'args': {'student_name': '{student}', 'session': 'Attendance'}}]},
+            {'content': "Attendance for {student} is on record."},
+        ],
+    }],
+}
 
-response = openai.ChatCompletion.create(
-    model="gpt-3.5-turbo",  # Correct model name
-    messages=[{"role": "user", "content": "What is the current date?"}],
-    max_tokens=150,
-    temperature=0.7
-)
 
-print(response['choices'][0]['message']['content'])
\ No newline at end of file
+def quiet_executor(llm):
+    executor = build_agent_executor(llm, TOOLS)
+    executor.verbose = False
+    return executor
+
+
+def create_attendance(student_id='S100', name='Asha Verma'):
+    student = Student.objects.create(student_id=student_id, name=name, department='CSE', enrollment_year=2021)
+    course = Course.objects.create(name='Algorithms')
+    Attendance.objects.create(student=student, course=course, total_classes=40, attended_classes=30, status='Present')
+    return student
+
+
+class FakeChatModelTests(TestCase):
+
+    def test_default_script_answers_directly(self):
+        result = asyncio.run(quiet_executor(FakeChatModel()).ainvoke({"input": "hello", "chat_history": []}))
+        self.assertEqual(result['output'], "This is a simulated answer to: hello")
+
+    def test_latency_is_deterministic_per_request(self):
+        model = FakeChatModel(latency='lognormal:0.5:0.4', seed=7)
+        messages = [HumanMessage('hi')]
+        self.assertEqual(model.sample_latency(messages), model.sample_latency(messages))
+        self.assertEqual(parse_latency('0.25')(None), 0.25)
+        with self.assertRaises(ValueError):
+            parse_latency('poisson:1')
+
+
+@override_settings(CHATBOT_MODEL='gpt-4.1-mini', CHATBOT_LLM_BACKEND='fake')
+class AgentRegistryTests(SimpleTestCase):
+
+    def test_executor_is_rebuilt_only_when_its_key_changes(self):
+        registry = AgentRegistry(tools_version=1)
+        with mock.patch('chatbot.agent.build_llm', side_effect=lambda model: FakeChatModel(model=model)) as build_llm:
+            executor = registry.get()
+            self.assertIs(registry.get(), executor)
+            self.assertIs(registry.get('gpt-4.1-mini'), executor)
+            self.assertIsNot(registry.get('gpt-4.1-nano'), executor)
+            with override_settings(CHATBOT_LLM_BACKEND='replay'):
+                self.assertIsNot(registry.get(), executor)
+            registry.tools_version = 2
+            self.assertIsNot(registry.get(), executor)
+            registry.tools_version = 1
+            self.assertIs(registry.get(), executor)
+        self.assertEqual([call.args[0] for call in build_llm.call_args_list], ['gpt-4.1-mini', 'gpt-4.1-nano', 'gpt-4.1-mini', 'gpt-4.1-mini'])
+
+
+class CassetteTests(TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        os.unlink(self.path)
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def test_record_then_replay_without_the_inner_model(self):
+        recorder = RecordingChatModel(inner=FakeChatModel(), cassette=Cassette(self.path))
+        recorded = asyncio.run(quiet_executor(recorder).ainvoke({"input": "hello", "chat_history": []}))
+
+        replayer = ReplayChatModel(cassette=Cassette(self.path), recorded_latency=False)
+        replayed = asyncio.run(quiet_executor(replayer).ainvoke({"input": "hello", "chat_history": []}))
+        self.assertEqual(replayed['output'], recorded['output'])
+
+    def test_replay_miss_raises(self):
+        replayer = ReplayChatModel(cassette=Cassette(self.path))
+        with self.assertRaises(CassetteMiss):
+            asyncio.run(quiet_executor(replayer).ainvoke({"input": "never recorded", "chat_history": []}))
+
+
+@OFFLINE
+class ChatConsumerTests(TransactionTestCase):
+    # Tools run on the thread pool with their own connections, so the data has to be committed
+
+    def setUp(self):
+        agent_registry.clear()
+
+    def test_scripted_tool_call_runs_the_tool(self):
+        create_attendance()
+        steps = []
+
+        async def run():
+            executor = quiet_executor(FakeChatModel(script=ATTENDANCE_SCRIPT))
+            async for event in executor.astream_events({"input": "attendance of S100", "chat_history": []}, version="v2"):
+                if event['event'] == 'on_tool_end':
+                    steps.append((event['name'], event['data']['output']))
+                if event['event'] == 'on_chain_end' and not event.get('parent_ids'):
+                    return event['data']['output']['output']
+
+        output = asyncio.run(run())
+        self.assertEqual(output, "Attendance for S100 is on record.")
+        self.assertEqual(steps[0][0], 'get_student_session')
+        self.assertEqual(steps[0][1]['summary_by_course'][0]['attendance_percent'], 75.0)
+
+    async def receive_until_final(self, communicator):
+        frames = []
+        while not frames or frames[-1]['type'] not in ('final', 'error', 'rejected'):
+            frames.append(json.loads(await communicator.receive_from(timeout=5)))
+        return frames
+
+    async def receive_until_done(self, communicator, message_ids):
+        """Frames until every one of message_ids has been answered, rejected or cancelled."""
+        frames, pending = [], set(message_ids)
+        while pending:
+            frame = json.loads(await communicator.receive_from(timeout=5))
+            frames.append(frame)
+            if frame['type'] in ('final', 'error', 'rejected', 'cancelled'):
+                pending.discard(frame['message_id'])
+        return {frame['message_id']: frame['type'] for frame in frames if frame['type'] != 'queued'}, frames
+
+    def chat(self, *messages):
+        """Send messages (dicts, sent as given) on one socket and return {message_id: last frame type}."""
+        async def run():
+            communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+            await communicator.connect()
+            for message in messages:
+                await communicator.send_to(text_data=json.dumps({"stream": False, **message}))
+                # Let the consumer take each message before the next one arrives
+                await asyncio.sleep(0.02)
+            outcomes, _ = await self.receive_until_done(communicator, {message['id'] for message in messages if 'id' in message})
+            await communicator.disconnect()
+            return outcomes
+
+        with override_settings(CHATBOT_FAKE_LLM_LATENCY='0.2'):
+            return asyncio.run(run())
+
+    def test_cancel_frame_stops_one_message(self):
+        outcomes = self.chat({"message": "first", "id": "m1"}, {"message": "second", "id": "m2"}, {"type": "cancel", "id": "m1"})
+        self.assertEqual(outcomes, {'m1': 'cancelled', 'm2': 'final'})
+        self.assertEqual(admission_controller.active, 0)
+
+    def test_supersede_mode_replaces_the_question_in_flight(self):
+        outcomes = self.chat({"message": "first", "id": "m1"}, {"message": "second", "id": "m2", "mode": "supersede"})
+        self.assertEqual(outcomes, {'m1': 'cancelled', 'm2': 'final'})
+        outcomes = self.chat({"message": "first", "id": "m1"}, {"message": "second", "id": "m2", "mode": "parallel"})
+        self.assertEqual(outcomes, {'m1': 'final', 'm2': 'final'})
+
+    @override_settings(CHATBOT_MAX_TASKS_PER_CONNECTION=2)
+    def test_duplicate_ids_and_too_many_in_flight_are_rejected(self):
+        async def run():
+            communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+            await communicator.connect()
+            for message_id in ('m1', 'm1', 'm2', 'm3'):
+                await communicator.send_to(text_data=json.dumps({"message": f"hello {message_id}", "id": message_id, "stream": False}))
+            rejections = [json.loads(await communicator.receive_from(timeout=5)) for _ in range(2)]
+            await self.receive_until_done(communicator, {'m1', 'm2'})
+            await communicator.disconnect()
+            return rejections
+
+        with override_settings(CHATBOT_FAKE_LLM_LATENCY='0.2'):
+            rejections = asyncio.run(run())
+        self.assertEqual([(frame['message_id'], frame['reason']) for frame in rejections],
+                         [('m1', 'duplicate_id'), ('m3', 'too_many_in_flight')])
+
+    def test_disconnect_cancels_messages_in_flight(self):
+        async def run():
+            communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+            await communicator.connect()
+            await communicator.send_to(text_data=json.dumps({"message": "hello there", "id": "m1", "stream": True}))
+            self.assertEqual(json.loads(await communicator.receive_from(timeout=5))['type'], 'start')
+            await communicator.disconnect()
+            self.assertEqual(admission_controller.active, 0)
+            self.assertTrue(await communicator.receive_nothing())
+
+        with override_settings(CHATBOT_FAKE_LLM_LATENCY='0.2'), self.assertLogs('chatbot.trace') as logs:
+            asyncio.run(run())
+        self.assertEqual(logs.records[-1].trace['outcome'], 'cancelled')
+
+    def test_answers_reach_only_their_audience(self):
+        application = URLRouter([
+            path("ws/chat/", ChatConsumer.as_asgi()),
+            path("ws/chat/<str:room_name>/", ChatConsumer.as_asgi()),
+        ])
+        group_sends = []
+
+        async def connect(url):
+            communicator = WebsocketCommunicator(application, url)
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            return communicator
+
+        async def ask(communicator, message_id):
+            await communicator.send_to(text_data=json.dumps({"message": f"hello {message_id}", "id": message_id, "stream": False}))
+            return (await self.receive_until_final(communicator))[-1]
+
+        async def run():
+            layer = get_channel_layer()
+            group_send = layer.group_send
+
+            async def counting_group_send(group, message):
+                group_sends.append(group)
+                await group_send(group, message)
+
+            layer.group_send = counting_group_send
+            try:
+                # Two private connections: nobody sees the other's answer
+                first, second = await connect("/ws/chat/"), await connect("/ws/chat/")
+                self.assertEqual((await ask(first, 'p1'))['message_id'], 'p1')
+                self.assertTrue(await second.receive_nothing(0.2))
+
+                # A room with a single member answers on its own socket
+                alone = await connect("/ws/chat/lab/")
+                self.assertEqual((await ask(alone, 'r1'))['message_id'], 'r1')
+                self.assertEqual(group_sends, [])
+
+                # Once a second member joins, answers fan out to the whole room, and to nobody else
+                member = await connect("/ws/chat/lab/")
+                self.assertEqual((await ask(alone, 'r2'))['message_id'], 'r2')
+                self.assertEqual((await member.receive_json_from(timeout=5))['message_id'], 'r2')
+                self.assertEqual(group_sends, ['chat_lab'])
+                for communicator in (first, second):
+                    self.assertTrue(await communicator.receive_nothing(0.1))
+
+                # And back to the direct path when the room empties again
+                await member.disconnect()
+                await ask(alone, 'r3')
+                self.assertEqual(group_sends, ['chat_lab'])
+                for communicator in (first, second, alone):
+                    await communicator.disconnect()
+            finally:
+                del layer.group_send
+
+        asyncio.run(run())
+
+    @override_settings(CHATBOT_COALESCE_BACKEND='local', CHATBOT_FAKE_LLM_LATENCY='0.2')
+    def test_coalesced_run_outlives_its_owner_without_writing_to_it(self):
+        async def run():
+            owner = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+            waiter = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+            await owner.connect()
+            await waiter.connect()
+            await owner.send_to(text_data=json.dumps({"message": "hello there", "id": "m1", "stream": True}))
+            self.assertEqual(json.loads(await owner.receive_from(timeout=5))['type'], 'start')
+            await waiter.send_to(text_data=json.dumps({"message": "Hello there!", "id": "m2", "stream": True}))
+            await asyncio.sleep(0.05)
+            await owner.disconnect()
+
+            frames = await self.receive_until_final(waiter)
+            await waiter.disconnect()
+            await asyncio.sleep(0.05)
+            return frames
+
+        frames = asyncio.run(run())
+        self.assertEqual((frames[-1]['type'], frames[-1]['coalesced']), ('final', True))
+        self.assertEqual(frames[-1]['message'], "This is a simulated answer to: hello there")
+        # The owner's memory was cleared on disconnect and must not come back
+        self.assertEqual([key for key in get_memory_store()._data if ':conn:' in key], [])
+
+    def test_consumers_share_one_executor(self):
+        async def ask(message):
+            communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+            await communicator.connect()
+            await communicator.send_to(text_data=json.dumps({"message": message, "id": "m1", "stream": False}))
+            frames = await self.receive_until_final(communicator)
+            await communicator.disconnect()
+            return frames[-1]['message']
+
+        async def run():
+            return await asyncio.gather(ask("hello there"), ask("hi again"))
+
+        with mock.patch('chatbot.agent.build_agent_executor', wraps=build_agent_executor) as build:
+            answers = asyncio.run(run())
+            self.assertEqual(answers, ["This is a simulated answer to: hello there", "This is a simulated answer to: hi again"])
+            asyncio.run(ask("hello once more"))
+        self.assertEqual(build.call_count, 1)
+
+    def test_streamed_answer_ends_with_final_frame(self):
+        async def run():
+            communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.send_to(text_data=json.dumps({"message": "hello there", "id": "m1", "stream": True}))
+            frames = await self.receive_until_final(communicator)
+            await communicator.disconnect()
+            return frames
+
+        frames = asyncio.run(run())
+        self.assertEqual(frames[0]['type'], 'start')
+        self.assertIn('token', [frame['type'] for frame in frames])
+        self.assertEqual(frames[-1]['message'], "This is a simulated answer to: hello there")
+
+    def test_fast_path_answers_without_the_agent(self):
+        async def run():
+            communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+            await communicator.connect()
+            await communicator.send_to(text_data=json.dumps({"message": "how many students are there", "id": "m1"}))
+            frames = await self.receive_until_final(communicator)
+            await communicator.disconnect()
+            return frames
+
+        frames = asyncio.run(run())
+        self.assertEqual(len(frames), 1)
+        self.assertTrue(frames[0]['fast_path'])
+
+
+    def test_turn_trace_reaches_the_client_logs_and_metrics(self):
+        create_attendance()
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as script:
+            json.dump(ATTENDANCE_SCRIPT, script)
+        self.addCleanup(os.unlink, script.name)
+
+        async def run():
+            communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+            await communicator.connect()
+            await communicator.send_to(text_data=json.dumps({"message": "attendance of S100", "id": "m1", "stream": True}))
+            frames = await self.receive_until_final(communicator)
+            await communicator.disconnect()
+            return frames
+
+        with override_settings(CHATBOT_FAKE_LLM_SCRIPT=script.name), self.assertLogs('chatbot.trace') as logs:
+            frames = asyncio.run(run())
+
+        trace_ids = {frame.get('trace_id') for frame in frames}
+        self.assertEqual(len(trace_ids), 1)
+        trace = logs.records[-1].trace
+        self.assertEqual(trace['trace_id'], trace_ids.pop())
+        self.assertEqual(trace['outcome'], 'final')
+        self.assertEqual(trace['llm']['calls'], 2)
+        self.assertEqual([span['name'] for span in trace['spans'] if span['kind'] == 'tool'], ['get_student_session'])
+        self.assertGreater(trace['db']['queries'], 0)
+        self.assertEqual(trace['channel']['sends'], len(frames))
+
+        metrics = self.client.get('/metrics').content.decode()
+        self.assertIn('chatbot_tool_call_seconds_count{tool="get_student_session"}', metrics)
+        self.assertIn('chatbot_turns_total{outcome="final"}', metrics)
+
+    @override_settings(CHATBOT_MODEL_TIERS={'small': 'gpt-4.1-mini', 'large': 'gpt-4.1'},
+                       CHATBOT_MODEL_POLICY={'lookup': 'small', 'general': 'small', 'reasoning': 'large'})
+    def test_fumbled_tool_call_escalates_to_the_next_tier(self):
+        create_attendance()
+        fumbling_small_tier = {'rules': [{
+            'model': 'mini',
+            'match': r"attendance of",
+            'steps': [{'invalid_tool_calls': [{'name': 'get_student_session', 'args': "student_name: {input}"}]}],
+        }, *ATTENDANCE_SCRIPT['rules']]}
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as script:
+            json.dump(fumbling_small_tier, script)
+        self.addCleanup(os.unlink, script.name)
+        model_router.reset()
+
+        async def run():
+            communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+            await communicator.connect()
+            await communicator.send_to(text_data=json.dumps({"message": "attendance of S100", "id": "m1", "stream": True}))
+            frames = await self.receive_until_final(communicator)
+            await communicator.disconnect()
+            return frames
+
+        with override_settings(CHATBOT_FAKE_LLM_SCRIPT=script.name):
+            frames = asyncio.run(run())
+
+        escalated = [frame for frame in frames if frame['type'] == 'escalated']
+        self.assertEqual([(frame['from_tier'], frame['tier']) for frame in escalated], [('small', 'large')])
+        self.assertEqual(frames[-1]['message'], "Attendance for S100 is on record.")
+        usage = model_router.stats()
+        self.assertEqual((usage['small']['runs'], usage['small']['failed_runs']), (1, 1))
+        self.assertEqual((usage['large']['runs'], usage['large']['llm_calls']), (1, 2))
+        self.assertGreater(usage['large']['cost_usd'], usage['small']['cost_usd'])
+
+
+    def test_summarising_memory_does_not_hold_up_the_answer(self):
+        summarising, release = asyncio.Event(), asyncio.Event()
+
+        async def slow_summary(summary, turns):
+            summarising.set()
+            await release.wait()
+            return "summary"
+
+        class SlowSummaryConsumer(ChatConsumer):
+            async def connect(self):
+                await super().connect()
+                self.memory.summarizer = slow_summary
+
+        async def run():
+            communicator = WebsocketCommunicator(SlowSummaryConsumer.as_asgi(), "/ws/chat/")
+            await communicator.connect()
+            frames = []
+            for message_id in ('m1', 'm2'):
+                await communicator.send_to(text_data=json.dumps({"message": f"hello {message_id}", "id": message_id, "stream": False}))
+                frames += await self.receive_until_final(communicator)
+            # The second turn pushed the first out of the budget: its summary is still being written
+            await asyncio.wait_for(summarising.wait(), 1)
+            self.assertEqual(admission_controller.active, 0)
+            release.set()
+            await communicator.disconnect()
+            return frames
+
+        with override_settings(CHATBOT_MEMORY_TOKEN_BUDGET=1):
+            frames = asyncio.run(run())
+        self.assertEqual([frame['type'] for frame in frames], ['final', 'final'])
+
+
+class MemoryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.summaries = []
+
+    async def summarize(self, summary, turns):
+        self.summaries.append((summary, [turn['human'] for turn in turns]))
+        return f"{summary} " + " ".join(turn['human'] for turn in turns) * 20
+
+    def memory(self, store=None, **kwargs):
+        return ConversationMemory('chatbot:memory:test', store=store or LocalMemoryStore(), ttl=60, summarizer=self.summarize, **kwargs)
+
+    async def append_turns(self, memory, count):
+        for index in range(count):
+            await memory.append(f"question {index}", f"answer {index}")
+
+    async def test_compaction_folds_the_oldest_turns_into_a_capped_summary(self):
+        turn_tokens = count_tokens("question 0") + count_tokens("answer 0")
+        memory = self.memory(token_budget=2 * turn_tokens, summary_tokens=10)
+        await self.append_turns(memory, 4)
+        self.assertEqual(len((await memory.load())['turns']), 4)
+
+        self.assertTrue(await memory.compact())
+        state = await memory.load()
+        self.assertEqual([turn['human'] for turn in state['turns']], ['question 2', 'question 3'])
+        self.assertEqual(self.summaries, [('', ['question 0', 'question 1'])])
+        self.assertLessEqual(count_tokens(state['summary']), 10)
+        self.assertFalse(await memory.compact())
+
+        await self.append_turns(memory, 1)
+        await memory.compact()
+        self.assertEqual(self.summaries[-1], (state['summary'], ['question 2']))
+        self.assertEqual([message.type for message in await memory.load_messages()], ['system', 'human', 'ai', 'human', 'ai'])
+
+    async def test_latest_turn_is_kept_over_budget(self):
+        memory = self.memory(token_budget=1)
+        await self.append_turns(memory, 2)
+        await memory.compact()
+        self.assertEqual([turn['human'] for turn in (await memory.load())['turns']], ['question 1'])
+
+    async def test_concurrent_appends_are_all_kept(self):
+        class SlowStore(LocalMemoryStore):
+            async def get(self, key):
+                # Yield between the read and the write, as a network round trip would
+                await asyncio.sleep(0.01)
+                return await super().get(key)
+
+        memory = self.memory(store=SlowStore())
+        await asyncio.gather(*(memory.append(f"question {index}", "answer") for index in range(5)))
+        self.assertEqual(len((await memory.load())['turns']), 5)
+
+    async def test_compaction_that_lost_a_race_is_dropped(self):
+        memory = self.memory(token_budget=1)
+        await self.append_turns(memory, 2)
+        summarize = self.summarize
+
+        async def clear_meanwhile(summary, turns):
+            await memory.clear()
+            return await summarize(summary, turns)
+
+        memory.summarizer = clear_meanwhile
+        self.assertFalse(await memory.compact())
+        self.assertEqual(await memory.load(), {'summary': '', 'turns': []})
+
+    @override_settings(CHATBOT_LLM_BACKEND='fake', CHATBOT_FAKE_LLM_LATENCY='0', CHATBOT_SUMMARY_MODEL='gpt-4.1-nano')
+    async def test_summaries_use_the_summary_model(self):
+        with mock.patch('chatbot.agent.build_llm', wraps=build_chat_model) as build_llm:
+            await summarize_turns("", [{'human': "question 0", 'ai': "answer 0"}])
+        build_llm.assert_called_once_with('gpt-4.1-nano')
+
+
+@override_settings(CHATBOT_TOOL_CACHE_BACKEND='local')
+class ToolCacheTests(TestCase):
+
+    def setUp(self):
+        self.cache = ToolCache(backend=LocalCacheBackend(max_entries=10))
+        self.calls = []
+
+    def test_results_are_cached_per_argument_until_a_model_changes(self):
+        @self.cache.cached(['Student'], key_args=lambda name: (name.lower(),))
+        def lookup(name):
+            self.calls.append(name)
+            return {'name': name}
+
+        self.assertEqual(lookup('Asha'), {'name': 'Asha'})
+        self.assertEqual(lookup('ASHA'), {'name': 'Asha'})
+        lookup('Ravi')
+        self.cache.invalidate_model('Course')
+        lookup('asha')
+        self.cache.invalidate_model('Student')
+        lookup('asha')
+        self.assertEqual(self.calls, ['Asha', 'Ravi', 'asha'])
+        self.assertEqual(self.cache.stats()['lookup'], {'hits': 2, 'misses': 3})
+
+    def test_errors_are_not_cached(self):
+        @self.cache.cached(['Student'], ignore_args=True)
+        def lookup(name):
+            self.calls.append(name)
+            return {'error': 'database unavailable'}
+
+        lookup('Asha')
+        lookup('Ravi')
+        self.assertEqual(self.calls, ['Asha', 'Ravi'])
+
+    def test_concurrent_misses_run_the_tool_once(self):
+        @self.cache.cached(['Student'])
+        def slow_lookup(name):
+            self.calls.append(name)
+            time.sleep(0.05)
+            return {'name': name}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(slow_lookup('Asha'))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, ['Asha'])
+        self.assertEqual(results, [{'name': 'Asha'}] * 4)
+
+    def test_version_is_bumped_again_on_commit(self):
+        previous_backend, tool_cache._backend = tool_cache._backend, LocalCacheBackend()
+        self.addCleanup(setattr, tool_cache, '_backend', previous_backend)
+
+        @tool_cache.cached(['Student'], ignore_args=True)
+        def count_students():
+            return Student.objects.count()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.create(student_id='S100', name='Asha Verma')
+            # Another worker, not seeing the uncommitted row, caches its answer under the bumped version
+            tool_cache.backend.set(count_students.cache_key(), 0, 60)
+        self.assertEqual(count_students(), 1)
+
+
+@override_settings(CHATBOT_TOOL_CACHE_BACKEND='local', CHATBOT_PREFETCH_ENABLED=True)
+class PrefetchTests(TransactionTestCase):
+
+    def setUp(self):
+        tool_cache.backend.clear()
+
+    def test_extracts_names_ids_and_sessions(self):
+        self.assertEqual(extract_candidates("What is the attendance of rahul sharma?"), ['rahul sharma'])
+        self.assertEqual(extract_candidates("How is Asha Verma doing in grades?"), ['Asha Verma'])
+        self.assertEqual(extract_candidates("Show S100 and CS21-042 internships"), ['S100', 'CS21-042'])
+        self.assertEqual(extract_candidates("hello there"), [])
+        self.assertEqual(requested_sessions("grades and attendance of Asha Verma"), {'Grades', 'Attendance'})
+        self.assertEqual(requested_sessions("tell me about Asha"), {None, 'Attendance', 'Grades', 'Internships', 'Performance'})
+
+    def test_counts_hits_and_wasted_fetches(self):
+        create_attendance()
+        prefetcher = SpeculativePrefetcher()
+
+        async def turn(message, use=None):
+            run = prefetcher.start(message)
+            await run.task
+            if use:
+                await tool_to_async(get_student_session)(*use)
+            await run.finish()
+
+        asyncio.run(turn("grades of Asha Verma", use=('Asha Verma', 'Grades')))
+        asyncio.run(turn("attendance of Asha Verma"))
+        stats = prefetcher.stats()
+        self.assertEqual((stats['turns'], stats['prefetched_turns'], stats['hit_turns']), (2, 2, 1))
+        self.assertEqual((stats['fetches'], stats['hits'], stats['wasted_fetches']), (2, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_finish_cancels_an_unused_prefetch_and_frees_its_slot(self):
+        create_attendance()
+        prefetcher = SpeculativePrefetcher(max_concurrency=1)
+
+        def stalled(func):
+            # Plan for real, but never let a fetch finish
+            if getattr(func, '__self__', None) is prefetcher:
+                return tool_to_async(func)
+            return lambda *args: asyncio.Event().wait()
+
+        async def turn():
+            run = prefetcher.start("grades and attendance of Asha Verma")
+            while not run.keys:
+                await asyncio.sleep(0.01)
+            self.assertEqual(prefetcher.active, 1)
+            await run.finish()
+            return run
+
+        with mock.patch('chatbot.prefetch.tool_to_async', stalled):
+            run = asyncio.run(turn())
+        self.assertTrue(run.task.cancelled())
+        self.assertEqual(prefetcher.active, 0)
+        stats = prefetcher.stats()
+        # Two sessions asked for, one slot: the second fetch is skipped rather than queued
+        self.assertEqual((stats['fetches'], stats['wasted_fetches'], stats['skipped_fetches']), (1, 1, 1))
+
+
+class FakeRedis:
+    """The few asyncio Redis commands SingleFlight uses, in memory; expiry is ignored."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+
+class BrokenRedis(FakeRedis):
+
+    async def get(self, key):
+        raise ConnectionError("redis is down")
+
+
+@override_settings(CHATBOT_COALESCE_BACKEND='local')
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        self.runs, self.cancelled = [], []
+
+    def agent(self, answer='42', latency='0.05'):
+        async def run_agent():
+            self.runs.append(answer)
+            try:
+                reply = await FakeChatModel(latency=latency, script={'rules': [{'match': '', 'steps': [{'content': answer}]}]}).ainvoke(
+                    [HumanMessage("question")])
+            except asyncio.CancelledError:
+                self.cancelled.append(answer)
+                raise
+            return reply.content
+        return run_agent
+
+    async def test_identical_questions_share_one_run(self):
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.run('key', self.agent()) for _ in range(3)))
+        self.assertEqual(results, [('42', True), ('42', False), ('42', False)])
+        self.assertEqual(self.runs, ['42'])
+        self.assertEqual(await flight.run(None, self.agent('7')), ('7', True))
+
+    async def test_run_survives_until_its_last_waiter_cancels(self):
+        flight = SingleFlight()
+        first = asyncio.ensure_future(flight.run('key', self.agent(latency='0.2')))
+        second = asyncio.ensure_future(flight.run('key', self.agent(latency='0.2')))
+        third = asyncio.ensure_future(flight.run('key', self.agent(latency='0.2')))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        self.assertEqual(self.cancelled, [])
+        self.assertEqual(await second, ('42', False))
+
+        lone = asyncio.ensure_future(flight.run('other', self.agent('7', latency='0.2')))
+        await asyncio.sleep(0.05)
+        lone.cancel()
+        await asyncio.gather(lone, third, return_exceptions=True)
+        await asyncio.sleep(0)
+        self.assertEqual(self.cancelled, ['7'])
+        self.assertEqual(self.runs, ['42', '7'])
+
+    @override_settings(CHATBOT_COALESCE_BACKEND='redis', CHATBOT_COALESCE_POLL_INTERVAL=0.01)
+    async def test_workers_share_a_run_through_redis(self):
+        redis = FakeRedis()
+        worker_a, worker_b = SingleFlight(redis), SingleFlight(redis)
+        first = asyncio.ensure_future(worker_a.run('key', self.agent()))
+        await asyncio.sleep(0.01)
+        second = await worker_b.run('key', self.agent())
+        self.assertEqual((await first, second), (('42', True), ('42', False)))
+        self.assertEqual(self.runs, ['42'])
+        self.assertEqual(list(redis.data), ['chatbot:coalesce:result:key'])
+
+    @override_settings(CHATBOT_COALESCE_BACKEND='redis', CHATBOT_COALESCE_POLL_INTERVAL=0.01, CHATBOT_COALESCE_WAIT=0.05)
+    async def test_stuck_lock_holder_and_redis_outage_fall_back_to_running(self):
+        redis = FakeRedis()
+        redis.data['chatbot:coalesce:lock:key'] = '1'
+        self.assertEqual(await SingleFlight(redis).run('key', self.agent(latency='0')), ('42', True))
+        self.assertEqual(await SingleFlight(BrokenRedis()).run('key', self.agent(latency='0')), ('42', True))
+        self.assertEqual(self.runs, ['42', '42'])
+
+
+class ModelRoutingTests(SimpleTestCase):
+
+    def test_classifies_turn_complexity(self):
+        self.assertEqual(classify_turn("What is the attendance of S100?")[0], LOOKUP)
+        self.assertEqual(classify_turn("show failed students")[0], LOOKUP)
+        self.assertEqual(classify_turn("Compare the grades of Asha Verma and Ravi Kumar")[0], REASONING)
+        self.assertEqual(classify_turn("What is the average GPA in each department?")[0], REASONING)
+        self.assertEqual(classify_turn("What is the capital of France?")[0], GENERAL)
+        self.assertEqual(classify_turn("If 3 pens cost 45 rupees, what do 7 cost?")[0], GENERAL)
+
+    @override_settings(CHATBOT_MODEL_TIERS={'nano': 'gpt-4.1-nano', 'small': 'gpt-4.1-mini', 'large': 'gpt-4.1'},
+                       CHATBOT_MODEL_POLICY={'lookup': 'nano', 'general': 'small', 'reasoning': 'large'})
+    def test_policy_picks_the_starting_tier(self):
+        self.assertEqual(model_router.plan("attendance of S100").tier, 'nano')
+        self.assertEqual(model_router.plan("Who wrote Hamlet?").tier, 'small')
+        self.assertEqual(model_router.next_tier('nano'), 'small')
+        self.assertIsNone(model_router.next_tier('large'))
+        with override_settings(CHATBOT_MODEL_ROUTING_ENABLED=False):
+            self.assertEqual(model_router.plan("attendance of S100").tier, 'large')
+
+
+class AdmissionTests(SimpleTestCase):
+
+    async def agent_run(self, controller, name, finished, positions):
+        async def report(position):
+            positions.setdefault(name, []).append(position)
+
+        async with controller.admit(on_position=report):
+            # Hold the slot for one simulated LLM call
+            await FakeChatModel(latency='0.05').ainvoke([HumanMessage(name)])
+            finished.append(name)
+
+    async def test_runs_wait_in_line_and_hear_their_position(self):
+        controller, finished, positions = AdmissionController(max_concurrent=1, max_queue=5), [], {}
+        await asyncio.gather(*(self.agent_run(controller, name, finished, positions) for name in 'abc'))
+        await asyncio.sleep(0)
+        self.assertEqual(finished, ['a', 'b', 'c'])
+        self.assertNotIn('a', positions)
+        self.assertEqual(positions['b'], [1])
+        self.assertEqual(positions['c'], [2, 1])
+        self.assertEqual((controller.active, controller.queue_depth, controller.admitted), (0, 0, 3))
+
+    async def test_full_queue_rejects(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=1)
+        await controller.acquire()
+        waiting = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        with self.assertRaises(QueueFull):
+            await controller.acquire()
+        self.assertEqual(controller.rejected, 1)
+        controller.release()
+        await waiting
+        controller.release()
+        self.assertEqual(controller.active, 0)
+
+    async def test_failed_position_report_leaves_no_dead_waiter(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=5)
+        await controller.acquire()
+
+        async def broken_socket(position):
+            raise ConnectionError("socket closed")
+
+        with self.assertRaises(ConnectionError):
+            await controller.acquire(on_position=broken_socket)
+        controller.release()
+        self.assertEqual((controller.active, controller.queue_depth), (0, 0))
+        await asyncio.wait_for(controller.acquire(), 1)
+
+    async def test_cancelled_waiter_leaves_the_queue(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=5)
+        await controller.acquire()
+        waiting = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        self.assertEqual(controller.queue_depth, 0)
+        controller.release()
+        self.assertEqual(controller.active, 0)
+
+    def test_rate_limiter_allows_a_burst(self):
+        limiter = RateLimiter(per_minute=60, burst=2)
+        self.assertEqual([limiter.check()[0] for _ in range(3)], [True, True, False])
+        self.assertAlmostEqual(limiter.check()[1], 1.0, places=1)
+
+
+class MetricsTests(SimpleTestCase):
+
+    def test_text_exposition(self):
+        registry = MetricsRegistry()
+        calls = registry.counter('calls_total', 'Calls', ('tool',))
+        latency = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+        calls.inc(tool='a "quoted" tool')
+        latency.observe(0.5)
+        latency.observe(2.0)
+        lines = registry.render().splitlines()
+        self.assertIn('calls_total{tool="a \\"quoted\\" tool"} 1', lines)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 0', lines)
+        self.assertIn('latency_seconds_bucket{le="1.0"} 1', lines)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 2', lines)
+        self.assertIn('latency_seconds_count 2', lines)
+
+
+class StubLLMServer:
+    """Local HTTP server answering each request with the next (delay, status, body) in replies."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.requests = 0
+        self.headers = {}
+
+    async def handle(self, request):
+        await request.read()
+        delay, status, body = self.replies[min(self.requests, len(self.replies) - 1)]
+        self.requests += 1
+        await asyncio.sleep(delay)
+        return web.json_response(body, status=status, headers=self.headers)
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.runner.cleanup()
+
+
+@override_settings(CHATBOT_LLM_RETRY_BACKOFF=0.01)
+class LLMHttpClientTests(SimpleTestCase):
+
+    def http_client(self, **kwargs):
+        return httpx.AsyncClient(transport=ResilientTransport(**kwargs))
+
+    async def test_retries_server_errors(self):
+        async with StubLLMServer([(0, 503, {}), (0, 200, {'ok': True})]) as server:
+            async with self.http_client(max_retries=2) as client:
+                response = await client.post(f"{server.url}/v1/chat/completions", json={})
+        self.assertEqual(response.json(), {'ok': True})
+        self.assertEqual(server.requests, 2)
+
+    def test_retry_after_header(self):
+        self.assertEqual(retry_after(httpx.Response(503, headers={'Retry-After': '2'})), 2.0)
+        self.assertEqual(retry_after(httpx.Response(503, headers={'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})), 0.0)
+        self.assertIsNone(retry_after(httpx.Response(503, headers={'Retry-After': 'soon'})))
+
+    async def test_retries_despite_unparseable_retry_after(self):
+        async with StubLLMServer([(0, 429, {}), (0, 200, {'ok': True})]) as server:
+            server.headers = {'Retry-After': 'soon'}
+            async with self.http_client(max_retries=1) as client:
+                response = await client.post(f"{server.url}/v1/chat/completions", json={})
+        self.assertEqual(response.json(), {'ok': True})
+
+    async def test_retry_budget_stops_retries(self):
+        budget = RetryBudget(ratio=0, min_per_second=0, capacity=0)
+        async with StubLLMServer([(0, 503, {})]) as server:
+            async with self.http_client(max_retries=2, budget=budget) as client:
+                response = await client.post(f"{server.url}/v1/chat/completions", json={})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(server.requests, 1)
+
+    async def test_hedge_answers_when_the_first_request_stalls(self):
+        # Two quick answers set the p95, then the third request stalls and its hedge answers
+        async with StubLLMServer([(0, 200, {'n': 1}), (0, 200, {'n': 2}), (1.5, 200, {'n': 3}), (0, 200, {'n': 4})]) as server:
+            async with self.http_client(hedge=True, hedge_min_samples=2) as client:
+                for _ in range(2):
+                    await client.post(f"{server.url}/v1/chat/completions", json={})
+                started = time.monotonic()
+                response = await client.post(f"{server.url}/v1/chat/completions", json={})
+                elapsed = time.monotonic() - started
+        self.assertEqual(response.json(), {'n': 4})
+        self.assertLess(elapsed, 1)
+
+    async def test_call_deadline(self):
+        async with StubLLMServer([(1, 200, {})]) as server:
+            async with self.http_client() as client:
+                with call_deadline(0.1), self.assertRaises(httpx.ReadTimeout):
+                    await client.post(f"{server.url}/v1/chat/completions", json={})
+
+    async def test_chat_model_uses_the_pooled_client(self):
+        completion = {
+            'id': 'chatcmpl-1', 'object': 'chat.completion', 'created': 0, 'model': 'gpt-4.1-mini',
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': 'Hello'}}],
+            'usage': {'prompt_tokens': 3, 'completion_tokens': 1, 'total_tokens': 4},
+        }
+        async with StubLLMServer([(0, 502, {}), (0, 200, completion)]) as server:
+            async with self.http_client(max_retries=1) as client:
+                llm = ChatOpenAI(model='gpt-4.1-mini', api_key='test', base_url=f"{server.url}/v1",
+                                 http_async_client=client, max_retries=0)
+                message = await llm.ainvoke("Hi")
+        self.assertEqual(message.content, 'Hello')
+        self.assertEqual(server.requests, 2)
+
+
+@override_settings(CHATBOT_TOOL_CACHE_BACKEND='none')
+class StudentOverviewTests(TransactionTestCase):
+
+    def test_one_query_per_requested_aspect(self):
+        student = create_attendance()
+        for index in range(3):
+            course = Course.objects.create(name=f'Course {index}')
+            Attendance.objects.create(student=student, course=course, total_classes=10, attended_classes=5)
+            Grade.objects.create(student=student, course=course, grade='A')
+        with CaptureQueriesContext(connection) as queries:
+            overview = get_student_overview('S100', ['profile', 'attendance', 'grades', 'internships'])
+        # Resolve by id, the student, then one prefetch per related aspect however many rows it has
+        self.assertEqual(len(queries), 5)
+        self.assertEqual(len(overview['attendance']['records']), 4)
+        self.assertEqual(len(overview['grades']['records']), 3)
+        self.assertEqual(overview['internships'], "No internships records found.")
+
+    def test_returns_only_the_requested_aspects(self):
+        create_attendance()
+        overview = asyncio.run(student_overview_from_json(json.dumps({'student': 'Asha Verma', 'aspects': ['attendance', 'attendance']})))
+        self.assertEqual(list(overview), ['name', 'student_id', 'attendance'])
+        overview = asyncio.run(student_overview_from_json(json.dumps({'student': 'S100'})))
+        self.assertEqual(list(overview), ['name', 'student_id', 'profile'])
+        overview = asyncio.run(student_overview_from_json(json.dumps({'student': 'S100', 'aspects': ['fees']})))
+        self.assertTrue(overview['error'].startswith("Invalid input: aspects.0"))
+
+    def test_unknown_and_ambiguous_students(self):
+        create_attendance()
+        self.assertEqual(get_student_overview('Nobody Atall', ['grades']), {"error": "Student not found."})
+        Student.objects.create(student_id='S200', name='Asha Verma', department='ECE', enrollment_year=2022)
+        overview = get_student_overview('Asha Verma', ['grades'])
+        self.assertEqual([candidate['student_id'] for candidate in overview['candidates']], ['S100', 'S200'])
+        self.assertNotIn('grades', overview)
+
+
+class QueryDSLTests(TestCase):
+
+    def test_grouped_ratio(self):
+        create_attendance()
+        result = run_query({
+            'model': 'Attendance',
+            'group_by': ['course__name'],
+            'aggregates': [{'func': 'ratio', 'field': 'attended_classes', 'over': 'total_classes', 'as': 'attendance_percent'}],
+        })
+        self.assertEqual(result['rows'], [{'course__name': 'Algorithms', 'attendance_percent': 75.0}])
+
+    def test_rejects_fields_outside_the_whitelist(self):
+        with self.assertRaises(QueryError):
+            run_query({'model': 'Student', 'fields': ['email']})
+        with self.assertRaises(QueryError):
+            run_query({'model': 'Student', 'aggregates': [{'func': 'avg', 'field': 'name'}]})
+
+
+    def test_rejects_values_the_field_cannot_hold(self):
+        with self.assertRaisesMessage(QueryError, "Invalid value for 'enrollment_year'"):
+            run_query({'model': 'Student', 'filters': [{'field': 'enrollment_year', 'value': 'last year'}]})
+        with self.assertRaisesMessage(QueryError, "Invalid value for 'date'"):
+            run_query({'model': 'Attendance', 'filters': [{'field': 'date', 'op': 'gte', 'value': 'yesterday'}]})
+        result = query_students_data(json.dumps({'model': 'Student', 'filters': [{'field': 'gpa', 'op': 'lt', 'value': 'high'}]}))
+        self.assertTrue(result['error'].startswith("Invalid query: Invalid value for 'gpa'"))
+
+    def test_null_group_keys_survive_compaction(self):
+        student = create_attendance()
+        course = Course.objects.get()
+        Grade.objects.create(student=student, course=course, grade='A', semester='Fall')
+        Grade.objects.create(student=student, course=course, grade='B')
+        result = query_students_data(json.dumps({'model': 'Grade', 'group_by': ['semester'], 'order_by': ['semester']}))
+        self.assertEqual(result['rows'], [{'semester': None, 'count': 1}, {'semester': 'Fall', 'count': 1}])
+
+
+class CompactionTests(SimpleTestCase):
+
+    def test_caps_rows_and_drops_empty_fields(self):
+        rows = [{'id': index, 'name': f'Student {index}', 'remarks': None} for index in range(40)]
+        payload = ToolOutputCompactor().compact('tool', {'records': rows}, max_tokens=10000, max_rows=10)
+        self.assertEqual(len(payload['records']), 10)
+        self.assertEqual(payload['more_records'], 30)
+        self.assertEqual(payload['records'][0], {'name': 'Student 0'})
+
+
+class RouterTests(SimpleTestCase):
+
+    def test_routes_only_unambiguous_questions(self):
+        router = FastPathRouter(threshold=0.9)
+        self.assertEqual(router.route("How many students are there?").intent, 'count_students')
+        self.assertEqual(router.route("Show me the top 5 students").params, {'limit': 5})
+        self.assertIsNone(router.route("How many students failed algorithms last semester?"))
+
+    def test_numbers_other_than_top_n_go_to_the_agent(self):
+        router = FastPathRouter(threshold=0.9)
+        self.assertEqual(router.route("top 3 students").params, {'limit': 3})
+        self.assertIsNone(router.route("how many students in 2021"))
+        self.assertIsNone(router.route("top students of 2021"))
+        self.assertIsNone(router.route("top 5 students of 2021"))
@@ -0,0 +1,36 @@
+# chatbot/tokens.py
+
+import functools
+import tiktoken
+
+TOKEN_ENCODING = "o200k_base"  # encoding used by the gpt-4.1 / gpt-4o family
+
+
+@functools.lru_cache(maxsize=1)
+def get_encoding():
+    try:
+        return tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception as e:
+        # tiktoken downloads the BPE ranks on first use; without network access
+        # fall back to the ~4 characters per token rule of thumb.
+        print(f"Error loading tiktoken encoding: {e}")
+        return None
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text))
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Trim text from the front so that at most max_tokens remain, keeping the most recent part."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = get_encoding()
+    if encoding is None:
+        return text[-max_tokens * 4:]
+    return encoding.decode(encoding.encode(text)[-max_tokens:])
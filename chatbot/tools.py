@@ -0,0 +1,391 @@
+# chatbot/tools.py
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal
+from channels.db import database_sync_to_async
+from django.conf import settings
+from langchain.tools import Tool
+from pydantic import BaseModel, Field, ValidationError
+from .cache import tool_cache
+from .query_dsl import describe_schema
+from .compaction import DROP_FIELDS, compactor, summarize_attendance, summarize_failures, summarize_grades, summarize_performance
+from .tracing import traced_queries
+
+# Tools run on their own bounded pool instead of asgiref's single thread-sensitive
+# thread, so one slow scan no longer queues every other session's lookups.
+tool_executor = ThreadPoolExecutor(max_workers=settings.CHATBOT_TOOL_THREADS, thread_name_prefix='chatbot-tool')
+
+
+def tool_to_async(func):
+    """Wrap a sync ORM tool to run on tool_executor, closing stale DB connections around each call."""
+    return database_sync_to_async(traced_queries(func), thread_sensitive=False, executor=tool_executor)
+
+
+def name_key(student_name, *args, **kwargs):
+    """Cache key arguments with the name's case and spacing folded, so "rahul  sharma" and "Rahul Sharma" share an entry."""
+    return (" ".join(str(student_name).lower().split()), *args, *(kwargs[name] for name in sorted(kwargs)))
+
+
+def get_student_records(student_name):
+    from students.name_index import resolve_student
+    try:
+        student, candidates = resolve_student(student_name)
+        if student:
+            return student
+        if candidates:
+            return {
+                "error": "More than one student matches this name. Ask the user which one they mean, or retry with the student_id.",
+                "candidates": candidates,
+            }
+        return {"error": "Student not found."}
+    except Exception as e:
+        print(f"Error fetching student details: {e}")
+        return {"error": "An error occurred while fetching student details."}
+
+get_student_records_async = tool_to_async(get_student_records)
+
+student_records_tool = Tool(
+    name="get_student_records",
+    func=lambda x: get_student_records_async(x),
+    coroutine=get_student_records_async,
+    description="Fetches a student's record based on their name."
+)
+
+@tool_cache.cached(models=('Student',), key_args=name_key)
+def search_students(query):
+    from students.name_index import search_student_names
+    try:
+        candidates = search_student_names(query, limit=10)
+        if not candidates:
+            return {"message": "No students match this name."}
+        return candidates
+    except Exception as e:
+        print(f"Error searching students: {e}")
+        return {"error": "An error occurred while searching students."}
+
+search_students_async = tool_to_async(search_students)
+
+search_students_tool = Tool(
+    name="search_students",
+    func=lambda x: search_students_async(x),
+    coroutine=search_students_async,
+    description="Finds students by (partial or misspelt) name. Returns ranked candidates with student_id, department, enrollment_year and a match score, to tell apart students with similar names."
+)
+
+@tool_cache.cached(models=('Student', 'Course', 'Internship', 'Performance', 'Attendance', 'Grade'), ttl=600)
+def count_total_records(items: str):
+    """
+    Count the total number of records in the specified model.
+    :param items: The name of the model to count records for.
+    """
+    from students.models import Student, Attendance, Grade, Course, Internship, Performance
+    try:
+        if items == "students":
+            total_count = Student.objects.count()
+        elif items == "courses":
+            total_count = Course.objects.count()
+        elif items == "internships":
+            total_count = Internship.objects.count()
+        elif items == "performances":
+            total_count = Performance.objects.count()
+        elif items == "attendance":
+            total_count = Attendance.objects.count()
+        elif items == "grades":
+            total_count = Grade.objects.count()
+        else:
+            return Student.objects.count()
+        return total_count
+    except Exception as e:
+        print(f"Error counting students: {e}")
+        return {"error": "An error occurred while counting students."}
+
+count_total_records_async = tool_to_async(count_total_records)
+
+count_records_tool = Tool(
+    name="count_total_records",
+    func=lambda x: count_total_records_async(x),
+    coroutine=count_total_records_async,
+    description="Counts total records for a given model (students, courses, internships, etc.)."
+)
+
+@tool_cache.cached(models=('Student', 'Performance', 'Course'), ignore_args=True)
+@compactor.compacted()
+def failed_students(self):
+    from students.models import Performance
+    try:
+        # One row per failed performance, read straight into dicts. Joining from
+        # Student repeated each student once per failed course and then listed
+        # all of their performances, passed ones included.
+        failed_performances = Performance.objects.filter(
+            status='Failed', student__is_deleted=False
+        ).values(
+            "student__name", "student__student_id", "student__department", "student__email",
+            "student__phone_number", "student__gpa", "student__status", "student__enrollment_year",
+            "student__graduation_year", "course__name", "status",
+        ).order_by("student__name", "course__name")
+
+        data = [
+            {
+                "name": row["student__name"],
+                "student_id": row["student__student_id"],
+                "department": row["student__department"],
+                "email": row["student__email"],
+                "phone_number": row["student__phone_number"],
+                "gpa": row["student__gpa"],
+                "status": row["student__status"],
+                "enrollment_year": row["student__enrollment_year"],
+                "graduation_year": row["student__graduation_year"],
+                "course_name": row["course__name"],  # Include course name
+                "performance_status": row["status"],
+            }
+            for row in failed_performances
+        ]
+        if not data:
+            return {"message": "No students have failed."}
+
+        return {
+            "failed_performances": len(data),
+            "failed_students": len({row["student_id"] for row in data}),
+            "summary_by_course": summarize_failures(data),
+            "records": data,
+        }
+    except Exception as e:
+        print(f"Error fetching failed students: {e}")
+        return {"error": "An error occurred while fetching failed students."}
+
+failed_students_async = tool_to_async(failed_students)
+
+failed_students_tool = Tool(
+    name="failed_students",
+    func=lambda: failed_students_async(),
+    coroutine=failed_students_async,
+    description="Fetches a list of failed students."
+)    
+
+@tool_cache.cached(models=('Student',), ignore_args=True)
+def topper_students_list(self):
+    from students.models import Student
+    try:
+        top_students = Student.objects.filter(is_deleted=False).order_by('-gpa')[:10]
+        if not top_students:
+            return {"message": "No students found."}
+        return [
+            {
+                "name": student.name,
+                "student_id": student.student_id,
+                "department": student.department,
+                "email": student.email,
+                "phone_number": student.phone_number,
+                "gpa": student.gpa,
+                "status": student.status,
+                "enrollment_year": student.enrollment_year,
+                "graduation_year": student.graduation_year,
+            }
+            for student in top_students
+        ]
+    except Exception as e:
+        print(f"Error fetching top students: {e}")
+        return {"error": "An error occurred while fetching top students."}
+
+topper_students_list_async = tool_to_async(topper_students_list)
+
+topper_students_tool = Tool(
+    name="topper_students_list",
+    func=lambda: topper_students_list_async(),
+    coroutine=topper_students_list_async,
+    description="Fetches a list of the top 10 students based on GPA."
+)
+
+class StudentSessionInput(BaseModel):
+    student_name: str = Field(description="Name of the student")
+    session: str = Field(description="Session type (Attendance, Grades, Internships, Performance)")
+
+# Per session: related name, newest-first ordering (so row caps keep the latest records),
+# serializer and the per-course summary handed to the model alongside the rows
+STUDENT_SESSIONS = {
+    'Attendance': ('student_attendance', '-date', 'AttendanceSerializer', summarize_attendance),
+    'Grades': ('student_grades', '-created_at', 'GradeSerializer', summarize_grades),
+    'Internships': ('student_internships', '-start_date', 'InternshipSerializer', None),
+    'Performance': ('student_performance', '-created_at', 'PerformanceSerializer', summarize_performance),
+}
+
+def serialize_session(session, records):
+    """Serialized records of one session plus their per-course summary, or None when there are none."""
+    from students import serializers
+    _, _, serializer_name, summarize = STUDENT_SESSIONS[session]
+    data = getattr(serializers, serializer_name)(records, many=True).data
+    if not data:
+        return None
+
+    result = {}
+    if summarize:
+        result["summary_by_course"] = summarize(data)
+    result["records"] = data
+    return result
+
+@tool_cache.cached(models=('Student', 'Course', 'Attendance', 'Grade', 'Internship', 'Performance'), key_args=name_key)
+@compactor.compacted(drop=DROP_FIELDS | {'student_name'})
+def get_student_session(student_name, session):
+    student = get_student_records(student_name)
+    if isinstance(student, dict) and "error" in student:
+        return student  # Return error if student not found, ambiguous or an error occurred
+    if session not in STUDENT_SESSIONS:
+        return {"error": "Invalid session type specified."}
+
+    related_name, ordering, _, _ = STUDENT_SESSIONS[session]
+    records = getattr(student, related_name).select_related('student').order_by(ordering)
+    if session != 'Internships':
+        records = records.select_related('course')
+    data = serialize_session(session, records)
+    if data is None:
+        return {"message": f"No {session.lower()} records found for {student.name}."}
+    return {"name": student.name, "student_id": student.student_id, "session": session, **data}
+        
+get_student_session_async = tool_to_async(get_student_session)
+
+# student_session_tool = Tool(
+#     name="get_student_session",
+#     func=lambda x, y: get_student_session_async(x, y),
+#     coroutine=get_student_session_async,
+#     description="Fetches a student's session data (Attendance, Grades, Internships, Performance) based on session type."
+# )
+
+student_session_tool = Tool(
+    name="get_student_session",
+    func=lambda x: get_student_session_async(**json.loads(x)),
+    coroutine=lambda x: get_student_session_async(**json.loads(x)),
+    description="Fetches a student's session data (Attendance, Grades, Internships, Performance) based on session type. Input should be JSON format like: {\"student_name\": \"John Doe\", \"session\": \"Attendance\"}"
+)
+
+@tool_cache.cached(models=('Student',), key_args=name_key)
+@compactor.compacted()
+def get_student_details_sync(student_name):
+    from students.models import Student, Attendance, Grade, Course, Internship, Performance
+    from students.serializers import StudentSerializer
+    try:
+        student = get_student_records(student_name)
+        if isinstance(student, dict):
+            return student
+        serializer = StudentSerializer(student)
+        student_details = serializer.data
+        return student_details
+    
+    except Exception as e:
+        print(f"Error fetching student details: {e}")
+        return {"error": "An error occurred while fetching student details."}
+
+get_student_details_async = tool_to_async(get_student_details_sync)
+
+student_details_tool = Tool(
+    name="get_student_details",
+    func=lambda x: get_student_details_async(x),
+    coroutine=get_student_details_async,
+    description="Fetches details of a student based on their name.",
+)
+
+
+class StudentOverviewInput(BaseModel):
+    student: str = Field(description="Student name or student_id")
+    aspects: list[Literal['profile', 'attendance', 'grades', 'internships', 'performance']] = Field(
+        default=['profile'], min_length=1, description="Which parts of the student's record to return"
+    )
+
+# Overview aspect -> get_student_session session name
+STUDENT_ASPECTS = {
+    'attendance': 'Attendance',
+    'grades': 'Grades',
+    'internships': 'Internships',
+    'performance': 'Performance',
+}
+
+@tool_cache.cached(models=('Student', 'Course', 'Attendance', 'Grade', 'Internship', 'Performance'), key_args=lambda student, aspects: name_key(student, sorted(aspects)))
+@compactor.compacted(drop=DROP_FIELDS | {'student_name'})
+def get_student_overview(student, aspects):
+    """Every requested aspect of one student in one payload, loaded with a single prefetch plan."""
+    from django.db.models import Prefetch
+    from students.models import Student
+    from students.serializers import StudentSerializer
+    try:
+        resolved = get_student_records(student)
+        if isinstance(resolved, dict):
+            return resolved
+
+        lookups = []
+        for aspect in aspects:
+            if aspect in STUDENT_ASPECTS:
+                related_name, ordering, _, _ = STUDENT_SESSIONS[STUDENT_ASPECTS[aspect]]
+                queryset = getattr(Student, related_name).rel.related_model.objects.order_by(ordering)
+                if aspect != 'internships':
+                    queryset = queryset.select_related('course')
+                lookups.append(Prefetch(related_name, queryset=queryset))
+        resolved = Student.objects.prefetch_related(*lookups).get(pk=resolved.pk)
+
+        result = {"name": resolved.name, "student_id": resolved.student_id}
+        for aspect in aspects:
+            if aspect == 'profile':
+                result['profile'] = StudentSerializer(resolved).data
+                continue
+            related_name = STUDENT_SESSIONS[STUDENT_ASPECTS[aspect]][0]
+            data = serialize_session(STUDENT_ASPECTS[aspect], getattr(resolved, related_name).all())
+            result[aspect] = data if data is not None else f"No {aspect} records found."
+        return result
+    except Exception as e:
+        print(f"Error fetching student overview: {e}")
+        return {"error": "An error occurred while fetching the student overview."}
+
+get_student_overview_async = tool_to_async(get_student_overview)
+
+async def student_overview_from_json(tool_input):
+    try:
+        params = StudentOverviewInput.model_validate_json(tool_input)
+    except ValidationError as e:
+        return {"error": "Invalid input: " + "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())}
+    # dict.fromkeys drops repeated aspects but keeps the requested order
+    return await get_student_overview_async(params.student, list(dict.fromkeys(params.aspects)))
+
+student_overview_tool = Tool(
+    name="get_student_overview",
+    func=student_overview_from_json,
+    coroutine=student_overview_from_json,
+    description="Fetches several parts of one student's record in a single call. Prefer it over repeated get_student_details / get_student_session calls whenever a question covers more than one of: profile, attendance, grades, internships, performance. Input should be JSON format like: {\"student\": \"John Doe\", \"aspects\": [\"attendance\", \"grades\", \"internships\"]}"
+)
+
+
+@tool_cache.cached(models=('Student', 'Course', 'Attendance', 'Grade', 'Internship', 'Performance'))
+def query_students_data(query):
+    from .query_dsl import QueryError, run_query
+    try:
+        result = run_query(json.loads(query) if isinstance(query, str) else query)
+    except (QueryError, json.JSONDecodeError) as e:
+        return {"error": f"Invalid query: {e}"}
+    except Exception as e:
+        print(f"Error running students data query: {e}")
+        return {"error": "An error occurred while running the query."}
+    # A null group key is a group of its own (e.g. students with no semester), not an empty field
+    return compactor.compact('query_students_data', result, keep=frozenset(result['group_by']))
+
+query_students_data_async = tool_to_async(query_students_data)
+
+query_students_data_tool = Tool(
+    name="query_students_data",
+    func=lambda x: query_students_data_async(x),
+    coroutine=query_students_data_async,
+    description=(
+        "Read-only statistics over the student database in one call: counts, averages, min/max and percentages, "
+        "optionally filtered and grouped (e.g. average GPA of CSE students enrolled in 2021, the course with the "
+        "worst attendance). Input is a JSON object: "
+        '{"model": "<model>", "filters": [{"field": "...", "op": "eq|ne|lt|lte|gt|gte|in|contains|startswith|isnull|range", "value": ...}], '
+        '"group_by": ["..."], "aggregates": [{"func": "count|count_distinct|sum|avg|min|max", "field": "...", "as": "name"}, '
+        '{"func": "ratio", "field": "attended_classes", "over": "total_classes", "as": "attendance_percent"}], '
+        '"order_by": ["-name"], "limit": 10}. Without aggregates it returns plain rows of "fields". '
+        "Models and fields:\n" + describe_schema()
+    ),
+)
+
+
+# Bump whenever a tool is added, removed or its signature/description changes so
+# the agent registry builds a fresh executor instead of reusing a stale one.
+TOOLS_VERSION = 4
+
+TOOLS = [student_overview_tool, student_details_tool, student_records_tool, search_students_tool, count_records_tool, failed_students_tool, topper_students_tool, student_session_tool, query_students_data_tool]
@@ -0,0 +1,244 @@
+# chatbot/tracing.py
+
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+import uuid
+from langchain_core.callbacks import AsyncCallbackHandler
+from .metrics import registry
+from .tokens import count_tokens
+
+logger = logging.getLogger('chatbot.trace')
+
+# The turn being answered; set per message task, inherited by tool threads through sync_to_async
+current_trace = contextvars.ContextVar('chatbot_trace', default=None)
+
+TURNS = registry.counter('chatbot_turns_total', 'Chat turns answered, by outcome', ('outcome',))
+TURN_SECONDS = registry.histogram('chatbot_turn_seconds', 'Time from receiving a message to its last frame', ('outcome',))
+LLM_SECONDS = registry.histogram('chatbot_llm_call_seconds', 'Latency of one LLM call', ('model',))
+LLM_TOKENS = registry.counter('chatbot_llm_tokens_total', 'LLM tokens, by direction', ('model', 'direction'))
+TOOL_SECONDS = registry.histogram('chatbot_tool_call_seconds', 'Latency of one agent tool call', ('tool',))
+TOOL_ERRORS = registry.counter('chatbot_tool_errors_total', 'Tool calls that raised or returned an error', ('tool',))
+TOOL_ROWS = registry.counter('chatbot_tool_result_rows_total', 'Rows returned to the agent by tools', ('tool',))
+TOOL_BYTES = registry.counter('chatbot_tool_result_bytes_total', 'Serialized size of tool results', ('tool',))
+DB_QUERIES = registry.counter('chatbot_db_queries_total', 'SQL queries run by tool functions', ('function',))
+DB_SECONDS = registry.counter('chatbot_db_query_seconds_total', 'Time spent in SQL by tool functions', ('function',))
+CHANNEL_SECONDS = registry.histogram(
+    'chatbot_channel_send_seconds', 'Time to hand one frame to the socket (direct) or the channel layer (group)', ('path',),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+CONNECTIONS = registry.gauge('chatbot_websocket_connections', 'Open chat WebSocket connections')
+
+
+def new_trace_id():
+    return uuid.uuid4().hex
+
+
+def result_rows(output):
+    """How many records a tool result carries: list lengths, one level into dicts."""
+    if isinstance(output, list):
+        return len(output)
+    if isinstance(output, dict):
+        if 'error' in output or 'message' in output:
+            return 0
+        lists = [len(value) for value in output.values() if isinstance(value, list)]
+        return sum(lists) if lists else 1
+    return 1 if output else 0
+
+
+class Trace:
+    """
+    Spans and totals for one chat turn.
+
+    LLM calls, tool calls and the SQL run by tool functions are kept as spans;
+    channel sends happen once per streamed token, so they are only totalled.
+    finish() exports everything as one JSON log line and into the metrics.
+    """
+
+    def __init__(self, message_id=None, room=None, trace_id=None):
+        self.trace_id = trace_id or new_trace_id()
+        self.message_id = message_id
+        self.room = room
+        self.started = time.perf_counter()
+        self.outcome = None
+        self.tags = {}
+        self.spans = []
+        self.channel = {'sends': 0, 'seconds': 0.0, 'bytes': 0}
+        self._lock = threading.Lock()
+
+    def add_span(self, kind, name, started, **attrs):
+        """Record a span that began at perf_counter() value started and ends now."""
+        ended = time.perf_counter()
+        span = {
+            'kind': kind,
+            'name': name,
+            'start_ms': round((started - self.started) * 1000, 2),
+            'duration_ms': round((ended - started) * 1000, 2),
+            **attrs,
+        }
+        with self._lock:
+            self.spans.append(span)
+        return ended - started
+
+    def add_channel_send(self, seconds, size):
+        with self._lock:
+            self.channel['sends'] += 1
+            self.channel['seconds'] += seconds
+            self.channel['bytes'] += size
+
+    def totals(self):
+        with self._lock:
+            spans, channel = list(self.spans), dict(self.channel)
+        totals = {
+            'llm': {'calls': 0, 'ms': 0.0, 'prompt_tokens': 0, 'completion_tokens': 0, 'errors': 0},
+            'tool': {'calls': 0, 'ms': 0.0, 'rows': 0, 'bytes': 0, 'errors': 0},
+            'db': {'calls': 0, 'ms': 0.0, 'queries': 0, 'query_ms': 0.0},
+        }
+        for span in spans:
+            total = totals[span['kind']]
+            total['calls'] += 1
+            total['ms'] += span['duration_ms']
+            for field in ('prompt_tokens', 'completion_tokens', 'rows', 'bytes', 'queries', 'query_ms'):
+                if field in total:
+                    total[field] += span.get(field, 0)
+            if span.get('error') and 'errors' in total:
+                total['errors'] += 1
+        for total in totals.values():
+            total['ms'] = round(total['ms'], 2)
+        totals['db']['query_ms'] = round(totals['db']['query_ms'], 2)
+        totals['channel'] = {'sends': channel['sends'], 'ms': round(channel['seconds'] * 1000, 2), 'bytes': channel['bytes']}
+        return totals, spans
+
+    def as_dict(self):
+        totals, spans = self.totals()
+        return {
+            'trace_id': self.trace_id,
+            'message_id': self.message_id,
+            'room': self.room,
+            'outcome': self.outcome,
+            **self.tags,
+            'duration_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            **totals,
+            'spans': spans,
+        }
+
+    def finish(self, outcome=None):
+        self.outcome = outcome or self.outcome or 'unknown'
+        TURNS.inc(outcome=self.outcome)
+        TURN_SECONDS.observe(time.perf_counter() - self.started, outcome=self.outcome)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info('chat turn', extra={'trace': self.as_dict()})
+
+
+class TraceCallbackHandler(AsyncCallbackHandler):
+    """Turns LangChain's LLM and tool callbacks into spans on a Trace."""
+
+    def __init__(self, trace):
+        self.trace = trace
+        self._runs = {}
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        model = (metadata or {}).get('ls_model_name') or (serialized or {}).get('name') or 'unknown'
+        prompt = sum(
+            count_tokens(message.content if isinstance(message.content, str) else json.dumps(message.content))
+            for batch in messages for message in batch
+        )
+        self._runs[run_id] = (time.perf_counter(), model, prompt)
+
+    async def on_llm_end(self, response, *, run_id, **kwargs):
+        started, model, prompt_estimate = self._runs.pop(run_id, (None, 'unknown', 0))
+        if started is None:
+            return
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        message = getattr(generation, 'message', None)
+        usage = getattr(message, 'usage_metadata', None) or {}
+        if not usage:
+            token_usage = (response.llm_output or {}).get('token_usage') or {}
+            usage = {'input_tokens': token_usage.get('prompt_tokens'), 'output_tokens': token_usage.get('completion_tokens')}
+        estimated = not usage.get('input_tokens')
+        prompt_tokens = usage.get('input_tokens') or prompt_estimate
+        completion_tokens = usage.get('output_tokens') or count_tokens(generation.text if generation else '')
+
+        seconds = self.trace.add_span(
+            'llm', model, started,
+            prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, estimated_tokens=estimated,
+            tool_calls=len(getattr(message, 'tool_calls', None) or []),
+        )
+        LLM_SECONDS.observe(seconds, model=model)
+        LLM_TOKENS.inc(prompt_tokens, model=model, direction='prompt')
+        LLM_TOKENS.inc(completion_tokens, model=model, direction='completion')
+
+    async def on_llm_error(self, error, *, run_id, **kwargs):
+        started, model, _ = self._runs.pop(run_id, (None, 'unknown', 0))
+        if started is not None:
+            LLM_SECONDS.observe(self.trace.add_span('llm', model, started, error=type(error).__name__), model=model)
+
+    async def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._runs[run_id] = (time.perf_counter(), (serialized or {}).get('name') or kwargs.get('name') or 'unknown')
+
+    async def on_tool_end(self, output, *, run_id, **kwargs):
+        started, tool = self._runs.pop(run_id, (None, 'unknown'))
+        if started is None:
+            return
+        # The agent serializes tool results the same way before sending them to the LLM
+        serialize_started = time.perf_counter()
+        text = output if isinstance(output, str) else json.dumps(output, default=str)
+        serialize_ms = round((time.perf_counter() - serialize_started) * 1000, 3)
+        rows, size = result_rows(output), len(text.encode())
+        error = isinstance(output, dict) and 'error' in output
+
+        seconds = self.trace.add_span('tool', tool, started, rows=rows, bytes=size, serialize_ms=serialize_ms, error=error)
+        TOOL_SECONDS.observe(seconds, tool=tool)
+        TOOL_ROWS.inc(rows, tool=tool)
+        TOOL_BYTES.inc(size, tool=tool)
+        if error:
+            TOOL_ERRORS.inc(tool=tool)
+
+    async def on_tool_error(self, error, *, run_id, **kwargs):
+        started, tool = self._runs.pop(run_id, (None, 'unknown'))
+        if started is not None:
+            TOOL_SECONDS.observe(self.trace.add_span('tool', tool, started, error=type(error).__name__), tool=tool)
+            TOOL_ERRORS.inc(tool=tool)
+
+
+class QueryCounter:
+    """connection.execute_wrapper hook counting the statements a block runs and their time."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.seconds += time.perf_counter() - started
+
+
+def traced_queries(func):
+    """Record a db span with the SQL count and time for each call to func made during a traced turn."""
+    from django.db import connection
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        trace = current_trace.get()
+        if trace is None:
+            return func(*args, **kwargs)
+        counter = QueryCounter()
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(counter):
+                return func(*args, **kwargs)
+        finally:
+            name = getattr(func, '__name__', type(func).__name__)
+            trace.add_span('db', name, started, queries=counter.queries, query_ms=round(counter.seconds * 1000, 2))
+            DB_QUERIES.inc(counter.queries, function=name)
+            DB_SECONDS.inc(counter.seconds, function=name)
+
+    return wrapper
+
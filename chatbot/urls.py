@@ -0,0 +1,27 @@
+# chatbot/urls.py
+
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    # Tool cache counters
+    path('cache-stats/', views.ToolCacheStatsView.as_view(), name='chatbot-cache-stats'),
+
+    # Tool output compaction counters
+    path('compaction-stats/', views.CompactionStatsView.as_view(), name='chatbot-compaction-stats'),
+
+    # Fast-path router counters
+    path('router-stats/', views.RouterStatsView.as_view(), name='chatbot-router-stats'),
+
+    # Agent run admission control counters
+    path('admission-stats/', views.AdmissionStatsView.as_view(), name='chatbot-admission-stats'),
+
+    # Speculative prefetch counters
+    path('prefetch-stats/', views.PrefetchStatsView.as_view(), name='chatbot-prefetch-stats'),
+
+    # Model tier usage and cost counters
+    path('model-routing-stats/', views.ModelRoutingStatsView.as_view(), name='chatbot-model-routing-stats'),
+
+    # Shared LLM HTTP client pool, retry and hedge counters
+    path('llm-http-stats/', views.LLMHttpStatsView.as_view(), name='chatbot-llm-http-stats'),
+]
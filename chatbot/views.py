@@ -1,3 +1,92 @@
-from django.shortcuts import render
+# chatbot/views.py
 
-# Create your views here.
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.conf import settings
+from .admission import admission_controller
+from .cache import tool_cache
+from .compaction import compactor
+from .http_client import llm_http_stats
+from .metrics import registry
+from .model_routing import model_router
+from .prefetch import speculative_prefetcher
+from .router import fast_path_router
+
+
+# API view for the chatbot tool cache hit/miss counters of this worker
+class ToolCacheStatsView(APIView):
+    def get(self, request):
+        data = {
+            "backend": settings.CHATBOT_TOOL_CACHE_BACKEND,
+            "tools": tool_cache.stats(),
+        }
+        return Response(data, status=status.HTTP_200_OK)
+
+
+# API view for how much tool output compaction trims from the agent's context in this worker
+class CompactionStatsView(APIView):
+    def get(self, request):
+        data = {
+            "token_budget": settings.CHATBOT_TOOL_TOKEN_BUDGET,
+            "max_rows": settings.CHATBOT_TOOL_MAX_ROWS,
+            "tools": compactor.stats(),
+        }
+        return Response(data, status=status.HTTP_200_OK)
+
+
+# API view for the share of chat traffic answered by the fast-path router in this worker
+class RouterStatsView(APIView):
+    def get(self, request):
+        data = {
+            "enabled": settings.CHATBOT_ROUTER_ENABLED,
+            "threshold": settings.CHATBOT_ROUTER_THRESHOLD,
+            **fast_path_router.stats(),
+        }
+        return Response(data, status=status.HTTP_200_OK)
+
+
+# API view for the agent run limiter: active runs, queue depth and wait times in this worker
+class AdmissionStatsView(APIView):
+    def get(self, request):
+        return Response(admission_controller.stats(), status=status.HTTP_200_OK)
+
+
+# API view for speculative student prefetch: hit rate and wasted fetches in this worker
+class PrefetchStatsView(APIView):
+    def get(self, request):
+        data = {
+            "enabled": settings.CHATBOT_PREFETCH_ENABLED,
+            **speculative_prefetcher.stats(),
+        }
+        return Response(data, status=status.HTTP_200_OK)
+
+
+# API view for tiered model routing: runs, escalations, latency, tokens and estimated cost per tier in this worker
+class ModelRoutingStatsView(APIView):
+    def get(self, request):
+        data = {
+            "enabled": settings.CHATBOT_MODEL_ROUTING_ENABLED,
+            "tiers": settings.CHATBOT_MODEL_TIERS,
+            "policy": settings.CHATBOT_MODEL_POLICY,
+            "usage": model_router.stats(),
+        }
+        return Response(data, status=status.HTTP_200_OK)
+
+
+# API view for the shared LLM HTTP client: pool use, retry budget and hedging in this worker
+class LLMHttpStatsView(APIView):
+    def get(self, request):
+        data = {
+            "deadline": settings.CHATBOT_LLM_CALL_DEADLINE,
+            "max_retries": settings.CHATBOT_LLM_MAX_RETRIES,
+            "client": llm_http_stats(),
+        }
+        return Response(data, status=status.HTTP_200_OK)
+
+
+# Prometheus text exposition of this worker's chat metrics (turns, LLM, tools, SQL, channel sends)
+class MetricsView(APIView):
+    def get(self, request):
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -14,6 +14,7 @@ application = ProtocolTypeRouter({
     "websocket": AuthMiddlewareStack(
         URLRouter([
             path("ws/chat/", ChatConsumer.as_asgi()),  # Ensure this matches your WebSocket route
+            path("ws/chat/<str:room_name>/", ChatConsumer.as_asgi()),  # Shared chat room
         ])
     ),
 })
@@ -60,22 +60,157 @@ INSTALLED_APPS = [
 
 ASGI_APPLICATION = 'chatbot_project.asgi.application'
 
-OPENAI_API_KEY = config('OPENAI_API_KEY')
+OPENAI_API_KEY = config('OPENAI_API_KEY', default="")
+
+# chatbot agent configuration
+CHATBOT_MODEL = config('CHATBOT_MODEL', default="gpt-4.1")
+CHATBOT_STREAMING = config('CHATBOT_STREAMING', default=True, cast=bool)
+
+# chat model backend: "openai", "fake" (scripted, offline), "record" (openai, saving every
+# response to CHATBOT_LLM_CASSETTE) or "replay" (serve responses from that cassette)
+CHATBOT_LLM_BACKEND = config('CHATBOT_LLM_BACKEND', default="openai")
+CHATBOT_LLM_CASSETTE = config('CHATBOT_LLM_CASSETTE', default=str(BASE_DIR / 'cassettes' / 'chatbot.json'))
+CHATBOT_LLM_REPLAY_LATENCY = config('CHATBOT_LLM_REPLAY_LATENCY', default="")  # empty: use the recorded latency
+# shared HTTP client for OpenAI calls: keep-alive pool size, per-call deadline (covering
+# retries, hedges and the streamed body), retries on connect errors and 408/429/5xx within a
+# budget of RETRY_BUDGET_RATIO retries per request, and optional hedging after the recent p95
+CHATBOT_LLM_MAX_CONNECTIONS = config('CHATBOT_LLM_MAX_CONNECTIONS', default=32, cast=int)
+CHATBOT_LLM_MAX_KEEPALIVE_CONNECTIONS = config('CHATBOT_LLM_MAX_KEEPALIVE_CONNECTIONS', default=16, cast=int)
+CHATBOT_LLM_KEEPALIVE_EXPIRY = config('CHATBOT_LLM_KEEPALIVE_EXPIRY', default=60.0, cast=float)
+CHATBOT_LLM_CONNECT_TIMEOUT = config('CHATBOT_LLM_CONNECT_TIMEOUT', default=3.0, cast=float)
+CHATBOT_LLM_CALL_DEADLINE = config('CHATBOT_LLM_CALL_DEADLINE', default=60.0, cast=float)
+CHATBOT_LLM_MAX_RETRIES = config('CHATBOT_LLM_MAX_RETRIES', default=2, cast=int)
+CHATBOT_LLM_RETRY_BACKOFF = config('CHATBOT_LLM_RETRY_BACKOFF', default=0.5, cast=float)
+CHATBOT_LLM_RETRY_BACKOFF_MAX = config('CHATBOT_LLM_RETRY_BACKOFF_MAX', default=8.0, cast=float)
+CHATBOT_LLM_RETRY_BUDGET_RATIO = config('CHATBOT_LLM_RETRY_BUDGET_RATIO', default=0.1, cast=float)
+CHATBOT_LLM_RETRY_BUDGET_MIN_PER_SECOND = config('CHATBOT_LLM_RETRY_BUDGET_MIN_PER_SECOND', default=0.2, cast=float)
+CHATBOT_LLM_RETRY_BUDGET_CAPACITY = config('CHATBOT_LLM_RETRY_BUDGET_CAPACITY', default=10, cast=float)
+CHATBOT_LLM_HEDGE_ENABLED = config('CHATBOT_LLM_HEDGE_ENABLED', default=False, cast=bool)
+CHATBOT_LLM_HEDGE_QUANTILE = config('CHATBOT_LLM_HEDGE_QUANTILE', default=95, cast=float)
+CHATBOT_LLM_HEDGE_MIN_SAMPLES = config('CHATBOT_LLM_HEDGE_MIN_SAMPLES', default=20, cast=int)
+# fake backend: JSON script path (see chatbot/llm.py), first-token latency distribution
+# ("0.5", "uniform:0.2:1", "normal:0.8:0.2", "lognormal:0.8:0.5"), per-token latency and seed
+CHATBOT_FAKE_LLM_SCRIPT = config('CHATBOT_FAKE_LLM_SCRIPT', default="")
+CHATBOT_FAKE_LLM_LATENCY = config('CHATBOT_FAKE_LLM_LATENCY', default="0")
+CHATBOT_FAKE_LLM_TOKEN_LATENCY = config('CHATBOT_FAKE_LLM_TOKEN_LATENCY', default=0.0, cast=float)
+CHATBOT_FAKE_LLM_SEED = config('CHATBOT_FAKE_LLM_SEED', default=0, cast=int)
 
 # redis configuration
 REDIS_HOST = config('REDIS_HOST', default="127.0.0.1")
 REDIS_PASSWORD = config('REDIS_PASSWORD')
 REDIS_PORT = config('REDIS_PORT', default=6379, cast=int)
 REDIS_DB = config('REDIS_DB', default=0, cast=int)
+REDIS_URL = f'redis://:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}'
 
 
+# "redis", or "memory" for a single-process layer (one worker, benchmarks, local runs without Redis)
+CHANNEL_LAYER_BACKEND = config('CHANNEL_LAYER_BACKEND', default="redis")
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            "hosts": [f'redis://:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}'],
+            "hosts": [REDIS_URL],
         },
     },
+} if CHANNEL_LAYER_BACKEND == "redis" else {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
+
+# chatbot conversation memory ("redis" or "local" for a single-process dict)
+CHATBOT_MEMORY_BACKEND = config('CHATBOT_MEMORY_BACKEND', default="redis")
+CHATBOT_MEMORY_PER_USER = config('CHATBOT_MEMORY_PER_USER', default=False, cast=bool)
+CHATBOT_MEMORY_TOKEN_BUDGET = config('CHATBOT_MEMORY_TOKEN_BUDGET', default=2000, cast=int)
+CHATBOT_MEMORY_SUMMARY_TOKENS = config('CHATBOT_MEMORY_SUMMARY_TOKENS', default=400, cast=int)
+CHATBOT_MEMORY_TTL = config('CHATBOT_MEMORY_TTL', default=60 * 60 * 24, cast=int)
+
+# chatbot tool result cache ("local", "redis" or "none" to disable)
+CHATBOT_TOOL_CACHE_BACKEND = config('CHATBOT_TOOL_CACHE_BACKEND', default="local")
+CHATBOT_TOOL_CACHE_MAX_ENTRIES = config('CHATBOT_TOOL_CACHE_MAX_ENTRIES', default=1024, cast=int)
+CHATBOT_TOOL_CACHE_DEFAULT_TTL = config('CHATBOT_TOOL_CACHE_DEFAULT_TTL', default=300, cast=int)
+CHATBOT_TOOL_CACHE_INFLIGHT_WAIT = config('CHATBOT_TOOL_CACHE_INFLIGHT_WAIT', default=10, cast=float)
+
+# speculative prefetch of the student(s) named in a message while the LLM plans its first step
+CHATBOT_PREFETCH_ENABLED = config('CHATBOT_PREFETCH_ENABLED', default=True, cast=bool)
+CHATBOT_PREFETCH_MAX_STUDENTS = config('CHATBOT_PREFETCH_MAX_STUDENTS', default=2, cast=int)
+# prefetch fetches allowed on the tool pool at once; beyond that they are skipped, not queued
+CHATBOT_PREFETCH_MAX_CONCURRENCY = config('CHATBOT_PREFETCH_MAX_CONCURRENCY', default=2, cast=int)
+
+# token budget and row cap for each tool result pasted into the agent's context
+CHATBOT_TOOL_TOKEN_BUDGET = config('CHATBOT_TOOL_TOKEN_BUDGET', default=1500, cast=int)
+CHATBOT_TOOL_MAX_ROWS = config('CHATBOT_TOOL_MAX_ROWS', default=25, cast=int)
+
+# row and time limits for the chatbot's read-only query tool
+CHATBOT_QUERY_MAX_ROWS = config('CHATBOT_QUERY_MAX_ROWS', default=50, cast=int)
+CHATBOT_QUERY_TIMEOUT = config('CHATBOT_QUERY_TIMEOUT', default=2.0, cast=float)
+
+# size of the thread pool that runs the chatbot's ORM tools
+CHATBOT_TOOL_THREADS = config('CHATBOT_TOOL_THREADS', default=8, cast=int)
+
+# admission control for agent (LLM) runs and per-connection message rate limits
+CHATBOT_MAX_CONCURRENT_AGENT_RUNS = config('CHATBOT_MAX_CONCURRENT_AGENT_RUNS', default=16, cast=int)
+CHATBOT_MAX_QUEUED_AGENT_RUNS = config('CHATBOT_MAX_QUEUED_AGENT_RUNS', default=64, cast=int)
+CHATBOT_RATE_LIMIT_PER_MINUTE = config('CHATBOT_RATE_LIMIT_PER_MINUTE', default=30, cast=int)
+CHATBOT_RATE_LIMIT_BURST = config('CHATBOT_RATE_LIMIT_BURST', default=5, cast=int)
+
+# coalescing of identical in-flight questions ("local", "redis" across workers, or "none")
+CHATBOT_COALESCE_BACKEND = config('CHATBOT_COALESCE_BACKEND', default="local")
+CHATBOT_COALESCE_WAIT = config('CHATBOT_COALESCE_WAIT', default=60, cast=int)
+CHATBOT_COALESCE_RESULT_TTL = config('CHATBOT_COALESCE_RESULT_TTL', default=5, cast=int)
+CHATBOT_COALESCE_POLL_INTERVAL = config('CHATBOT_COALESCE_POLL_INTERVAL', default=0.1, cast=float)
+
+# per-socket message pipelining: "parallel" answers messages side by side, "supersede"
+# cancels the previous message when a new one arrives (clients may override per message)
+CHATBOT_PIPELINE_MODE = config('CHATBOT_PIPELINE_MODE', default="parallel")
+CHATBOT_MAX_TASKS_PER_CONNECTION = config('CHATBOT_MAX_TASKS_PER_CONNECTION', default=3, cast=int)
+
+# fast-path router answering simple questions without the LLM
+CHATBOT_ROUTER_ENABLED = config('CHATBOT_ROUTER_ENABLED', default=True, cast=bool)
+CHATBOT_ROUTER_THRESHOLD = config('CHATBOT_ROUTER_THRESHOLD', default=0.9, cast=float)
+
+# shared chat room membership ("redis" or "local")
+CHATBOT_ROOM_BACKEND = config('CHATBOT_ROOM_BACKEND', default="redis")
+
+# tiered model routing: each turn starts on the tier its complexity maps to (lookup, reasoning
+# or general) and moves up CHATBOT_MODEL_TIERS (cheapest first) when a tool call cannot be parsed
+def parse_mapping(value):
+    return dict(item.strip().split('=', 1) for item in value.split(',') if item.strip())
+
+
+CHATBOT_MODEL_ROUTING_ENABLED = config('CHATBOT_MODEL_ROUTING_ENABLED', default=True, cast=bool)
+CHATBOT_MODEL_TIERS = config('CHATBOT_MODEL_TIERS', default=f"small=gpt-4.1-mini,large={CHATBOT_MODEL}", cast=parse_mapping)
+# model that folds old turns into the conversation summary; the cheapest tier by default
+CHATBOT_SUMMARY_MODEL = config('CHATBOT_SUMMARY_MODEL', default=next(iter(CHATBOT_MODEL_TIERS.values())))
+CHATBOT_MODEL_POLICY = config('CHATBOT_MODEL_POLICY', default="lookup=small,general=small,reasoning=large", cast=parse_mapping)
+CHATBOT_MODEL_ROUTING_MAX_LOOKUP_WORDS = config('CHATBOT_MODEL_ROUTING_MAX_LOOKUP_WORDS', default=30, cast=int)
+
+# USD per million (prompt, completion) tokens, for per-tier cost accounting
+CHATBOT_MODEL_PRICES = {
+    'gpt-4.1': (2.00, 8.00),
+    'gpt-4.1-mini': (0.40, 1.60),
+    'gpt-4.1-nano': (0.10, 0.40),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4o-mini': (0.15, 0.60),
+}
+
+# per-turn traces (LLM, tool, SQL and send timings) logged as one JSON line per turn;
+# set to WARNING to keep only the /metrics counters
+CHATBOT_TRACE_LOG_LEVEL = config('CHATBOT_TRACE_LOG_LEVEL', default="INFO")
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'chatbot.logs.JsonFormatter'},
+    },
+    'handlers': {
+        'json_console': {'class': 'logging.StreamHandler', 'formatter': 'json'},
+    },
+    'loggers': {
+        'chatbot.trace': {'handlers': ['json_console'], 'level': CHATBOT_TRACE_LOG_LEVEL, 'propagate': False},
+    },
 }
 
 MIDDLEWARE = [
@@ -109,6 +244,23 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'chatbot_project.wsgi.application'
 
+# list endpoints page through rows with a keyset cursor (students/pagination.py);
+# clients choose ?page_size= up to the maximum
+STUDENTS_API_PAGE_SIZE = config('STUDENTS_API_PAGE_SIZE', default=50, cast=int)
+STUDENTS_API_MAX_PAGE_SIZE = config('STUDENTS_API_MAX_PAGE_SIZE', default=500, cast=int)
+
+# full-text search over students and courses: "fts5" (SQLite FTS5 tables kept in sync by
+# signals) or "scan" (icontains); databases other than SQLite use scan
+STUDENTS_SEARCH_BACKEND = config('STUDENTS_SEARCH_BACKEND', default="fts5")
+
+# serialized student profiles are cached (in the default cache) under their ETag version,
+# so entries never go stale; the TTL only bounds memory
+STUDENTS_PROFILE_CACHE_TTL = config('STUDENTS_PROFILE_CACHE_TTL', default=600, cast=int)
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'students.pagination.KeysetPagination',
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
@@ -117,6 +269,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open across requests and chatbot tool calls; each
+        # tool pool thread holds its own connection
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
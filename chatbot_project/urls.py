@@ -19,6 +19,7 @@ from django.urls import path, include
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
+from chatbot.views import MetricsView
 
 
 schema_view = get_schema_view(
@@ -37,6 +38,8 @@ schema_view = get_schema_view(
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('students.urls')), 
+    path('api/chatbot/', include('chatbot.urls')),
+    path('metrics', MetricsView.as_view(), name='metrics'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
 
 ]
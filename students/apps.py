@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class StudentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'students'
+
+    def ready(self):
+        from . import signals
+        # Create (or refresh) the name and search indexes once the tables exist
+        post_migrate.connect(signals.build_name_index, sender=self, dispatch_uid='students_build_name_index')
+        post_migrate.connect(signals.build_search_index, sender=self, dispatch_uid='students_build_search_index')
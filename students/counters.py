@@ -0,0 +1,73 @@
+# students/counters.py
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Attendance, Course, Grade, Internship, Performance, RowCounter, Student
+
+# Dashboard name -> model
+COUNTED_MODELS = {
+    'students': Student,
+    'courses': Course,
+    'grades': Grade,
+    'attendance': Attendance,
+    'performance': Performance,
+    'internships': Internship,
+}
+
+
+def adjust(model, total=0, active=0, using=None):
+    """
+    Add to a model's counters; a missing row is created from a full count.
+
+    Called from post_save/post_delete, so the update shares the write's
+    transaction only when the caller opened one (transaction.atomic,
+    ATOMIC_REQUESTS). In autocommit the write commits first; a crash in
+    between leaves the counters one behind until reconcile_counters runs.
+    """
+    if not total and not active:
+        return
+    updated = RowCounter.objects.using(using).filter(model=model._meta.label).update(
+        total=F('total') + total, active=F('active') + active, updated_at=timezone.now(),
+    )
+    if not updated:
+        # First change since the table was created (or the counters were cleared): the count already includes it
+        reconcile_model(model, using=using)
+
+
+def count_rows(model, using=None):
+    manager = model._default_manager.using(using)
+    return manager.count(), manager.filter(is_deleted=False).count()
+
+
+def reconcile_model(model, using=None):
+    """Recount one model; returns the (total, active) drift that was corrected."""
+    with transaction.atomic(using=using):
+        total, active = count_rows(model, using)
+        counter, created = RowCounter.objects.using(using).select_for_update().get_or_create(
+            model=model._meta.label, defaults={'total': total, 'active': active},
+        )
+        if created:
+            return total, active
+        drift = (total - counter.total, active - counter.active)
+        if any(drift):
+            counter.total, counter.active, counter.updated_at = total, active, timezone.now()
+            counter.save(update_fields=['total', 'active', 'updated_at'])
+        return drift
+
+
+def reconcile(using=None):
+    """Recount every counted model (after bulk writes that bypass signals); returns {name: drift}."""
+    return {name: reconcile_model(model, using) for name, model in COUNTED_MODELS.items()}
+
+
+def read_counters(using=None):
+    """({name: counter}, last modified) in one query, recounting models that have no counter yet."""
+    labels = {model._meta.label: name for name, model in COUNTED_MODELS.items()}
+    counters = {labels[counter.model]: counter for counter in RowCounter.objects.using(using).filter(model__in=labels)}
+    missing = [name for name in COUNTED_MODELS if name not in counters]
+    if missing:
+        for name in missing:
+            reconcile_model(COUNTED_MODELS[name], using)
+        return read_counters(using)
+    return counters, max(counter.updated_at for counter in counters.values())
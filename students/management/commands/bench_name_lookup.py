@@ -0,0 +1,99 @@
+# students/management/commands/bench_name_lookup.py
+
+import contextlib
+import random
+import sqlite3
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from students.name_index import fetch_candidate_ids, rebuild_name_index, score_name
+
+FIRST_NAMES = ['Aarav', 'Vivaan', 'Aditya', 'Rahul', 'Priya', 'Ananya', 'Diya', 'Ishaan', 'Kavya', 'Rohan', 'Sneha', 'Arjun',
+               'Meera', 'Karan', 'Pooja', 'Nikhil', 'Riya', 'Siddharth', 'Tanvi', 'Varun', 'Neha', 'Aman', 'Shreya', 'Yash']
+LAST_NAMES = ['Sharma', 'Verma', 'Patel', 'Iyer', 'Reddy', 'Nair', 'Gupta', 'Mehta', 'Joshi', 'Kulkarni', 'Chopra', 'Bose',
+              'Das', 'Menon', 'Rao', 'Pillai', 'Agarwal', 'Bhat', 'Saxena', 'Kapoor', 'Malhotra', 'Desai', 'Shetty', 'Sinha']
+SYLLABLES = ['ka', 'ri', 'mo', 'na', 'ven', 'dra', 'shi', 'lo', 'pa', 'tu', 'gan', 'esh', 'vi', 'ra', 'jit', 'deep']
+
+
+def synthetic_name(rng):
+    # A random suffix keeps the surnames varied enough to be realistic at 1M rows
+    suffix = ''.join(rng.choice(SYLLABLES) for _ in range(2)).capitalize()
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {suffix}"
+
+
+class QmarkCursor:
+    """A sqlite3 cursor taking Django's %s placeholders, so name_index runs on it unchanged."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, sql, params=()):
+        return self.cursor.execute(sql.replace('%s', '?'), params)
+
+    def executemany(self, sql, params):
+        return self.cursor.executemany(sql.replace('%s', '?'), params)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+class QmarkConnection:
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    @contextlib.contextmanager
+    def cursor(self):
+        cursor = self.conn.cursor()
+        try:
+            yield QmarkCursor(cursor)
+        finally:
+            cursor.close()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark student name lookups on a synthetic table of N names'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, nargs='+', default=[100000, 1000000], help='Index sizes to test')
+        parser.add_argument('--queries', type=int, default=500, help='Lookups per index size')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    def handle(self, *args, **options):
+        for size in options['students']:
+            rng = random.Random(options['seed'])
+            conn = sqlite3.connect(':memory:')
+            conn.execute("CREATE TABLE students_student (id INTEGER PRIMARY KEY, name TEXT, is_deleted INTEGER DEFAULT 0)")
+            names = [synthetic_name(rng) for _ in range(size)]
+            conn.executemany("INSERT INTO students_student (id, name) VALUES (?, ?)", enumerate(names, start=1))
+            started = time.perf_counter()
+            rebuild_name_index(QmarkConnection(conn))
+            conn.commit()
+            self.stdout.write(f'{size} names indexed in {time.perf_counter() - started:.1f}s')
+
+            samples = [rng.choice(names) for _ in range(options['queries'])]
+            for label, make_query in (
+                ('full name', lambda name: name),
+                ('misspelt', lambda name: name[:3] + name[4:]),
+                ('two typos', lambda name: name[:3] + name[4:-2] + name[-1]),
+                ('first name', lambda name: name.split()[0]),
+            ):
+                timings, found = [], 0
+                for name in samples:
+                    query = make_query(name)
+                    started = time.perf_counter()
+                    results = self.lookup(conn, query)
+                    timings.append(time.perf_counter() - started)
+                    found += any(result_name == name for _, result_name in results)
+                timings.sort()
+                self.stdout.write(self.style.SUCCESS(
+                    f'  {label:>10}: p50={statistics.median(timings) * 1000:.3f}ms '
+                    f'p95={timings[int(len(timings) * 0.95)] * 1000:.3f}ms found={found / len(samples):.0%}'
+                ))
+            conn.close()
+
+    def lookup(self, conn, query, limit=50):
+        # name_index.fetch_candidate_ids, then the rows and their scores as search_student_names gets them
+        ids = fetch_candidate_ids(query, limit, QmarkConnection(conn))
+        rows = conn.execute(f"SELECT name FROM students_student WHERE id IN ({', '.join('?' * len(ids))})", ids).fetchall()
+        return sorted(((score_name(query, name), name) for (name,) in rows), reverse=True)[:5]
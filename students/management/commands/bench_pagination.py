@@ -0,0 +1,81 @@
+# students/management/commands/bench_pagination.py
+
+import datetime
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from students.models import Attendance, Course, Student
+from students.pagination import KeysetPagination
+from students.views import AttendanceListCreateView
+
+
+class Command(BaseCommand):
+    help = 'Benchmark attendance page fetches by depth, keyset cursor vs. limit/offset, on a throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000, help='Attendance rows to create')
+        parser.add_argument('--page-size', type=int, default=50, help='Rows per page')
+        parser.add_argument('--samples', type=int, default=10, help='Depths to report, evenly spread over the table')
+
+    def handle(self, *args, **options):
+        # A fresh test database, so the benchmark never writes to the real one
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.populate(options['rows'])
+            self.run(options['rows'], options['page_size'], options['samples'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def populate(self, rows):
+        started = time.perf_counter()
+        courses = Course.objects.bulk_create(Course(name=f'Course {index}', course_code=f'C{index}') for index in range(20))
+        students = Student.objects.bulk_create(Student(student_id=f'B{index:05d}', name=f'Student {index}') for index in range(1000))
+        today = datetime.date.today()
+        Attendance.objects.bulk_create(
+            (
+                Attendance(student=students[index % len(students)], course=courses[index % len(courses)], total_classes=40,
+                           attended_classes=index % 41, date=today - datetime.timedelta(days=index % 365), status='Present')
+                for index in range(rows)
+            ),
+            batch_size=5000,
+        )
+        self.stdout.write(f'{rows} attendance rows created in {time.perf_counter() - started:.1f}s')
+
+    def fetch(self, paginator, url):
+        """Seconds to fetch one page the way the list view does, and the paginator for its links."""
+        request = Request(APIRequestFactory().get(url))
+        started = time.perf_counter()
+        paginator.paginate_queryset(Attendance.objects.all(), request, AttendanceListCreateView())
+        return time.perf_counter() - started
+
+    def run(self, rows, page_size, samples):
+        pages = -(-rows // page_size)
+        report_every = max(1, pages // samples)
+
+        # Walk every page through the next links; the cursor is only reachable that way
+        url, page, cursor_timings = f'/api/attendance/?page_size={page_size}', 0, {}
+        while url:
+            paginator = KeysetPagination()
+            elapsed = self.fetch(paginator, url)
+            if page % report_every == 0:
+                cursor_timings[page] = elapsed
+            url, page = paginator.get_next_link(), page + 1
+
+        self.stdout.write(f'{"page":>7} {"depth":>8} {"cursor":>10} {"offset":>10}')
+        cursor_all, offset_all = [], []
+        for page, cursor_seconds in cursor_timings.items():
+            offset = page * page_size
+            offset_seconds = statistics.median(
+                self.fetch(LimitOffsetPagination(), f'/api/attendance/?limit={page_size}&offset={offset}') for _ in range(3)
+            )
+            cursor_all.append(cursor_seconds)
+            offset_all.append(offset_seconds)
+            self.stdout.write(f'{page:>7} {offset:>8} {cursor_seconds * 1000:>8.2f}ms {offset_seconds * 1000:>8.2f}ms')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'deepest/first page: cursor {cursor_all[-1] / cursor_all[0]:.1f}x, offset {offset_all[-1] / offset_all[0]:.1f}x'
+        ))
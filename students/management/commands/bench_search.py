@@ -0,0 +1,72 @@
+# students/management/commands/bench_search.py
+
+import random
+import sqlite3
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from students.search import INDEXES, create_table_sql, match_expression, search_sql
+from .bench_name_lookup import synthetic_name
+
+DEPARTMENTS = ['Physics', 'Chemistry', 'Mathematics', 'Computer Science', 'Biology', 'Economics', 'History', 'Mechanical']
+STREETS = ['MG Road', 'Park Street', 'Brigade Road', 'Linking Road', 'Anna Salai', 'Residency Road', 'Church Street']
+
+
+def synthetic_student(rng, index):
+    name = synthetic_name(rng)
+    return (
+        index, name, f"{name.split()[0].lower()}.{index}@example.edu", f"{rng.randint(1, 999)} {rng.choice(STREETS)}",
+        f"9{rng.randint(100000000, 999999999)}", rng.choice(DEPARTMENTS),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Benchmark student search on a synthetic table: FTS5 index vs. the five-way icontains (LIKE) scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, nargs='+', default=[100000, 1000000], help='Table sizes to test')
+        parser.add_argument('--queries', type=int, default=200, help='Index searches per table size')
+        parser.add_argument('--scan-queries', type=int, default=20, help='LIKE scans per table size (they are slow)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    def handle(self, *args, **options):
+        index = INDEXES['student']
+        # Django's %s placeholders, for a raw sqlite3 connection
+        ranked_sql = search_sql(index).replace('%s', '?')
+        like_sql = (
+            "SELECT id FROM students WHERE " + " OR ".join(f"{field} LIKE ?" for field in index.fields) + " LIMIT ?"
+        )
+        for size in options['students']:
+            rng = random.Random(options['seed'])
+            conn = sqlite3.connect(':memory:')
+            conn.execute(f"CREATE TABLE students (id INTEGER PRIMARY KEY, {', '.join(index.fields)})")
+            conn.execute(create_table_sql(index))
+            rows = [synthetic_student(rng, row) for row in range(1, size + 1)]
+            started = time.perf_counter()
+            conn.executemany(f"INSERT INTO students VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.execute(f"INSERT INTO {index.table} (rowid, {', '.join(index.fields)}) SELECT * FROM students")
+            conn.commit()
+            self.stdout.write(f'{size} students indexed in {time.perf_counter() - started:.1f}s')
+
+            samples = [rng.choice(rows) for _ in range(options['queries'])]
+            for label, make_query in (
+                ('full name', lambda row: row[1]),
+                ('prefix', lambda row: row[1].split()[1][:3]),
+                ('phone', lambda row: row[4]),
+            ):
+                queries = [make_query(row) for row in samples]
+                self.report(f'fts5 {label}', queries, lambda query: conn.execute(ranked_sql, [match_expression(query), 20]).fetchall())
+                self.report(f'scan {label}', queries[:options['scan_queries']],
+                            lambda query: conn.execute(like_sql, [f'%{query}%'] * len(index.fields) + [20]).fetchall())
+            conn.close()
+
+    def report(self, label, queries, run):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            run(query)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        self.stdout.write(self.style.SUCCESS(
+            f'  {label:>15}: p50={statistics.median(timings) * 1000:.3f}ms p95={timings[int(len(timings) * 0.95)] * 1000:.3f}ms'
+        ))
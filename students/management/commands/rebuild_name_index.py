@@ -0,0 +1,15 @@
+# students/management/commands/rebuild_name_index.py
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from students.name_index import name_index_available, rebuild_name_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the student name index (needed after bulk imports that bypass model signals)'
+
+    def handle(self, *args, **options):
+        if not name_index_available():
+            raise CommandError(f'The student name index needs SQLite FTS5; {connection.vendor} falls back to icontains.')
+        rebuild_name_index()
+        self.stdout.write(self.style.SUCCESS('Student name index rebuilt'))
@@ -0,0 +1,15 @@
+# students/management/commands/rebuild_search_index.py
+
+from django.core.management.base import BaseCommand, CommandError
+from students.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the student and course search indexes (needed after bulk imports that bypass model signals)'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend.name == 'scan':
+            raise CommandError('The scan search backend has no index to rebuild.')
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Search indexes rebuilt ({backend.name})'))
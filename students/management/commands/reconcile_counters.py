@@ -0,0 +1,22 @@
+# students/management/commands/reconcile_counters.py
+
+import time
+from django.core.management.base import BaseCommand
+from students.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recount the rows behind the dashboard counters and correct any drift (e.g. after bulk writes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, default=0, help='Keep running, reconciling every N seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            for name, (total, active) in reconcile().items():
+                if total or active:
+                    self.stdout.write(self.style.WARNING(f'{name}: corrected total by {total:+d}, active by {active:+d}'))
+            self.stdout.write(self.style.SUCCESS('Counters reconciled'))
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -170,3 +170,14 @@ class Internship(TimestampMixin, SoftDeleteMixin, models.Model):
     
     def __str__(self):
         return f"{self.student.name} - {self.company_name} - {self.role}"
+
+
+# Row counts per model, kept current by signals (students/counters.py) so the dashboard never scans a table
+class RowCounter(models.Model):
+    model = models.CharField(max_length=100, unique=True)  # app_label.ModelName
+    total = models.BigIntegerField(default=0)              # every row, soft-deleted ones included
+    active = models.BigIntegerField(default=0)             # rows with is_deleted = False
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.model}: {self.active}/{self.total}"
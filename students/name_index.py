@@ -0,0 +1,260 @@
+# students/name_index.py
+
+import difflib
+import itertools
+import re
+from django.db import DatabaseError, connection
+
+NAME_INDEX_TABLE = 'students_student_name_fts'
+# Every distinct word of a student name, with a trigram index of its own for spelling corrections
+NAME_WORD_TABLE = 'students_student_name_word'
+NAME_WORD_INDEX_TABLE = 'students_student_name_word_fts'
+NAME_LOWER_INDEX = 'students_student_name_lower'
+TOKEN_RE = re.compile(r"\w+")
+
+# How far ahead of the runner-up a candidate must score to be picked without asking
+UNAMBIGUOUS_MARGIN = 0.1
+MIN_SCORE = 0.6
+
+# Known words tried in place of each query word, and the full names looked up from them
+WORD_CANDIDATES = 20
+MAX_CORRECTIONS = 3
+MIN_WORD_SIMILARITY = 0.7
+MAX_CORRECTED_NAMES = 27
+
+
+def name_index_available(conn=None):
+    """The trigram index needs SQLite's FTS5; other databases fall back to icontains."""
+    return (conn or connection).vendor == 'sqlite'
+
+
+def ensure_name_index(conn=None):
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {NAME_INDEX_TABLE} USING fts5(name, tokenize='trigram')"
+        )
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {NAME_WORD_TABLE} (id INTEGER PRIMARY KEY, word TEXT NOT NULL UNIQUE)")
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {NAME_WORD_INDEX_TABLE} "
+            f"USING fts5(word, content='{NAME_WORD_TABLE}', content_rowid='id', tokenize='trigram')"
+        )
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {NAME_LOWER_INDEX} ON students_student (lower(name))")
+
+
+def rebuild_name_index(conn=None):
+    conn = conn or connection
+    ensure_name_index(conn)
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {NAME_INDEX_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {NAME_INDEX_TABLE} (rowid, name) "
+            f"SELECT id, name FROM students_student WHERE is_deleted = 0"
+        )
+
+        cursor.execute("SELECT name FROM students_student WHERE is_deleted = 0")
+        words = set()
+        for rows in iter(lambda: cursor.fetchmany(10000), []):
+            for (name,) in rows:
+                words.update(query_tokens(name))
+        cursor.execute(f"DELETE FROM {NAME_WORD_TABLE}")
+        cursor.executemany(f"INSERT INTO {NAME_WORD_TABLE} (word) VALUES (%s)", [(word,) for word in sorted(words)])
+        cursor.execute(f"INSERT INTO {NAME_WORD_INDEX_TABLE} ({NAME_WORD_INDEX_TABLE}) VALUES ('rebuild')")
+
+
+def index_student(student, conn=None):
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {NAME_INDEX_TABLE} WHERE rowid = %s", [student.pk])
+        if not student.is_deleted:
+            cursor.execute(f"INSERT INTO {NAME_INDEX_TABLE} (rowid, name) VALUES (%s, %s)", [student.pk, student.name])
+            # Words of renamed or deleted students stay until the next rebuild; they only cost a wasted lookup
+            for word in set(query_tokens(student.name)):
+                cursor.execute(f"INSERT OR IGNORE INTO {NAME_WORD_TABLE} (word) VALUES (%s)", [word])
+                if cursor.rowcount:
+                    cursor.execute(f"INSERT INTO {NAME_WORD_INDEX_TABLE} (rowid, word) VALUES (%s, %s)", [cursor.lastrowid, word])
+
+
+def unindex_student(student_pk, conn=None):
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {NAME_INDEX_TABLE} WHERE rowid = %s", [student_pk])
+
+
+def query_tokens(query):
+    return [token.lower() for token in TOKEN_RE.findall(query)]
+
+
+def score_name(query, name):
+    """
+    Similarity between 0 and 1: each query word is matched against its best word
+    in the name, so "rahul" scores 1.0 against "Rahul Sharma" and a typo such as
+    "rahl" still scores high. The whole-string ratio only breaks ties.
+    """
+    tokens, name_tokens = query_tokens(query), query_tokens(name)
+    if not tokens or not name_tokens:
+        return 0.0
+    if tokens == name_tokens:
+        return 1.0
+    per_token = [
+        1.0 if token in name_tokens else
+        max(difflib.SequenceMatcher(None, token, name_token).ratio() for name_token in name_tokens)
+        for token in tokens
+    ]
+    whole = difflib.SequenceMatcher(None, " ".join(tokens), " ".join(name_tokens)).ratio()
+    return round(0.9 * sum(per_token) / len(per_token) + 0.1 * whole, 4)
+
+
+def token_trigrams(token):
+    return sorted({token[i:i + 3] for i in range(len(token) - 2)})
+
+
+def closest_words(token, words):
+    """Up to MAX_CORRECTIONS of words that could be token misspelt, closest first."""
+    return difflib.get_close_matches(token, words, n=MAX_CORRECTIONS, cutoff=MIN_WORD_SIMILARITY)
+
+
+def corrected_names(corrections):
+    """Full names (lowercase) built from the corrections of each query word, in query order."""
+    return [" ".join(words) for words in itertools.islice(itertools.product(*corrections), MAX_CORRECTED_NAMES)]
+
+
+def candidate_match_queries(query):
+    """
+    FTS5 MATCH expressions to try in order, most selective first, each with
+    whether to rank its hits: every word as a substring, then every word but
+    one plus any trigram of the missing word (a typo in one word of a full
+    name), then any shared trigram at all. That last one can match most of the
+    table, so its hits are not ranked; the first ones found are rescored.
+    """
+    tokens = [token for token in query_tokens(query) if len(token) >= 3]
+    if not tokens:
+        return []
+
+    def trigrams(token):
+        return " OR ".join(f'"{trigram}"' for trigram in token_trigrams(token))
+
+    queries = [(" AND ".join(f'"{token}"' for token in tokens), True)]
+    if len(tokens) > 1:
+        queries.append((" OR ".join(
+            "(" + " AND ".join([f'"{other}"' for other in tokens if other is not token] + [f"({trigrams(token)})"]) + ")"
+            for token in tokens
+        ), True))
+    queries.append((" OR ".join(trigrams(token) for token in tokens), False))
+    return queries
+
+
+def fetch_exact_ids(names, limit, cursor):
+    """Ids of the students whose whole name is one of names (lowercase), through the lower(name) index."""
+    cursor.execute(
+        f"SELECT id FROM students_student WHERE lower(name) IN ({', '.join(['%s'] * len(names))}) AND is_deleted = 0 LIMIT %s",
+        [*names, limit],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def fetch_corrections(token, cursor):
+    """Known name words that token could be a misspelling of; a word too short for trigrams is kept as is."""
+    trigrams = token_trigrams(token)
+    if not trigrams:
+        return [token]
+    cursor.execute(f"SELECT 1 FROM {NAME_WORD_TABLE} WHERE word = %s", [token])
+    if cursor.fetchone():
+        return [token]
+    cursor.execute(
+        f"SELECT word FROM {NAME_WORD_INDEX_TABLE} WHERE {NAME_WORD_INDEX_TABLE} MATCH %s ORDER BY rank LIMIT %s",
+        [" OR ".join(f'"{trigram}"' for trigram in trigrams), WORD_CANDIDATES],
+    )
+    return closest_words(token, [row[0] for row in cursor.fetchall()])
+
+
+def fetch_candidate_ids(query, limit, conn=None):
+    """
+    Row ids of the students query most likely names, cheapest lookup first:
+    the exact name, then names spelt from the closest known word for each
+    query word, then the trigram index of whole names. The first two go
+    through the lower(name) index and stay under a millisecond at 1M students;
+    partial names and reordered or badly misspelt words need the trigram index.
+    """
+    tokens = query_tokens(query)
+    if not tokens:
+        return []
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        ids = fetch_exact_ids([" ".join(tokens)], limit, cursor)
+        if ids:
+            return ids
+
+        corrections = [fetch_corrections(token, cursor) for token in tokens]
+        if all(corrections):
+            ids = fetch_exact_ids(corrected_names(corrections), limit, cursor)
+            if ids:
+                return ids
+
+        for match, ranked in candidate_match_queries(query):
+            cursor.execute(
+                f"SELECT rowid FROM {NAME_INDEX_TABLE} WHERE {NAME_INDEX_TABLE} MATCH %s "
+                f"{'ORDER BY rank ' if ranked else ''}LIMIT %s",
+                [match, limit],
+            )
+            rows = cursor.fetchall()
+            if rows:
+                return [row[0] for row in rows]
+    return []
+
+
+def search_student_names(query, limit=5, candidates=50):
+    """
+    Ranked students whose name matches query, best first.
+
+    Each result is a dict with the identifying fields and a score in [0, 1].
+    """
+    from .models import Student
+
+    fields = ('id', 'student_id', 'name', 'department', 'enrollment_year')
+    rows = None
+    if name_index_available():
+        try:
+            ids = fetch_candidate_ids(query, candidates)
+        except DatabaseError as e:
+            # Index table missing, e.g. before the first migrate; fall back to a scan
+            print(f"Error searching student name index: {e}")
+        else:
+            rows = Student.objects.filter(id__in=ids, is_deleted=False).values(*fields)
+    if rows is None:
+        rows = Student.objects.filter(name__icontains=query, is_deleted=False).values(*fields)[:candidates]
+
+    results = [dict(row, score=score_name(query, row['name'])) for row in rows]
+    results.sort(key=lambda row: (-row['score'], row['name']))
+    return [row for row in results if row['score'] >= MIN_SCORE][:limit]
+
+
+def resolve_student(identifier):
+    """
+    Resolve a student id or (possibly misspelt) name.
+
+    Returns (student, candidates): the Student when one match is clearly best,
+    otherwise None and the ranked candidates to disambiguate between.
+    """
+    from .models import Student
+
+    identifier = (identifier or '').strip()
+    student = Student.objects.filter(student_id=identifier, is_deleted=False).first()
+    if student:
+        return student, []
+
+    candidates = search_student_names(identifier)
+    if not candidates:
+        return None, []
+
+    exact = [candidate for candidate in candidates if candidate['name'].lower() == identifier.lower()]
+    if len(exact) == 1:
+        return Student.objects.get(id=exact[0]['id']), candidates
+    if len(exact) > 1:
+        # Namesakes: only the caller can tell them apart
+        return None, exact
+
+    runner_up = candidates[1]['score'] if len(candidates) > 1 else 0.0
+    if candidates[0]['score'] - runner_up >= UNAMBIGUOUS_MARGIN:
+        return Student.objects.get(id=candidates[0]['id']), candidates
+    return None, candidates
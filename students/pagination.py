@@ -0,0 +1,29 @@
+# students/pagination.py
+
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination for the list endpoints.
+
+    Pages are fetched with WHERE id < <last id seen> ORDER BY id DESC LIMIT n on
+    the primary key index, so page 4000 costs the same as page 1, and rows
+    inserted while a client pages through land before its first page instead of
+    shifting later pages. Clients pick a size with ?page_size= up to
+    STUDENTS_API_MAX_PAGE_SIZE and follow the next/previous links.
+
+    A view can page on another indexed, unique ordering by setting cursor_ordering.
+    """
+
+    ordering = ('-id',)
+    page_size_query_param = 'page_size'
+
+    def __init__(self):
+        # Read per request so the sizes follow settings overrides
+        self.page_size = settings.STUDENTS_API_PAGE_SIZE
+        self.max_page_size = settings.STUDENTS_API_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'cursor_ordering', self.ordering)
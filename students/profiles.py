@@ -0,0 +1,77 @@
+# students/profiles.py
+
+import hashlib
+from django.core.cache import cache
+from django.conf import settings
+from django.db.models import F, Func, OuterRef, Prefetch, Q, Subquery, prefetch_related_objects
+from .models import Attendance, Course, Grade, Internship, Performance, Student
+from .query_plan import plan_queryset
+from .serializers import AttendanceSerializer, GradeSerializer, InternshipSerializer, PerformanceSerializer, StudentSerializer
+
+# Profile section -> (related name on Student, model, serializer)
+PROFILE_RELATIONS = {
+    'grades': ('student_grades', Grade, GradeSerializer),
+    'attendance': ('student_attendance', Attendance, AttendanceSerializer),
+    'performance': ('student_performance', Performance, PerformanceSerializer),
+    'internships': ('student_internships', Internship, InternshipSerializer),
+}
+
+
+def column_subquery(queryset, function, field):
+    # MAX()/COUNT() as a plain function, so the subquery needs no GROUP BY
+    return Subquery(queryset.order_by().values(value=Func(F(field), function=function))[:1])
+
+
+def version_annotations():
+    """
+    Annotations that make a Student row carry its profile's version inputs.
+
+    The newest updated_at and the row count of each related table (counts catch
+    hard deletes, which leave no updated_at behind), and the newest updated_at
+    of the courses those rows point at, since course names are part of the profile.
+    """
+    annotations = {}
+    course_filter = Q()
+    for section, (_, model, _) in PROFILE_RELATIONS.items():
+        rows = model.objects.filter(student=OuterRef('pk'))
+        annotations[f'{section}_updated'] = column_subquery(rows, 'MAX', 'updated_at')
+        annotations[f'{section}_rows'] = column_subquery(rows, 'COUNT', 'id')
+        if any(field.name == 'course' for field in model._meta.fields):
+            course_filter |= Q(id__in=model.objects.filter(student=OuterRef(OuterRef('pk'))).values('course'))
+    annotations['courses_updated'] = column_subquery(Course.objects.filter(course_filter), 'MAX', 'updated_at')
+    return annotations
+
+
+def load_versioned_student(student_id):
+    """The student with its profile version inputs, in one query; None if there is no such student."""
+    return Student.objects.annotate(**version_annotations()).filter(id=student_id).first()
+
+
+def profile_version(student):
+    parts = [student.pk, student.updated_at]
+    for section in PROFILE_RELATIONS:
+        parts += [getattr(student, f'{section}_updated'), getattr(student, f'{section}_rows')]
+    parts.append(student.courses_updated)
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def serialize_profile(student):
+    """Every section of the profile, fetched with one prefetch per related table (courses joined in)."""
+    prefetch_related_objects([student], *(
+        Prefetch(related_name, queryset=plan_queryset(model.objects.all(), serializer))
+        for related_name, model, serializer in PROFILE_RELATIONS.values()
+    ))
+    data = {"student": StudentSerializer(student).data}
+    for section, (related_name, _, serializer) in PROFILE_RELATIONS.items():
+        data[section] = serializer(getattr(student, related_name).all(), many=True).data
+    return data
+
+
+def get_profile(student, version):
+    """The serialized profile, from the cache when this version has been built before."""
+    key = f'students:profile:{student.pk}:{version}'
+    data = cache.get(key)
+    if data is None:
+        data = serialize_profile(student)
+        cache.set(key, data, settings.STUDENTS_PROFILE_CACHE_TTL)
+    return data
@@ -0,0 +1,86 @@
+# students/query_plan.py
+
+from functools import lru_cache
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import permissions, serializers
+
+
+@lru_cache(maxsize=None)
+def serializer_query_plan(serializer_class):
+    """
+    (select_related, only) for the rows serializer_class reads.
+
+    Relations are the dotted sources the serializer traverses, such as
+    student_name = CharField(source='student.name'), plus any listed in its
+    Meta.select_related. The projection is every column a field reads; it is
+    None (load all columns) if a field's source cannot be resolved statically,
+    e.g. a SerializerMethodField or source='*'.
+    """
+    meta = getattr(serializer_class, 'Meta', None)
+    model = meta.model
+    related = set(getattr(meta, 'select_related', ()))
+    columns = {model._meta.pk.name}
+    project = True
+
+    for field in serializer_class().fields.values():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+            project = False
+            continue
+        path = field.source.split('.')
+        model_field = resolve_path(model, path)
+        if model_field is None:
+            # A property or method on the model; it may read any column
+            project = False
+            continue
+        if len(path) > 1:
+            related.add('__'.join(path[:-1]))
+        columns.add('__'.join(path))
+
+    for relation in related:
+        # The foreign key itself has to be loaded to follow it with select_related
+        columns.add(relation)
+    return tuple(sorted(related)), tuple(sorted(columns)) if project else None
+
+
+def resolve_path(model, path):
+    """The model field at the end of a dotted source path, or None if it is not a chain of fields."""
+    field = None
+    for name in path:
+        if model is None:
+            return None
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if field.many_to_many or field.one_to_many:
+            # Reverse and many-to-many relations need prefetch_related, not a join
+            return None
+        model = field.related_model
+    return field
+
+
+def plan_queryset(queryset, serializer_class):
+    related, columns = serializer_query_plan(serializer_class)
+    if related:
+        queryset = queryset.select_related(*related)
+    if columns is not None:
+        queryset = queryset.only(*columns)
+    return queryset
+
+
+class QueryPlanMixin:
+    """
+    Generic view mixin: load only what the serializer reads, joining the relations it follows.
+
+    Only reads are planned. Writes get full rows: save() on an instance with
+    deferred fields fetches each of them again one query at a time, and
+    signal handlers and model methods may read any column.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method not in permissions.SAFE_METHODS:
+            return queryset
+        return plan_queryset(queryset, self.get_serializer_class())
@@ -0,0 +1,252 @@
+# students/search.py
+
+import re
+from dataclasses import dataclass
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+TOKEN_RE = re.compile(r"\w+")
+MARK_START, MARK_END = '<mark>', '</mark>'
+# FTS5 snippet delimiters: control characters that escape() leaves alone and field text does not contain
+SNIPPET_START, SNIPPET_END = '\x02', '\x03'
+
+
+@dataclass(frozen=True)
+class SearchIndex:
+    kind: str
+    model_label: str
+    table: str
+    # Indexed text fields and their bm25 weights: a hit in a name outranks one in an address
+    fields: tuple
+    weights: tuple
+    # Fields returned with each hit
+    result_fields: tuple
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+
+INDEXES = {
+    'student': SearchIndex(
+        'student', 'students.Student', 'students_student_search',
+        ('name', 'email', 'address', 'phone_number', 'department'), (10.0, 4.0, 1.0, 4.0, 2.0),
+        ('id', 'student_id', 'name', 'department', 'enrollment_year'),
+    ),
+    'course': SearchIndex(
+        'course', 'students.Course', 'students_course_search',
+        ('name', 'course_code', 'description', 'department', 'instructor_name'), (10.0, 8.0, 1.0, 2.0, 3.0),
+        ('id', 'course_code', 'name', 'department', 'level'),
+    ),
+}
+
+
+def index_for_model(model):
+    for index in INDEXES.values():
+        if index.model_label == model._meta.label:
+            return index
+    return None
+
+
+def query_tokens(query):
+    return [token.lower() for token in TOKEN_RE.findall(query or '')]
+
+
+def match_expression(query):
+    """FTS5 MATCH for query: every word, each as a prefix ("ash verm" finds Asha Verma)."""
+    return " ".join(f'"{token}"*' for token in query_tokens(query))
+
+
+def highlight_text(text, tokens):
+    """
+    text HTML-escaped, with the words that start with one of tokens wrapped in
+    <mark> tags (for the scan backend); None if nothing matched.
+    """
+    if not text or not tokens:
+        return None
+    pattern = re.compile(r"\b(" + "|".join(re.escape(token) for token in tokens) + r")\w*", re.IGNORECASE)
+    parts, end = [], 0
+    for match in pattern.finditer(text):
+        parts += [escape(text[end:match.start()]), MARK_START, escape(match.group(0)), MARK_END]
+        end = match.end()
+    if not end:
+        return None
+    parts.append(escape(text[end:]))
+    return ''.join(parts)
+
+
+def mark_snippet(snippet):
+    """An FTS5 snippet with its hit delimiters (SNIPPET_START/END) as <mark> tags and everything else escaped."""
+    return escape(snippet).replace(SNIPPET_START, MARK_START).replace(SNIPPET_END, MARK_END)
+
+
+def create_table_sql(index):
+    # Prefix indexes on 2 and 3 characters keep "as"* and "ash"* from scanning every term
+    return (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {index.table} "
+        f"USING fts5({', '.join(index.fields)}, tokenize='unicode61', prefix='2 3')"
+    )
+
+
+def search_sql(index):
+    """Ranked hits with a snippet per field; takes the MATCH expression and a limit."""
+    weights = ', '.join(str(weight) for weight in index.weights)
+    snippets = ', '.join(
+        f"snippet({index.table}, {column}, char(2), char(3), '…', 12)" for column in range(len(index.fields))
+    )
+    return (
+        f"SELECT rowid, bm25({index.table}, {weights}) AS score, {snippets} FROM {index.table} "
+        f"WHERE {index.table} MATCH %s ORDER BY score LIMIT %s"
+    )
+
+
+class SQLiteSearchBackend:
+    """
+    FTS5 tables with prefix indexes, one per SearchIndex, keyed by the row's pk.
+
+    Rows are ranked by bm25 with the per-field weights and come back with an
+    HTML-escaped snippet of every field that matched, hits in <mark> tags.
+    """
+
+    name = 'fts5'
+
+    def __init__(self, conn=None):
+        self.conn = conn or connection
+
+    def ensure(self):
+        with self.conn.cursor() as cursor:
+            for index in INDEXES.values():
+                cursor.execute(create_table_sql(index))
+
+    def rebuild(self):
+        self.ensure()
+        with self.conn.cursor() as cursor:
+            for index in INDEXES.values():
+                meta = index.model._meta
+                columns = ', '.join(meta.get_field(field).column for field in index.fields)
+                cursor.execute(f"DELETE FROM {index.table}")
+                cursor.execute(
+                    f"INSERT INTO {index.table} (rowid, {', '.join(index.fields)}) "
+                    f"SELECT id, {columns} FROM {meta.db_table} WHERE is_deleted = 0"
+                )
+
+    def index(self, index, instance):
+        with self.conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {index.table} WHERE rowid = %s", [instance.pk])
+            if not instance.is_deleted:
+                cursor.execute(
+                    f"INSERT INTO {index.table} (rowid, {', '.join(index.fields)}) VALUES (%s{', %s' * len(index.fields)})",
+                    [instance.pk] + [getattr(instance, field) for field in index.fields],
+                )
+
+    def unindex(self, index, pk):
+        with self.conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {index.table} WHERE rowid = %s", [pk])
+
+    def filter(self, queryset, index, query):
+        # A subquery on the index instead of five leading-wildcard LIKE scans
+        return queryset.filter(id__in=RawSQL(
+            f"SELECT rowid FROM {index.table} WHERE {index.table} MATCH %s", [match_expression(query)]
+        ))
+
+    def search(self, index, query, limit):
+        """[(pk, score, {field: snippet})], best first; lower bm25 scores are better."""
+        with self.conn.cursor() as cursor:
+            cursor.execute(search_sql(index), [match_expression(query), limit])
+            rows = cursor.fetchall()
+        return [
+            (row[0], row[1], {field: mark_snippet(text) for field, text in zip(index.fields, row[2:]) if text and SNIPPET_START in text})
+            for row in rows
+        ]
+
+
+class ScanSearchBackend:
+    """
+    icontains over the indexed fields, for databases without an index backend.
+
+    A PostgreSQL backend would keep a tsvector column per SearchIndex and
+    implement the same ensure/rebuild/index/unindex/filter/search methods.
+    """
+
+    name = 'scan'
+
+    def __init__(self, conn=None):
+        self.conn = conn or connection
+
+    def ensure(self):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def index(self, index, instance):
+        pass
+
+    def unindex(self, index, pk):
+        pass
+
+    def filter(self, queryset, index, query):
+        condition = Q()
+        for token in query_tokens(query):
+            condition &= Q(*(Q(**{f'{field}__icontains': token}) for field in index.fields), _connector=Q.OR)
+        return queryset.filter(condition)
+
+    def search(self, index, query, limit):
+        tokens = query_tokens(query)
+        rows = self.filter(index.model.objects.filter(is_deleted=False), index, query).values('id', *index.fields)[:limit]
+        results = []
+        for row in rows:
+            highlights = {field: highlight_text(row[field], tokens) for field in index.fields}
+            highlights = {field: text for field, text in highlights.items() if text}
+            score = -sum(weight for field, weight in zip(index.fields, index.weights) if field in highlights)
+            results.append((row['id'], score, highlights))
+        results.sort(key=lambda result: result[1])
+        return results
+
+
+def get_search_backend(conn=None):
+    """The backend for STUDENTS_SEARCH_BACKEND: "fts5" (SQLite only, else scan) or "scan"."""
+    conn = conn or connection
+    if settings.STUDENTS_SEARCH_BACKEND == 'fts5' and conn.vendor == 'sqlite':
+        return SQLiteSearchBackend(conn)
+    return ScanSearchBackend(conn)
+
+
+def filter_queryset(queryset, query):
+    """queryset narrowed to rows matching every word of query (as prefixes)."""
+    if not query_tokens(query):
+        return queryset
+    return get_search_backend().filter(queryset, index_for_model(queryset.model), query)
+
+
+def search(query, kinds=None, limit=20):
+    """
+    Ranked students and courses matching query, best first.
+
+    Each result has the type, the index's result fields, a score (higher is
+    better) and highlights: the matching fields with the hits in <mark> tags.
+    """
+    if not query_tokens(query):
+        return []
+    backend = get_search_backend()
+    results = []
+    for kind in kinds or INDEXES:
+        index = INDEXES[kind]
+        try:
+            hits = backend.search(index, query, limit)
+        except DatabaseError as e:
+            # Index table missing, e.g. before the first migrate; fall back to a scan
+            print(f"Error querying the search index: {e}")
+            hits = ScanSearchBackend().search(index, query, limit)
+        rows = {row['id']: row for row in index.model.objects.filter(id__in=[hit[0] for hit in hits], is_deleted=False)
+                .values(*index.result_fields)}
+        results += [
+            {'type': kind, **rows[pk], 'score': round(-score, 4), 'highlights': highlights}
+            for pk, score, highlights in hits if pk in rows
+        ]
+    results.sort(key=lambda result: -result['score'])
+    return results[:limit]
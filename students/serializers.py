@@ -19,6 +19,8 @@ class StudentSerializer(serializers.ModelSerializer):
 class GradeSerializer(serializers.ModelSerializer):
     # Read-only field to get student name from student ID
     student_name = serializers.CharField(source='student.name', read_only=True)
+    # Read-only field to get course name from course ID
+    course_name = serializers.CharField(source='course.name', read_only=True)
 
     class Meta:
         model = Grade
@@ -28,6 +30,8 @@ class GradeSerializer(serializers.ModelSerializer):
 class AttendanceSerializer(serializers.ModelSerializer):
     # Read-only field to get student name from student ID
     student_name = serializers.CharField(source='student.name', read_only=True)
+    # Read-only field to get course name from course ID
+    course_name = serializers.CharField(source='course.name', read_only=True)
     class Meta:
         model = Attendance
         fields = '__all__'
@@ -36,6 +40,8 @@ class AttendanceSerializer(serializers.ModelSerializer):
 class PerformanceSerializer(serializers.ModelSerializer):
     # Read-only field to get student name from student ID
     student_name = serializers.CharField(source='student.name', read_only=True)
+    # Read-only field to get course name from course ID
+    course_name = serializers.CharField(source='course.name', read_only=True)
     class Meta:
         model = Performance
         fields = '__all__'
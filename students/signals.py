@@ -0,0 +1,74 @@
+# students/signals.py
+
+from django.db import connections
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from .counters import COUNTED_MODELS, adjust
+from .models import Course, Student
+from .name_index import index_student, name_index_available, rebuild_name_index, unindex_student
+from .search import get_search_backend, index_for_model
+
+
+# Keep the student name index in step with the Student table
+@receiver(post_save, sender=Student, dispatch_uid='students_name_index_save')
+def update_name_index(sender, instance, using, **kwargs):
+    if name_index_available(connections[using]):
+        index_student(instance, connections[using])
+
+
+@receiver(post_delete, sender=Student, dispatch_uid='students_name_index_delete')
+def remove_from_name_index(sender, instance, using, **kwargs):
+    if name_index_available(connections[using]):
+        unindex_student(instance.pk, connections[using])
+
+
+def build_name_index(sender, using, **kwargs):
+    if name_index_available(connections[using]):
+        rebuild_name_index(connections[using])
+
+
+# Keep the student and course search indexes in step with their tables, in the same transaction
+@receiver(post_save, sender=Student, dispatch_uid='students_search_student_save')
+@receiver(post_save, sender=Course, dispatch_uid='students_search_course_save')
+def update_search_index(sender, instance, using, **kwargs):
+    get_search_backend(connections[using]).index(index_for_model(sender), instance)
+
+
+@receiver(post_delete, sender=Student, dispatch_uid='students_search_student_delete')
+@receiver(post_delete, sender=Course, dispatch_uid='students_search_course_delete')
+def remove_from_search_index(sender, instance, using, **kwargs):
+    get_search_backend(connections[using]).unindex(index_for_model(sender), instance.pk)
+
+
+def build_search_index(sender, using, **kwargs):
+    get_search_backend(connections[using]).rebuild()
+
+
+# Keep RowCounter in step with inserts, soft deletes (and restores) and hard deletes
+COUNTED = tuple(COUNTED_MODELS.values())
+
+
+def remember_deleted_flag(sender, instance, **kwargs):
+    # Deferred (not loaded) is_deleted is None; the counters then leave the active count alone
+    instance._counted_deleted = instance.__dict__.get('is_deleted')
+
+
+def count_save(sender, instance, created, using, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        adjust(sender, total=1, active=0 if instance.is_deleted else 1, using=using)
+    elif instance._counted_deleted is not None and instance._counted_deleted != instance.is_deleted:
+        adjust(sender, active=-1 if instance.is_deleted else 1, using=using)
+    instance._counted_deleted = instance.is_deleted
+
+
+def count_delete(sender, instance, using, **kwargs):
+    adjust(sender, total=-1, active=0 if instance.is_deleted else -1, using=using)
+
+
+for model in COUNTED:
+    label = model._meta.label_lower
+    post_init.connect(remember_deleted_flag, sender=model, dispatch_uid=f'students_counters_init_{label}')
+    post_save.connect(count_save, sender=model, dispatch_uid=f'students_counters_save_{label}')
+    post_delete.connect(count_delete, sender=model, dispatch_uid=f'students_counters_delete_{label}')
@@ -1,3 +1,269 @@
-from django.test import TestCase
+import datetime
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .models import Attendance, Course, Grade, Internship, Performance, Student
+from .counters import reconcile
+from .name_index import resolve_student
+from .search import search
+from .urls import urlpatterns
+from .views import GradeDetailView
 
-# Create your tests here.
+# Most SQL queries each endpoint may run, whatever the number of rows; a new endpoint needs an entry
+QUERY_BUDGETS = {
+    'dashboard': 1,
+    'student-list-create': 1,
+    'student-detail': 1,
+    'student-name-search': 2,
+    'search': 4,
+    'student-profile-list-create': 5,
+    'course-list-create': 1,
+    'course-detail': 1,
+    'grade-list-create': 1,
+    'grade-detail': 1,
+    'attendance-list-create': 1,
+    'attendance-detail': 1,
+    'performance-list-create': 1,
+    'performance-detail': 1,
+    'internship-list-create': 1,
+    'internship-detail': 1,
+}
+QUERY_PARAMS = {'student-name-search': {'name': 'Student 1'}, 'search': {'q': 'stud'}}
+
+
+def create_records(count):
+    """count students, each with a grade, attendance, performance and internship row in one course."""
+    course = Course.objects.create(name='Algorithms')
+    for index in range(Student.objects.count(), Student.objects.count() + count):
+        student = Student.objects.create(student_id=f'T{index:04d}', name=f'Student {index}')
+        Grade.objects.create(student=student, course=course, grade='A')
+        Attendance.objects.create(student=student, course=course, total_classes=40, attended_classes=30, date=datetime.date.today())
+        Performance.objects.create(student=student, course=course, gpa='3.50')
+        Internship.objects.create(student=student, company_name='Acme', role='Intern')
+
+
+def create_students(count, start=0):
+    return Student.objects.bulk_create(Student(student_id=f'T{index:04d}', name=f'Student {index}') for index in range(start, start + count))
+
+
+@override_settings(STUDENTS_API_PAGE_SIZE=3, STUDENTS_API_MAX_PAGE_SIZE=5)
+class PaginationTests(TestCase):
+
+    def test_cursor_pages_cover_every_row_once(self):
+        create_students(7)
+        url, seen = '/api/students/', []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 3)
+            seen += [row['student_id'] for row in response.data['results']]
+            if len(seen) == 3:
+                # Rows created mid-walk sort before the first page and do not shift later pages
+                create_students(2, start=100)
+            url = response.data['next']
+        self.assertEqual(seen, [f'T{index:04d}' for index in reversed(range(7))])
+
+    def test_page_size_is_capped(self):
+        create_students(8)
+        response = self.client.get('/api/students/', {'page_size': 100})
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_every_list_endpoint_is_paginated(self):
+        Course.objects.create(name='Algorithms')
+        for url in ('/api/students/', '/api/courses/', '/api/grades/', '/api/attendance/', '/api/performance/', '/api/internships/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(set(response.data), {'next', 'previous', 'results'}, url)
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        Student.objects.create(student_id='S100', name='Asha Verma', email='asha@example.com', department='Physics')
+        Student.objects.create(student_id='S101', name='Ravi Kumar', address='12 Asha Nagar', department='Chemistry')
+        Course.objects.create(name='Quantum Physics', instructor_name='Dr. Verma')
+
+    def test_ranks_prefix_matches_with_highlights(self):
+        results = search('ash', kinds=['student'])
+        self.assertEqual([result['student_id'] for result in results], ['S100', 'S101'])
+        self.assertEqual(results[0]['highlights']['name'], '<mark>Asha</mark> Verma')
+        self.assertEqual(search('phys verm', kinds=['course'])[0]['name'], 'Quantum Physics')
+
+    @override_settings(STUDENTS_SEARCH_BACKEND='scan')
+    def test_scan_backend_fallback(self):
+        results = search('ash', kinds=['student'])
+        self.assertEqual([result['student_id'] for result in results], ['S100', 'S101'])
+        self.assertEqual(results[1]['highlights'], {'address': '12 <mark>Asha</mark> Nagar'})
+
+    def test_highlights_escape_field_text(self):
+        Student.objects.create(student_id='S102', name='<img src=x onerror=alert(1)> Asha & Co')
+        expected = '&lt;img src=x onerror=alert(1)&gt; <mark>Asha</mark> &amp; Co'
+        highlights = {result['student_id']: result['highlights'] for result in search('asha', kinds=['student'])}
+        self.assertEqual(highlights['S102']['name'], expected)
+        with override_settings(STUDENTS_SEARCH_BACKEND='scan'):
+            highlights = {result['student_id']: result['highlights'] for result in search('asha', kinds=['student'])}
+        self.assertEqual(highlights['S102']['name'], expected)
+
+    def test_index_follows_updates_and_soft_deletes(self):
+        student = Student.objects.get(student_id='S100')
+        student.name = 'Asha Iyer'
+        student.save()
+        self.assertEqual(search('iyer')[0]['student_id'], 'S100')
+        student.delete()
+        self.assertEqual(search('iyer'), [])
+
+    def test_student_list_search_uses_the_index(self):
+        response = self.client.get('/api/students/', {'search': 'chem'})
+        self.assertEqual([row['student_id'] for row in response.data['results']], ['S101'])
+        response = self.client.get('/api/search/', {'q': 'verma'})
+        self.assertEqual({result['type'] for result in response.data['results']}, {'student', 'course'})
+
+
+class NameResolutionTests(TestCase):
+
+    def setUp(self):
+        self.asha = Student.objects.create(student_id='S100', name='Asha Verma')
+        Student.objects.create(student_id='S101', name='Ravi Kumar')
+        Student.objects.create(student_id='S102', name='Ravi Kumar')
+        self.bo = Student.objects.create(student_id='S103', name='Bo Li')
+
+    def test_exact_id_and_name(self):
+        self.assertEqual(resolve_student('S100')[0], self.asha)
+        self.assertEqual(resolve_student('asha verma')[0], self.asha)
+
+    def test_typo(self):
+        student, candidates = resolve_student('Asha Vrma')
+        self.assertEqual(student, self.asha)
+        self.assertEqual(candidates[0]['student_id'], 'S100')
+
+    def test_namesakes_are_left_to_the_caller(self):
+        student, candidates = resolve_student('Ravi Kumar')
+        self.assertIsNone(student)
+        self.assertEqual({candidate['student_id'] for candidate in candidates}, {'S101', 'S102'})
+
+    def test_short_and_reordered_names(self):
+        self.assertEqual(resolve_student('Bo Li')[0], self.bo)
+        self.assertEqual(resolve_student('Verma Asha')[0], self.asha)
+
+    def test_new_students_are_found_misspelt(self):
+        student = Student.objects.create(student_id='S104', name='Meera Kulkarni')
+        self.assertEqual(resolve_student('Meera Kulkarny')[0], student)
+
+    def test_unknown_names_do_not_scan_the_table(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(resolve_student('Nobody Here'), (None, []))
+        self.assertFalse([query['sql'] for query in queries if 'LIKE' in query['sql']])
+
+
+class DashboardCounterTests(TestCase):
+
+    def test_counters_follow_inserts_and_deletes(self):
+        create_records(3)
+        student = Student.objects.first()
+        student.delete()  # soft delete
+        Internship.objects.first().delete()
+        Grade.objects.all().delete()  # hard delete
+        response = self.client.get('/api/dashboard/')
+        self.assertEqual(response.data['total_students'], 3)
+        self.assertEqual(response.data['active_students'], 2)
+        self.assertEqual(response.data['active_internships'], 2)
+        self.assertEqual(response.data['total_grades'], 0)
+        self.assertEqual(reconcile()['students'], (0, 0))
+
+    def test_reconcile_corrects_bulk_writes(self):
+        create_records(1)
+        create_students(4, start=10)  # bulk_create sends no signals
+        self.assertEqual(reconcile()['students'], (4, 4))
+        self.assertEqual(self.client.get('/api/dashboard/').data['total_students'], 5)
+
+    def test_conditional_get(self):
+        create_records(1)
+        response = self.client.get('/api/dashboard/')
+        self.assertEqual(self.client.get('/api/dashboard/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get('/api/dashboard/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        create_records(1)
+        self.assertEqual(self.client.get('/api/dashboard/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+
+class StudentProfileTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        create_records(1)
+        self.student = Student.objects.get()
+        self.url = f'/api/student-profiles/{self.student.pk}/'
+
+    def test_profile_sections(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['student']['student_id'], self.student.student_id)
+        self.assertEqual(response.data['grades'][0]['course_name'], 'Algorithms')
+        self.assertEqual(len(response.data['internships']), 1)
+        self.assertEqual(self.client.get('/api/student-profiles/999999/').status_code, 404)
+
+    def test_if_none_match_and_cached_profile(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url)['ETag'], etag)
+
+    def test_etag_changes_with_related_rows_and_courses(self):
+        etags = [self.client.get(self.url)['ETag']]
+        course = Course.objects.get()
+        course.name = 'Advanced Algorithms'
+        course.save()
+        etags.append(self.client.get(self.url)['ETag'])
+        Internship.objects.all().delete()
+        response = self.client.get(self.url)
+        etags.append(response['ETag'])
+        self.assertEqual(len(set(etags)), 3)
+        self.assertEqual(response.data['grades'][0]['course_name'], 'Advanced Algorithms')
+        self.assertEqual(response.data['internships'], [])
+
+
+class QueryBudgetTests(TestCase):
+
+    def count_queries(self, url, params):
+        # Measure the uncached path
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries)
+
+    def test_endpoints_stay_within_query_budgets(self):
+        create_records(2)
+        small = {}
+        for pattern in urlpatterns:
+            self.assertIn(pattern.name, QUERY_BUDGETS, f"{pattern.name} has no query budget")
+        for pattern in urlpatterns:
+            small[pattern.name] = self.count_queries(self.url_for(pattern), QUERY_PARAMS.get(pattern.name))
+
+        # Ten times the rows must not mean more queries
+        create_records(20)
+        for pattern in urlpatterns:
+            with self.subTest(endpoint=pattern.name):
+                queries = self.count_queries(self.url_for(pattern), QUERY_PARAMS.get(pattern.name))
+                self.assertEqual(queries, small[pattern.name], "query count grows with the number of rows (N+1)")
+                self.assertLessEqual(queries, QUERY_BUDGETS[pattern.name])
+
+    def test_only_reads_are_planned(self):
+        # A write saves and re-serialises the instance; a projected row would re-read deferred columns one by one
+        view = GradeDetailView()
+        for method, planned in (('get', True), ('head', True), ('put', False), ('patch', False), ('delete', False)):
+            view.setup(getattr(RequestFactory(), method)('/'))
+            query = view.get_queryset().query
+            self.assertEqual(bool(query.select_related), planned, method)
+            self.assertEqual(not query.deferred_loading[1], planned, method)
+
+    @staticmethod
+    def url_for(pattern):
+        kwargs = {}
+        for name in pattern.pattern.converters:
+            # Detail views take their own model's pk, the profile a student's
+            view = pattern.callback.view_class
+            model = view.queryset.model if getattr(view, 'queryset', None) is not None else Student
+            kwargs[name] = model.objects.first().pk
+        return reverse(pattern.name, kwargs=kwargs)
@@ -10,6 +10,10 @@ urlpatterns = [
     # Student API URLs
     path('students/', views.StudentListCreateView.as_view(), name='student-list-create'),
     path('students/<int:pk>/', views.StudentDetailView.as_view(), name='student-detail'),
+    path('students/resolve/', views.StudentNameSearchView.as_view(), name='student-name-search'),
+
+    # Full-text search over students and courses
+    path('search/', views.SearchView.as_view(), name='search'),
 
     # student profile API URLs
     path('student-profiles/<int:student_id>/', views.StudentProfileView.as_view(), name='student-profile-list-create'),
@@ -1,5 +1,8 @@
 # students/views.py
 
+import hashlib
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -7,107 +10,147 @@ from rest_framework.decorators import api_view
 from rest_framework import generics
 from .models import Student, Course, Grade, Attendance, Performance, Internship
 from .serializers import StudentSerializer, CourseSerializer, GradeSerializer, AttendanceSerializer, PerformanceSerializer, InternshipSerializer
-from django.db.models import Q
+from . import search
+from .counters import read_counters
+from .name_index import search_student_names
+from .profiles import get_profile, load_versioned_student, profile_version
+from .query_plan import QueryPlanMixin
 
-# API view for Dashboard
+# API view for Dashboard, served from the maintained row counters in one query
 class DashboardView(APIView):
     def get(self, request):
-        # Example data for the dashboard
-        data = {
-            "total_students": Student.objects.count(),
-            "total_courses": Course.objects.count(),
-            "total_grades": Grade.objects.count(),
-            "total_attendance": Attendance.objects.count(),
-            "total_performance": Performance.objects.count(),
-            "total_internships": Internship.objects.count(),
-        }
-        return Response(data, status=status.HTTP_200_OK)
+        counters, last_modified = read_counters()
+        etag = quote_etag(hashlib.sha1(
+            ';'.join(f'{name}={counter.total},{counter.active}' for name, counter in sorted(counters.items())).encode()
+        ).hexdigest())
+        last_modified = int(last_modified.timestamp())
+
+        # Pollers that already have these numbers get an empty 304
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        data = {f"total_{name}": counter.total for name, counter in counters.items()}
+        data.update({f"active_{name}": counter.active for name, counter in counters.items()})
+        response = Response(data, status=status.HTTP_200_OK)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'no-cache'
+        return response
 
 # API view for Student model (CRUD operations)
-class StudentListCreateView(generics.ListCreateAPIView):
+class StudentListCreateView(QueryPlanMixin, generics.ListCreateAPIView):
     queryset = Student.objects.all()
     serializer_class = StudentSerializer
 
     def get_queryset(self):
         queryset = super().get_queryset()
         search_query = self.request.query_params.get('search', None)
-        print(search_query, "search")
         if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) |
-                Q(email__icontains=search_query) |
-                Q(address__icontains=search_query) |
-                Q(phone_number__icontains=search_query) |
-                Q(department__icontains=search_query)
-            )
+            # Words match name, email, address, phone number or department, as prefixes
+            queryset = search.filter_queryset(queryset, search_query)
         return queryset
 
-class StudentDetailView(generics.RetrieveUpdateDestroyAPIView):
+# API view for ranked (fuzzy) student name lookups
+class StudentNameSearchView(APIView):
+    def get(self, request):
+        name = request.query_params.get('name', '').strip()
+        if not name:
+            return Response({"error": "The 'name' query parameter is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            return Response({"error": "'limit' must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = {
+            "query": name,
+            "results": search_student_names(name, limit=limit),
+        }
+        return Response(data, status=status.HTTP_200_OK)
+
+# API view for ranked full-text search over students and courses, with highlighted matches
+class SearchView(APIView):
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not search.query_tokens(query):
+            return Response({"error": "The 'q' query parameter is required"}, status=status.HTTP_400_BAD_REQUEST)
+        kinds = [kind for kind in request.query_params.get('type', '').split(',') if kind] or list(search.INDEXES)
+        if any(kind not in search.INDEXES for kind in kinds):
+            return Response({"error": f"'type' must be one of {', '.join(search.INDEXES)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), 100)
+        except ValueError:
+            return Response({"error": "'limit' must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = {
+            "query": query,
+            "results": search.search(query, kinds=kinds, limit=limit),
+        }
+        return Response(data, status=status.HTTP_200_OK)
+
+class StudentDetailView(QueryPlanMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Student.objects.all()
     serializer_class = StudentSerializer
 
+# API view for a student's full profile; revalidates with a strong ETag over the student and related rows
 class StudentProfileView(APIView):
     def get(self, request, student_id):
-        try:
-            student = Student.objects.get(id=student_id)
-        except Student.DoesNotExist:
+        student = load_versioned_student(student_id)
+        if student is None:
             return Response({"error": "Student not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        grades = Grade.objects.filter(student=student)
-        attendance = Attendance.objects.filter(student=student)
-        performance = Performance.objects.filter(student=student)
-        internships = Internship.objects.filter(student=student)
+        etag = quote_etag(profile_version(student))
+        # An unchanged profile costs one query and no serialization
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
 
-        data = {
-            "student": StudentSerializer(student).data,
-            "grades": GradeSerializer(grades, many=True).data,
-            "attendance": AttendanceSerializer(attendance, many=True).data,
-            "performance": PerformanceSerializer(performance, many=True).data,
-            "internships": InternshipSerializer(internships, many=True).data,
-        }
-        return Response(data, status=status.HTTP_200_OK)
+        response = Response(get_profile(student, etag.strip('"')), status=status.HTTP_200_OK)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
 
 # API view for Course model (CRUD operations)
-class CourseListCreateView(generics.ListCreateAPIView):
+class CourseListCreateView(QueryPlanMixin, generics.ListCreateAPIView):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
 
-class CourseDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CourseDetailView(QueryPlanMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
 
 # API view for Grade model (CRUD operations)
-class GradeListCreateView(generics.ListCreateAPIView):
+class GradeListCreateView(QueryPlanMixin, generics.ListCreateAPIView):
     queryset = Grade.objects.all()
     serializer_class = GradeSerializer
 
-class GradeDetailView(generics.RetrieveUpdateDestroyAPIView):
+class GradeDetailView(QueryPlanMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Grade.objects.all()
     serializer_class = GradeSerializer
 
 # API view for Attendance model (CRUD operations)
-class AttendanceListCreateView(generics.ListCreateAPIView):
+class AttendanceListCreateView(QueryPlanMixin, generics.ListCreateAPIView):
     queryset = Attendance.objects.all()
     serializer_class = AttendanceSerializer
 
-class AttendanceDetailView(generics.RetrieveUpdateDestroyAPIView):
+class AttendanceDetailView(QueryPlanMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Attendance.objects.all()
     serializer_class = AttendanceSerializer
 
 # API view for Performance model (CRUD operations)
-class PerformanceListCreateView(generics.ListCreateAPIView):
+class PerformanceListCreateView(QueryPlanMixin, generics.ListCreateAPIView):
     queryset = Performance.objects.all()
     serializer_class = PerformanceSerializer
 
-class PerformanceDetailView(generics.RetrieveUpdateDestroyAPIView):
+class PerformanceDetailView(QueryPlanMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Performance.objects.all()
     serializer_class = PerformanceSerializer
 
 # API view for Internship model (CRUD operations)
-class InternshipListCreateView(generics.ListCreateAPIView):
+class InternshipListCreateView(QueryPlanMixin, generics.ListCreateAPIView):
     queryset = Internship.objects.all()
     serializer_class = InternshipSerializer
 
-class InternshipDetailView(generics.RetrieveUpdateDestroyAPIView):
+class InternshipDetailView(QueryPlanMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Internship.objects.all()
     serializer_class = InternshipSerializer